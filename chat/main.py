@@ -4,10 +4,13 @@ import uuid
 parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
 sys.path.append(parent_dir)
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
+from pypdf import PdfReader
 from pathlib import Path
 from langchain_google_genai import ChatGoogleGenerativeAI
 import re
+import hashlib
+from utils.cache import LRUCache, DiskCache, TieredCache
+from typing import BinaryIO, Union
 
 
 
@@ -15,13 +18,77 @@ load_dotenv(str(Path("./env/chat.env")))
 GEMINI_API_KEY=os.getenv("GEMINI_API_KEY")
 MODEL_NAME=os.getenv("MODEL_NAME")
 PROJECT_NAME=os.getenv("PROJECT_NAME")
+RESUME_TEXT_CACHE_SIZE=int(os.getenv("RESUME_TEXT_CACHE_SIZE",256))
+RESUME_TEXT_CACHE_DIR=os.getenv("RESUME_TEXT_CACHE_DIR","")
+RESUME_TEXT_CACHE_MAX_BYTES=int(os.getenv("RESUME_TEXT_CACHE_MAX_BYTES",50*1024*1024))
+LLM_CACHE_SIZE=int(os.getenv("LLM_CACHE_SIZE",1024))
+LLM_CACHE_TTL=float(os.getenv("LLM_CACHE_TTL",24*60*60))
+
+# Bump a version whenever its prompt changes, so cached answers of the old prompt are not reused
+JOB_TITLES_PROMPT_VERSION:str="job-titles-1"
+EMAIL_BODY_PROMPT_VERSION:str="email-body-1"
+
+# Extracted resume text, keyed by the SHA-256 of the PDF bytes
+resume_text_cache=TieredCache(
+    LRUCache(maxsize=RESUME_TEXT_CACHE_SIZE),
+    DiskCache(RESUME_TEXT_CACHE_DIR,RESUME_TEXT_CACHE_MAX_BYTES) if RESUME_TEXT_CACHE_DIR else None
+)
+
+# LLM answers, keyed by model, prompt version and normalized inputs
+llm_response_cache=LRUCache(maxsize=LLM_CACHE_SIZE,ttl=LLM_CACHE_TTL)
+
+def get_llm()->ChatGoogleGenerativeAI:
+    """
+    Creates the chat model used by the chat functions.
+
+    Returns:
+        ChatGoogleGenerativeAI: The Gemini chat model.
+    """
+    return ChatGoogleGenerativeAI(model=MODEL_NAME,google_api_key=GEMINI_API_KEY,project=PROJECT_NAME)
+
+def normalize_prompt_input(value:str)->str:
+    """
+    Normalizes a free text input so that trivially different spellings share a cache entry.
+
+    Args:
+        value (str): The input, e.g. an email subject or a language.
+
+    Returns:
+        str: The input without surrounding or repeated whitespace, in lower case.
+
+    Example:
+        >>> normalize_prompt_input("  Stage   PFE ")
+        'stage pfe'
+    """
+    return " ".join(str(value).split()).casefold()
 
-def get_pages_contents_from_pdf(resume_pdf_path:str)->str:
+def hash_stream(stream:BinaryIO)->str:
+    """
+    Computes the SHA-256 of a binary stream chunk by chunk, then rewinds it.
+
+    Args:
+        stream (BinaryIO): The stream, e.g. the spooled file of an upload.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    sha256=hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda:stream.read(1024*1024),b""):
+        sha256.update(chunk)
+    stream.seek(0)
+    return sha256.hexdigest()
+
+def get_pages_contents_from_pdf(resume_pdf:Union[str,BinaryIO])->str:
     """
     Extracts the content of all pages from a PDF file.
 
+    The PDF is read straight from the given stream, so an upload never needs a named
+    temporary file. The text is cached by the content hash of the file, so parsing the
+    same PDF again (a retry, or another endpoint called with the same resume) is skipped.
+
     Args:
-        resume_pdf_path (str): The path to the PDF file.
+        resume_pdf (Union[str, BinaryIO]): The path to the PDF file, or a seekable binary stream.
 
     Returns:
         str: The concatenated content of all pages in the PDF.
@@ -30,19 +97,29 @@ def get_pages_contents_from_pdf(resume_pdf_path:str)->str:
         >>> get_pages_contents_from_pdf("./resume.pdf")
         'Page 1 content\nPage 2 content\n...'
     """
-    loader = PyPDFLoader(resume_pdf_path)
-    documents=loader.load()
-    page_contents:str=""
-    for document in documents:
-        page_contents+=dict(document)["page_content"]+"\n"
+    if isinstance(resume_pdf,(str,os.PathLike)):
+        with open(resume_pdf,"rb") as resume_file:
+            return get_pages_contents_from_pdf(resume_file)
+    content_hash:str=hash_stream(resume_pdf)
+    page_contents:str|None=resume_text_cache.get(content_hash)
+    if page_contents is not None:
+        return page_contents
+    reader=PdfReader(resume_pdf)
+    page_contents=""
+    for page in reader.pages:
+        page_contents+=page.extract_text()+"\n"
+    resume_text_cache.set(content_hash,page_contents)
     return page_contents
 
-def get_possible_job_titles(resume_pdf_path: str) -> list:
+def get_possible_job_titles(resume_pdf: Union[str, BinaryIO], fresh: bool = False) -> list:
     """
     Extracts possible job titles from a resume PDF.
 
+    Answers are cached for identical resumes; pass `fresh` to ask the model again.
+
     Args:
-        resume_pdf_path (str): The path to the PDF file.
+        resume_pdf (Union[str, BinaryIO]): The path to the PDF file, or a seekable binary stream.
+        fresh (bool, optional): Bypass the response cache. Default is False.
 
     Returns:
         list: A list of possible job titles extracted from the resume.
@@ -51,12 +128,17 @@ def get_possible_job_titles(resume_pdf_path: str) -> list:
         >>> get_possible_job_titles("./resume.pdf")
         ['Software Engineer', 'Data Analyst', ...]
     """
-    page_contents = get_pages_contents_from_pdf(resume_pdf_path)
-    llm = ChatGoogleGenerativeAI(
-        model=MODEL_NAME, google_api_key=GEMINI_API_KEY, project=PROJECT_NAME
-    )
+    page_contents = get_pages_contents_from_pdf(resume_pdf)
+    cache_key = (MODEL_NAME, JOB_TITLES_PROMPT_VERSION, hashlib.sha256(page_contents.encode()).hexdigest())
+    if not fresh:
+        job_titles = llm_response_cache.get(cache_key)
+        if job_titles is not None:
+            return list(job_titles)
+    llm = get_llm()
     result = llm.invoke(f"Extract possible job titles from this resume en list dashe : {page_contents}")
-    return extract_list_from_string(result.content)
+    job_titles = extract_list_from_string(result.content)
+    llm_response_cache.set(cache_key, tuple(job_titles))
+    return job_titles
 
 
 def extract_list_from_string(result:str)->list:
@@ -81,15 +163,18 @@ def extract_list_from_string(result:str)->list:
     
     return matches
 
-def get_email_body(resume_pdf_path:str,email_subject:str,language:str)->list:
+def get_email_body(resume_pdf:Union[str,BinaryIO],email_subject:str,language:str,fresh:bool=False)->list:
     print("language",language)
     """
     Generates an email body in markdown language from a resume PDF.
 
+    Answers are cached for identical (resume, subject, language) inputs; pass `fresh` to ask the model again.
+
     Args:
-        resume_pdf_path (str): The path to the PDF file.
+        resume_pdf (Union[str, BinaryIO]): The path to the PDF file, or a seekable binary stream.
         email_subject (str): The subject of the email.
         language (str): The language for generating the email body.
+        fresh (bool, optional): Bypass the response cache. Default is False.
 
     Returns:
         list: The generated email body.
@@ -98,12 +183,20 @@ def get_email_body(resume_pdf_path:str,email_subject:str,language:str)->list:
         >>> get_email_body("./resume.pdf", "Job Application", "English")
         'Dear Hiring Manager, ...'
     """
-    page_contents=get_pages_contents_from_pdf(resume_pdf_path)
-    llm = ChatGoogleGenerativeAI(model=MODEL_NAME,google_api_key=GEMINI_API_KEY,project=PROJECT_NAME)
+    page_contents=get_pages_contents_from_pdf(resume_pdf)
+    cache_key=(MODEL_NAME,EMAIL_BODY_PROMPT_VERSION,hashlib.sha256(page_contents.encode()).hexdigest(),
+               normalize_prompt_input(email_subject),normalize_prompt_input(language))
+    if not fresh:
+        email_body=llm_response_cache.get(cache_key)
+        if email_body is not None:
+            return email_body
+    llm = get_llm()
     result = llm.invoke(f"generer un email en HTML (utiliser les balises HTML) en se basant sur les informations de mon CV (compétences, projets, à propos...) : {page_contents} et le sujet {email_subject}. Limitez le contenu à 5 lignes et n'incluez pas le sujet dans l'email (obliigatoire). Utilisez le nom de l'expéditeur qui est dans le CV.      La langue est {language}. (balises HTML autorisées)")
 
 
-    return remove_(result.content,"html")
+    email_body=remove_(result.content,"html")
+    llm_response_cache.set(cache_key,email_body)
+    return email_body
 
 
 
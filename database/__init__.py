@@ -1,7 +1,8 @@
 import os
 import sys
+from typing import Iterator
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 from dotenv import load_dotenv
 from pathlib import Path
 parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
@@ -18,15 +19,55 @@ Base = declarative_base()
 
 DATABASE_URL:str=get_database_url(database_type=os.getenv("DB_TYPE"),username=os.getenv("USER_NAME"),password=os.getenv("PASSWORD"),port=os.getenv("PORT"),host=os.getenv("HOST"),database_name=os.getenv("DB_NAME"),db_file_path=os.getenv("DB_FILE_PATH"))
 
+# Connection pool settings
+DB_POOL_SIZE:int=int(os.getenv("DB_POOL_SIZE",10))
+DB_MAX_OVERFLOW:int=int(os.getenv("DB_MAX_OVERFLOW",20))
+DB_POOL_PRE_PING:bool=os.getenv("DB_POOL_PRE_PING","true").lower() in ["1","true","yes"]
+DB_POOL_RECYCLE:int=int(os.getenv("DB_POOL_RECYCLE",1800))
 
+pool_options:dict={"pool_pre_ping":DB_POOL_PRE_PING,"pool_recycle":DB_POOL_RECYCLE}
+# In-memory SQLite keeps a single connection per thread and has no pool to size
+if ":memory:" not in DATABASE_URL:
+    pool_options.update(pool_size=DB_POOL_SIZE,max_overflow=DB_MAX_OVERFLOW)
 
-def init_db():
+# Create an engine
+engine = create_engine(DATABASE_URL, **pool_options)
+# Keep loaded attributes after a commit so reading them never hits the database again
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def create_tables()->None:
+    """
+    Create the tables of every model if they do not exist yet.
+    """
     from models.user import User
     from models.operations import Operations
-    # Create an engine
-    engine = create_engine(DATABASE_URL)  # Change the URL according to your database setup
-    # Create a session
-    Session = sessionmaker(bind=engine)
-    session = Session()
+    from models.campaign_recipient import CampaignRecipient
     Base.metadata.create_all(engine, checkfirst=True)
-    return session
+
+
+def get_session()->Iterator[Session]:
+    """
+    FastAPI dependency yielding a short-lived session for one request.
+
+    The session is rolled back if the request fails and is always closed, which gives its
+    connection back to the pool.
+
+    Example:
+        >>> @app.get("/users/{user_id}")
+        ... def read_user(user_id: str, session: Session = Depends(get_session)):
+        ...     return User.get_user_by_id(session, user_id)
+    """
+    session = SessionLocal()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def init_db():
+    create_tables()
+    return SessionLocal()
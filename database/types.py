@@ -0,0 +1,37 @@
+import datetime
+from sqlalchemy.types import DateTime, TypeDecorator
+
+# Dialects whose DATETIME has no time zone, values are stored as UTC wall time
+NAIVE_DIALECTS: tuple = ("sqlite", "mysql", "mariadb")
+
+
+class UTCDateTime(TypeDecorator):
+    """
+    Timezone-aware timestamp stored in UTC on every database.
+
+    Values are converted to UTC when written, naive ones being taken as UTC already, and are
+    always read back as aware UTC datetimes, also on databases without a time zone type.
+
+    Example:
+        >>> created_at = Column(UTCDateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    """
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        value = value.astimezone(datetime.timezone.utc)
+        if dialect.name in NAIVE_DIALECTS:
+            return value.replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=datetime.timezone.utc)
+        return value.astimezone(datetime.timezone.utc)
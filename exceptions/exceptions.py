@@ -77,3 +77,15 @@ class UserExistException(HTTPException):
     def __init__(self, detail: str):
         self.status_code = status.HTTP_400_BAD_REQUEST
         self.detail = detail
+
+
+class FileTooLargeException(HTTPException):
+    """
+    Custom exception for uploads larger than allowed.
+
+    Parameters:
+        detail (str): Additional details about the exception.
+    """
+    def __init__(self, detail: str):
+        self.status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        self.detail = detail
@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import datetime
+from typing import Iterable, Union
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Index, insert, update, func
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from database import Base
+from database.types import UTCDateTime
+
+# Rows written per INSERT statement, and addresses per IN (...) lookup
+BATCH_SIZE: int = 1000
+
+
+class CampaignRecipient(Base):
+    """
+    CampaignRecipient model holding the result of one recipient of an operation.
+
+    Attributes:
+        id (int): Unique identifier for the row.
+        operation_id (str): Foreign key referencing the id of the operation that mailed the recipient.
+        user_id (str): Foreign key referencing the id of the user who sent the operation.
+        email (str): Address of the recipient, lower-cased.
+        status (str): 'pending' until the campaign reaches it, then 'sent' or 'failed'.
+        error (str): Why the send failed, if it did.
+        sent_at (datetime.datetime): When the recipient was mailed, in UTC.
+        template_values (str): The placeholder values of the recipient's body as JSON, for personalized campaigns.
+    """
+
+    __tablename__ = 'campaign_recipients'
+    __table_args__ = (
+        # "Have I already mailed this address?" is a lookup on (user_id, email)
+        Index('ix_campaign_recipients_user_email', 'user_id', 'email'),
+        # Per campaign listings and stats
+        Index('ix_campaign_recipients_operation_status', 'operation_id', 'status'),
+        {'extend_existing': True},
+    )
+
+    PENDING: str = "pending"
+    SENT: str = "sent"
+    FAILED: str = "failed"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    operation_id = Column(String(37), ForeignKey('operations.id'), nullable=False)
+    user_id = Column(String(37), ForeignKey('users.id'), nullable=False)
+    email = Column(String(255), nullable=False)
+    status = Column(String(16), nullable=False)
+    error = Column(Text)
+    sent_at = Column(UTCDateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
+    template_values = Column(Text)
+
+    @staticmethod
+    def split_receivers(receivers: Union[str, Iterable[str], None]) -> list:
+        """
+        Get the addresses of a comma-joined receiver string, or of a list of addresses.
+
+        Example:
+            >>> CampaignRecipient.split_receivers("A@example.com, b@example.com,")
+            ['a@example.com', 'b@example.com']
+        """
+        if not receivers:
+            return []
+        if isinstance(receivers, str):
+            receivers = receivers.split(",")
+        return [email.strip().lower() for email in receivers if email and email.strip()]
+
+    @classmethod
+    def add_results(cls, session, operation_id: str, user_id: str, success_receiver=None, failed_receiver=None,
+                    errors: dict = None, sent_at: datetime.datetime = None) -> int:
+        """
+        Record the recipients of an operation with bulk inserts. The caller commits.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            operation_id (str): ID of the operation.
+            user_id (str): ID of the user who sent the operation.
+            success_receiver (Union[str, Iterable[str]], optional): Addresses mailed successfully, as a list or comma-joined.
+            failed_receiver (Union[str, Iterable[str]], optional): Addresses that failed, as a list or comma-joined.
+            errors (dict, optional): Why each failed address failed, by address.
+            sent_at (datetime.datetime, optional): When the recipients were mailed. Default is now.
+
+        Returns:
+            int: The number of rows inserted.
+        """
+        sent_at = sent_at or datetime.datetime.now(datetime.timezone.utc)
+        errors = {email.lower(): error for email, error in (errors or {}).items()}
+        rows = [{"operation_id": operation_id, "user_id": user_id, "email": email, "status": cls.SENT,
+                 "error": None, "sent_at": sent_at}
+                for email in cls.split_receivers(success_receiver)]
+        rows += [{"operation_id": operation_id, "user_id": user_id, "email": email, "status": cls.FAILED,
+                  "error": errors.get(email), "sent_at": sent_at}
+                 for email in cls.split_receivers(failed_receiver)]
+        for start in range(0, len(rows), BATCH_SIZE):
+            # One executemany per batch instead of one INSERT per recipient
+            session.execute(insert(cls), rows[start:start + BATCH_SIZE])
+        return len(rows)
+
+    @classmethod
+    def add_pending(cls, session, operation_id: str, user_id: str, emails: Iterable[str],
+                    template_values: dict = None) -> int:
+        """
+        Record the recipients a campaign is about to mail, before any is sent. The caller commits.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            operation_id (str): ID of the operation.
+            user_id (str): ID of the user who sends the operation.
+            emails (Iterable[str]): The addresses, in sending order.
+            template_values (dict, optional): The placeholder values of each address, for a personalized body.
+
+        Returns:
+            int: The number of rows inserted.
+        """
+        template_values = {email.lower(): values for email, values in (template_values or {}).items()}
+        rows = [{"operation_id": operation_id, "user_id": user_id, "email": email, "status": cls.PENDING,
+                 "error": None, "sent_at": None,
+                 "template_values": json.dumps(template_values[email]) if email in template_values else None}
+                for email in cls.split_receivers(emails)]
+        for start in range(0, len(rows), BATCH_SIZE):
+            session.execute(insert(cls), rows[start:start + BATCH_SIZE])
+        return len(rows)
+
+    @classmethod
+    def get_pending(cls, session, operation_id: str) -> list:
+        """
+        Retrieve the recipients of an operation not mailed yet.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            operation_id (str): ID of the operation.
+
+        Returns:
+            list: (id, email, template_values) tuples, in sending order; template_values is a dict or None.
+        """
+        return [(row_id, email, json.loads(values) if values else None)
+                for row_id, email, values in session.query(cls.id, cls.email, cls.template_values)
+                .filter(cls.operation_id == operation_id, cls.status == cls.PENDING).order_by(cls.id)]
+
+    @classmethod
+    def checkpoint(cls, session, results: list) -> int:
+        """
+        Write the outcome of pending recipients with one executemany per batch. The caller commits.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            results (list): Dictionaries with the 'id' of each row and its new 'status', 'error' and 'sent_at'.
+
+        Returns:
+            int: The number of rows updated.
+        """
+        for start in range(0, len(results), BATCH_SIZE):
+            # Bulk UPDATE by primary key
+            session.execute(update(cls), results[start:start + BATCH_SIZE])
+        return len(results)
+
+    @classmethod
+    def has_contacted(cls, session, user_id: str, email: str) -> bool:
+        """
+        Check if a user already mailed an address successfully.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            user_id (str): ID of the user.
+            email (str): The address.
+
+        Returns:
+            bool: True if an operation of the user mailed the address.
+        """
+        return session.query(cls.id).filter_by(user_id=user_id, email=email.strip().lower(),
+                                               status=cls.SENT).first() is not None
+
+    @classmethod
+    def get_contacted(cls, session, user_id: str, emails: Iterable[str]) -> set:
+        """
+        Get which of the given addresses a user already mailed successfully.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            user_id (str): ID of the user.
+            emails (Iterable[str]): The addresses to check.
+
+        Returns:
+            set: The lower-cased addresses already mailed.
+        """
+        emails = list(dict.fromkeys(email.strip().lower() for email in emails))
+        contacted: set = set()
+        for start in range(0, len(emails), BATCH_SIZE):
+            query = (session.query(cls.email).distinct()
+                     .filter(cls.user_id == user_id, cls.status == cls.SENT,
+                             cls.email.in_(emails[start:start + BATCH_SIZE])))
+            contacted.update(email for (email,) in query)
+        return contacted
+
+    @classmethod
+    def exclude_contacted(cls, session, user_id: str, emails: Iterable[str]) -> tuple[list, list]:
+        """
+        Split addresses between the ones a user never mailed successfully and the ones already mailed.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            user_id (str): ID of the user.
+            emails (Iterable[str]): The addresses, lower-cased.
+
+        Returns:
+            tuple[list, list]: The addresses to mail and the skipped ones, each in input order.
+        """
+        emails = list(emails)
+        contacted = cls.get_contacted(session, user_id, emails)
+        remaining = [email for email in emails if email not in contacted]
+        skipped = [email for email in emails if email in contacted]
+        return remaining, skipped
+
+    @classmethod
+    def get_campaign_stats(cls, session, operation_id: str) -> dict:
+        """
+        Count the recipients of an operation by status.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            operation_id (str): ID of the operation.
+
+        Returns:
+            dict: The number of 'sent', 'failed' and 'pending' recipients, and their 'total'.
+        """
+        counts = dict(session.query(cls.status, func.count(cls.id))
+                      .filter(cls.operation_id == operation_id).group_by(cls.status).all())
+        stats = {status: counts.get(status, 0) for status in (cls.SENT, cls.FAILED, cls.PENDING)}
+        stats["total"] = sum(stats.values())
+        return stats
+
+    @classmethod
+    def get_recipients(cls, session, operation_id: str, status: str = None) -> list:
+        """
+        Retrieve the recipients of an operation.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            operation_id (str): ID of the operation.
+            status (str, optional): Only the 'sent', 'failed' or 'pending' ones. Default is all.
+
+        Returns:
+            list: Dictionaries with the email, status and error of each recipient.
+        """
+        query = session.query(cls.email, cls.status, cls.error).filter(cls.operation_id == operation_id)
+        if status is not None:
+            query = query.filter(cls.status == status)
+        return [{"email": email, "status": status, "error": error} for email, status, error in query.order_by(cls.id)]
+
+    @classmethod
+    def get_recipients_page(cls, session, operation_id: str, user_id: str, status: str = None, limit: int = 50,
+                            cursor: int = None) -> tuple[list, Union[int, None]]:
+        """
+        Retrieve one page of the recipients of an operation of a user, in sending order.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            operation_id (str): ID of the operation.
+            user_id (str): ID of the user who sent it; another user's operation has no recipients.
+            status (str, optional): Only the 'sent', 'failed' or 'pending' ones. Default is all.
+            limit (int, optional): Maximum number of recipients in the page. Default is 50.
+            cursor (int, optional): The `next_cursor` of the previous page. Default is the first page.
+
+        Returns:
+            tuple[list, Union[int, None]]: Dictionaries with the email, status, error and sent_at of each
+            recipient, and the cursor of the next page or None on the last one.
+        """
+        query = (session.query(cls.id, cls.email, cls.status, cls.error, cls.sent_at)
+                 .filter(cls.operation_id == operation_id, cls.user_id == user_id))
+        if status is not None:
+            query = query.filter(cls.status == status)
+        if cursor is not None:
+            # Keyset pagination on the primary key, rows are in sending order
+            query = query.filter(cls.id > cursor)
+        # One extra row tells whether there is a next page without counting
+        rows = query.order_by(cls.id).limit(limit + 1).all()
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        return [{"email": row.email, "status": row.status, "error": row.error,
+                 "sent_at": row.sent_at.isoformat() if row.sent_at else None}
+                for row in rows[:limit]], next_cursor
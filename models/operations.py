@@ -1,5 +1,7 @@
 import uuid
-from sqlalchemy import Column, String, ForeignKey,Text
+import base64
+from typing import Iterator, Union
+from sqlalchemy import Column, String, ForeignKey,Text,Index,and_,or_,update
 from sqlalchemy.orm import relationship
 import os
 import sys
@@ -7,7 +9,16 @@ parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
 sys.path.append(parent_dir)
 import datetime
 from database import Base
+from database.types import UTCDateTime
 from models.user import User
+from models.campaign_recipient import CampaignRecipient
+
+# Columns a client may select from its operations history. The recipients are read page by page
+# from campaign_recipients, never as one joined column
+OPERATION_FIELDS: tuple = ("id", "from_email", "date", "time", "created_at", "email_body", "subject",
+                           "pdf_id", "user_id", "status")
+# Columns of the history listing when the client selects none
+DEFAULT_OPERATION_FIELDS: tuple = ("id", "subject", "date", "time")
 
 
 class Operations(Base):
@@ -19,15 +30,30 @@ class Operations(Base):
         from_email (str): Source email address.
         date (str): Date of the operation.
         time (str): Time of the operation.
+        created_at (datetime.datetime): When the operation was created, in UTC.
         email_body (str): Body of the email.
         subject (str): Subject of the email.
-        success_receiver (str): Receiver of the successful operation.
-        failed_receiver (str): Receiver of the failed operation.
+        success_receiver (str): Legacy comma-joined successful receivers, no longer written; see CampaignRecipient.
+        failed_receiver (str): Legacy comma-joined failed receivers, no longer written; see CampaignRecipient.
         user_id (str): Foreign key referencing the id of the user associated with this operation.
+        status (str): 'running' while the campaign sends, 'done' once every recipient was tried.
+        resume_name (str): File name of the attached resume, to send it the same way on resume.
+        runner_id (str): Process currently sending the campaign.
+        lease_expires_at (datetime.datetime): Until when the runner holds the campaign, in UTC.
     """
     
 
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # The history of a user is read newest first: the index gives the rows in page order,
+        # with the id breaking ties between operations created at the same instant
+        Index('ix_operations_user_created', 'user_id', 'created_at', 'id'),
+        # Unfinished campaigns are looked up at startup
+        Index('ix_operations_status', 'status'),
+        {'extend_existing': True},
+    )
+
+    RUNNING: str = "running"
+    DONE: str = "done"
 
     __tablename__ = 'operations'
 
@@ -37,16 +63,31 @@ class Operations(Base):
     time = Column(String(55))
     email_body = Column(Text)
     subject = Column(String(255))
-    pdf_id = Column(String(37))
+    pdf_id = Column(String(64))
+    created_at = Column(UTCDateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
     success_receiver = Column(Text)
     failed_receiver = Column(Text)
     user_id = Column(String(37), ForeignKey('users.id'))
+    status = Column(String(16), default=DONE)
+    resume_name = Column(String(255))
+    runner_id = Column(String(37))
+    lease_expires_at = Column(UTCDateTime)
 
     # Define the relationship to the Users table
     user = relationship("User", back_populates="operations")
 
+    @staticmethod
+    def _resolve_user_id(session, user_id, user):
+        # A user loaded by the caller exists already, checking again would cost one more query
+        if user is not None:
+            return user.id
+        # Check if the user exists
+        if session.query(User.id).filter_by(id=user_id).first() is None:
+            raise ValueError("User with user_id {} does not exist".format(user_id))
+        return user_id
+
     @classmethod
-    def create_operation(cls, session, from_email, email_body, subject, success_receiver, failed_receiver,pdf_id, user_id):
+    def create_operation(cls, session, from_email, email_body, subject, success_receiver, failed_receiver,pdf_id, user_id=None, user=None, errors=None):
         """
         Create a new operation associated with a user.
 
@@ -56,9 +97,11 @@ class Operations(Base):
             resume_base64 (str): Base64 encoded PDF data.
             email_body (str): Body of the email.
             subject (str): Subject of the email.
-            success_receiver (str): Receiver of the successful operation.
-            failed_receiver (str): Receiver of the failed operation.
+            success_receiver (Union[str, list]): Receivers of the successful operation, as a list or comma-joined.
+            failed_receiver (Union[str, list]): Receivers of the failed operation, as a list or comma-joined.
             user_id (str): ID of the user associated with this operation.
+            user (User, optional): The user, already loaded by the caller. Its existence is not checked again.
+            errors (dict, optional): Why each failed receiver failed, by address.
 
         Returns:
             Operations: The newly created operation object.
@@ -66,36 +109,181 @@ class Operations(Base):
         Raises:
             ValueError: If the user with the provided user_id does not exist.
         """
-        # Check if the user exists
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
-            raise ValueError("User with user_id {} does not exist".format(user_id))
+        user_id = cls._resolve_user_id(session, user_id, user)
 
         # Create the operation
         operation = cls(
+            id=str(uuid.uuid4()),
             from_email=from_email,
             date=str(datetime.date.today()),  # Add current date
             time=str(datetime.datetime.now().time()),  # Add current time
             email_body=email_body,
             subject=subject,
-            success_receiver=success_receiver,
-            failed_receiver=failed_receiver,
             pdf_id=pdf_id,
-            user_id=user_id
+            user_id=user_id,
+            status=cls.DONE
         )
         
         session.add(operation)
+        # The recipients reference the operation, it is inserted first
+        session.flush()
+        # One row per recipient instead of joined strings, read back page by page
+        CampaignRecipient.add_results(session, operation.id, user_id, success_receiver, failed_receiver,
+                                      errors=errors, sent_at=operation.created_at)
         session.commit()
         return True
 
     @classmethod
-    def get_operations_info(cls, session, user_id):
+    def start_operation(cls, session, from_email, email_body, subject, receivers, pdf_id, resume_name,
+                        user_id=None, user=None, template_values=None):
+        """
+        Create the operation of a campaign before it sends anything, with every recipient pending.
+
+        The operation is not leased yet: the runner takes the lease with `claim` when it starts
+        sending, renews it with `claim` while it sends, and calls `finish_operation` at the end.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            from_email (str): Source email address.
+            email_body (str): Body of the email.
+            subject (str): Subject of the email.
+            receivers (list): The addresses to mail, in sending order.
+            pdf_id (str): ID of the resume in the resume store.
+            resume_name (str): File name of the attached resume.
+            user_id (str): ID of the user associated with this operation.
+            user (User, optional): The user, already loaded by the caller. Its existence is not checked again.
+            template_values (dict, optional): The placeholder values of each receiver when email_body is a template.
+
+        Returns:
+            str: The ID of the operation.
+
+        Raises:
+            ValueError: If the user with the provided user_id does not exist.
+        """
+        user_id = cls._resolve_user_id(session, user_id, user)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        operation = cls(
+            id=str(uuid.uuid4()),
+            from_email=from_email,
+            date=str(datetime.date.today()),
+            time=str(datetime.datetime.now().time()),
+            created_at=now,
+            email_body=email_body,
+            subject=subject,
+            pdf_id=pdf_id,
+            user_id=user_id,
+            status=cls.RUNNING,
+            resume_name=resume_name,
+            runner_id=None,
+            lease_expires_at=None
+        )
+        session.add(operation)
+        session.flush()
+        CampaignRecipient.add_pending(session, operation.id, user_id, receivers, template_values)
+        session.commit()
+        return operation.id
+
+    @classmethod
+    def claim(cls, session, operation_id, runner_id, lease_seconds):
+        """
+        Take or renew the lease of an unfinished campaign, in one conditional UPDATE.
+
+        The lease is granted if the runner already holds it or if it expired, so two processes
+        can never send the same campaign at the same time.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            operation_id (str): ID of the operation.
+            runner_id (str): ID of the process that wants to send the campaign.
+            lease_seconds (float): How long the lease lasts.
+
+        Returns:
+            bool: True if the runner holds the lease.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        result = session.execute(
+            update(cls)
+            .where(cls.id == operation_id, cls.status == cls.RUNNING,
+                   or_(cls.runner_id == runner_id, cls.lease_expires_at.is_(None), cls.lease_expires_at < now))
+            .values(runner_id=runner_id, lease_expires_at=now + datetime.timedelta(seconds=lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        return result.rowcount == 1
+
+    @classmethod
+    def release(cls, session, operation_id, runner_id, until=None):
+        """
+        Give back the lease of a campaign that stops sending before it is done, so another runner
+        can take it at once instead of when the lease expires.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            operation_id (str): ID of the operation.
+            runner_id (str): ID of the process holding the lease.
+            until (datetime.datetime, optional): No runner may take it before this time, e.g. the end
+                of a pause of its sender. Default is at once.
+
+        Returns:
+            bool: True if the runner held the lease.
+        """
+        result = session.execute(
+            update(cls)
+            .where(cls.id == operation_id, cls.status == cls.RUNNING, cls.runner_id == runner_id)
+            .values(runner_id=None, lease_expires_at=until)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        return result.rowcount == 1
+
+    @classmethod
+    def finish_operation(cls, session, operation_id, runner_id=None):
+        """
+        Mark a campaign done. Its recipients already hold their outcome.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            operation_id (str): ID of the operation.
+            runner_id (str, optional): Only finish it if this runner still holds the lease. Default is any runner.
+
+        Returns:
+            bool: True once the operation is saved, False if another runner took the lease.
+        """
+        condition = [cls.id == operation_id]
+        if runner_id is not None:
+            condition.append(cls.runner_id == runner_id)
+        result = session.execute(
+            update(cls).where(*condition)
+            .values(status=cls.DONE, runner_id=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        return result.rowcount == 1
+
+    @classmethod
+    def get_unfinished(cls, session):
+        """
+        Retrieve the campaigns that did not finish, e.g. because their process stopped.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+
+        Returns:
+            list: Dictionaries with the id, user_id and lease_expires_at of each running operation.
+        """
+        query = session.query(cls.id, cls.user_id, cls.lease_expires_at).filter(cls.status == cls.RUNNING)
+        return [{"id": id, "user_id": user_id, "lease_expires_at": lease_expires_at}
+                for id, user_id, lease_expires_at in query.order_by(cls.created_at)]
+
+    @classmethod
+    def get_operations_info(cls, session, user_id=None, user=None):
         """
         Retrieve the subject and date-time of operations associated with a user.
 
         Args:
             session (Session): SQLAlchemy session object.
             user_id (str): ID of the user associated with the operations.
+            user (User, optional): The user, already loaded by the caller. Its existence is not checked again.
 
         Returns:
             list: A list of dictionaries containing subject and date-time information for each operation.
@@ -103,10 +291,7 @@ class Operations(Base):
         Raises:
             ValueError: If the user with the provided user_id does not exist.
         """
-        # Check if the user exists
-        user:User|None = session.query(User).filter_by(id=user_id).first()
-        if not user:
-            raise ValueError("User with user_id {} does not exist".format(user_id))
+        user_id = cls._resolve_user_id(session, user_id, user)
 
         # Query for operations subject and date-time
         operations_info = session.query(cls.id,cls.subject, cls.date, cls.time).filter_by(user_id=user_id).all()
@@ -123,7 +308,7 @@ class Operations(Base):
 
         return operations_info_list
     @classmethod
-    def get_operation_by_id(cls, session, operation_id, user_id):
+    def get_operation_by_id(cls, session, operation_id, user_id=None, user=None):
         """
         Retrieve an operation by its ID and associated user ID.
 
@@ -131,20 +316,22 @@ class Operations(Base):
             session (Session): SQLAlchemy session object.
             operation_id (str): ID of the operation to retrieve.
             user_id (str): ID of the user associated with the operation.
+            user (User, optional): The user, already loaded by the caller. Its existence is not checked again.
 
         Returns:
             dict: A dictionary containing information about the operation if found, None otherwise.
+                Its 'recipients' are the counts of get_campaign_stats; the addresses are listed by
+                CampaignRecipient.get_recipients_page.
         
         Raises:
             ValueError: If the user with the provided user_id does not exist.
         """
-        # Check if the user exists
-        user = session.query(User).filter_by(id=user_id).first()
-        if not user:
-            raise ValueError("User with user_id {} does not exist".format(user_id))
+        user_id = cls._resolve_user_id(session, user_id, user)
 
-        # Query for the operation by its ID and associated user ID
-        operation = session.query(cls).filter_by(id=operation_id, user_id=user_id).first()
+        # Query for the operation by its ID and associated user ID, without the legacy receiver columns
+        operation = (session.query(cls.id, cls.from_email, cls.date, cls.time, cls.email_body, cls.subject,
+                                   cls.pdf_id, cls.user_id, cls.status)
+                     .filter_by(id=operation_id, user_id=user_id).first())
 
         # If operation not found, return None
         if not operation:
@@ -158,8 +345,162 @@ class Operations(Base):
             'time': operation.time,
             'email_body': operation.email_body,
             'subject': operation.subject,
-            'success_receiver': operation.success_receiver,
-            'failed_receiver': operation.failed_receiver,
             'pdf_id': operation.pdf_id,
-            'user_id': operation.user_id
-        }
\ No newline at end of file
+            'user_id': operation.user_id,
+            'status': operation.status,
+            'recipients': CampaignRecipient.get_campaign_stats(session, operation.id)
+        }
+
+    @classmethod
+    def count_pdf_references(cls, session, pdf_id):
+        """
+        Count the operations that sent a stored resume.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            pdf_id (str): ID of the resume in the resume store.
+
+        Returns:
+            int: The number of operations referencing the resume.
+        """
+        return session.query(cls).filter_by(pdf_id=pdf_id).count()
+
+    @classmethod
+    def get_referenced_pdf_ids(cls, session):
+        """
+        Retrieve the ids of every resume referenced by an operation.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+
+        Returns:
+            set: The referenced resume ids.
+        """
+        return {pdf_id for (pdf_id,) in session.query(cls.pdf_id).distinct() if pdf_id}
+
+    @staticmethod
+    def encode_cursor(created_at: datetime.datetime, operation_id: str) -> str:
+        """
+        Encode the position of an operation in the history as an opaque cursor.
+        """
+        return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{operation_id}".encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[datetime.datetime, str]:
+        """
+        Decode a cursor made by encode_cursor.
+
+        Raises:
+            ValueError: If the cursor is malformed.
+        """
+        try:
+            created_at, operation_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+            return datetime.datetime.fromisoformat(created_at), operation_id
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError("Invalid cursor") from e
+
+    @classmethod
+    def _select_fields(cls, fields) -> list:
+        if not fields:
+            raise ValueError("No operation field selected")
+        unknown = [field for field in fields if field not in OPERATION_FIELDS]
+        if unknown:
+            raise ValueError("Unknown operation fields: {}".format(", ".join(unknown)))
+        return [getattr(cls, field) for field in dict.fromkeys(fields)]
+
+    @classmethod
+    def _page(cls, session, user_id, columns, limit, after=None, since=None, until=None) -> list:
+        return cls._page_query(session, user_id, columns, limit, after, since, until).all()
+
+    @classmethod
+    def _page_query(cls, session, user_id, columns, limit, after=None, since=None, until=None):
+        # The cursor columns are labelled apart, a selected "id" or "created_at" would shadow them
+        query = session.query(*columns, cls.created_at.label("cursor_created_at"), cls.id.label("cursor_id"))
+        query = query.filter(cls.user_id == user_id)
+        if since is not None:
+            query = query.filter(cls.created_at >= since)
+        if until is not None:
+            query = query.filter(cls.created_at < until)
+        if after is not None:
+            # Keyset pagination: continue right after the last operation seen instead of skipping rows.
+            # The plain upper bound lets the database start the index range scan at the cursor.
+            created_at, operation_id = after
+            query = query.filter(cls.created_at <= created_at,
+                                 or_(cls.created_at < created_at,
+                                     and_(cls.created_at == created_at, cls.id < operation_id)))
+        return query.order_by(cls.created_at.desc(), cls.id.desc()).limit(limit)
+
+    @staticmethod
+    def _to_dict(row, columns) -> dict:
+        operation = {}
+        for column in columns:
+            value = getattr(row, column.key)
+            operation[column.key] = value.isoformat() if isinstance(value, datetime.datetime) else value
+        return operation
+
+    @classmethod
+    def get_operations_page(cls, session, user_id=None, user=None, limit=50, cursor=None,
+                            fields=DEFAULT_OPERATION_FIELDS, since=None, until=None) -> tuple[list, Union[str, None]]:
+        """
+        Retrieve one page of the operations of a user, the most recent first.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            user_id (str): ID of the user associated with the operations.
+            user (User, optional): The user, already loaded by the caller. Its existence is not checked again.
+            limit (int, optional): Maximum number of operations in the page. Default is 50.
+            cursor (str, optional): The `next_cursor` of the previous page. Default is the first page.
+            fields (Iterable[str], optional): Columns to return, among OPERATION_FIELDS. Default is DEFAULT_OPERATION_FIELDS.
+            since (datetime.datetime, optional): Only operations created at or after this time.
+            until (datetime.datetime, optional): Only operations created before this time.
+
+        Returns:
+            tuple[list, Union[str, None]]: The operations as dictionaries, and the cursor of the next page or None on the last one.
+
+        Raises:
+            ValueError: If the user does not exist, a field is unknown or the cursor is malformed.
+        """
+        columns = cls._select_fields(fields)
+        user_id = cls._resolve_user_id(session, user_id, user)
+        after = cls.decode_cursor(cursor) if cursor else None
+        # One extra row tells whether there is a next page without counting
+        rows = cls._page(session, user_id, columns, limit + 1, after, since, until)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = cls.encode_cursor(rows[-1].cursor_created_at, rows[-1].cursor_id)
+        return [cls._to_dict(row, columns) for row in rows], next_cursor
+
+    @classmethod
+    def iter_operations(cls, session, user_id=None, user=None, fields=OPERATION_FIELDS,
+                        batch_size=500, since=None, until=None) -> Iterator[dict]:
+        """
+        Iterate over every operation of a user, the most recent first, loading them in batches.
+
+        Memory use depends on the batch size only, not on the length of the history.
+
+        Args:
+            session (Session): SQLAlchemy session object.
+            user_id (str): ID of the user associated with the operations.
+            user (User, optional): The user, already loaded by the caller. Its existence is not checked again.
+            fields (Iterable[str], optional): Columns to return, among OPERATION_FIELDS. Default is all of them.
+            batch_size (int, optional): Number of operations loaded per query. Default is 500.
+            since (datetime.datetime, optional): Only operations created at or after this time.
+            until (datetime.datetime, optional): Only operations created before this time.
+
+        Yields:
+            dict: The operations.
+
+        Raises:
+            ValueError: If the user does not exist or a field is unknown.
+        """
+        columns = cls._select_fields(fields)
+        user_id = cls._resolve_user_id(session, user_id, user)
+        after = None
+        while True:
+            rows = cls._page(session, user_id, columns, batch_size, after, since, until)
+            for row in rows:
+                yield cls._to_dict(row, columns)
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1].cursor_created_at, rows[-1].cursor_id)
@@ -1,6 +1,5 @@
 import uuid
 from sqlalchemy import Column, String
-from passlib.hash import sha256_crypt
 from cryptography.fernet import Fernet  # For encryption
 import os
 import sys
@@ -8,6 +7,8 @@ from typing import Union
 parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
 sys.path.append(parent_dir)
 from database import Base
+from database.types import UTCDateTime
+from utils.password import hash_password, verify_and_update
 from sqlalchemy.orm import relationship
 import datetime
 
@@ -27,6 +28,7 @@ class User(Base):
         email_password (str): Encrypted email password.
         date (str): Date of the operation.
         time (str): Time of the operation.
+        created_at (datetime.datetime): When the user was created, in UTC.
         avatar_base64 (str): Base64 encoded avatar image.
     """
 
@@ -42,6 +44,7 @@ class User(Base):
     phone_number = Column(String(255))
     date = Column(String(55))
     time = Column(String(55))
+    created_at = Column(UTCDateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
     email_password = Column(String(255))  # Store encrypted email password
     # Define the relationship to the Operations table
     operations = relationship("Operations", back_populates="user")
@@ -53,9 +56,9 @@ class User(Base):
             password (str): The password to set.
         """
         # Hashing the password
-        self.password_hash = sha256_crypt.hash(password)
+        self.password_hash = hash_password(password)
 
-    def check_password(self, password:str)->None:
+    def check_password(self, password:str)->bool:
         """
         Check if the provided password matches the user's hashed password.
 
@@ -66,7 +69,8 @@ class User(Base):
             bool: True if the password is correct, False otherwise.
         """
         # Verifying the password
-        return sha256_crypt.verify(password, self.password_hash)
+        is_valid, _ = verify_and_update(password, self.password_hash)
+        return is_valid
 
     def set_email_password(self, email_password:str, encryption_key:str)->None:
         """
@@ -96,7 +100,7 @@ class User(Base):
         return decrypted_password
 
     @classmethod
-    def create_user(cls, session, username:str, email:str, linkedin_link:str, password:str, phone_number:str, email_password:str, encryption_key:str)->bool:
+    def create_user(cls, session, username:str, email:str, linkedin_link:str, password:str, phone_number:str, email_password:str, encryption_key:str, password_hash:str=None)->bool:
         """
         Create a new user and add them to the database.
 
@@ -108,6 +112,7 @@ class User(Base):
             phone_number (str): User's phone number.
             email_password (str): User's email password.
             encryption_key (str): Encryption key to encrypt email password.
+            password_hash (str, optional): Hash of the password, computed beforehand. Default hashes the password here.
         Returns:
             bool: The user created or not.
         """
@@ -124,7 +129,10 @@ class User(Base):
             time=str(datetime.datetime.now().time())  # Add current time
         )
         # Set password and email password
-        new_user.set_password(password)
+        if password_hash is None:
+            new_user.set_password(password)
+        else:
+            new_user.password_hash = password_hash
         new_user.set_email_password(email_password, encryption_key)
 
         # Add the user to the database
@@ -148,8 +156,12 @@ class User(Base):
         user = session.query(cls).filter(cls.email == email).first()
         if user:
             # Verify password
-            if user.check_password(password):
-                # Decrypt and return email password
+            is_valid, new_hash = verify_and_update(password, user.password_hash)
+            if is_valid:
+                # Upgrade a hash made with an outdated scheme or settings
+                if new_hash is not None:
+                    user.password_hash = new_hash
+                    session.commit()
                 user_id = user.id
                 return True, user_id
         return False, None
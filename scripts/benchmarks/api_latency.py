@@ -0,0 +1,101 @@
+"""
+Latency of GET /api/ while slow SMTP requests are in flight.
+
+Every SMTP login is replaced by a fake that sleeps for --smtp-latency seconds, then
+--senders clients call /api/email/send-verification-code in a loop while one client
+measures /api/. With the blocking calls off the event loop, the p99 of /api/ stays flat.
+
+    $ python scripts/benchmarks/api_latency.py --senders 20 --duration 5
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from unittest.mock import patch
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+
+# Run against a throwaway SQLite database unless one is configured
+os.environ.setdefault("DB_TYPE", "sqlite")
+os.environ.setdefault("DB_FILE_PATH", os.path.join(tempfile.mkdtemp(), "benchmark.db"))
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("EMAIL_PROJECT", "project@gmail.com")
+os.environ.setdefault("PASSWORD_EMAIL_PROJECT", "abcd efgh ijkl mnop")
+
+import httpx
+from src.main import app
+
+
+class SlowSMTP:
+    """
+    Stand-in for smtplib.SMTP whose login takes as long as a real Gmail handshake.
+    """
+    latency: float = 0.5
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, *args):
+        time.sleep(self.latency)
+
+    def sendmail(self, *args):
+        pass
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def percentile(samples: list, percent: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+async def measure(duration: float, senders: int) -> list:
+    """
+    Measure /api/ for `duration` seconds while `senders` clients send verification codes.
+
+    Returns:
+        list: The /api/ latencies in seconds.
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        deadline = time.perf_counter() + duration
+        latencies: list = []
+
+        async def sender():
+            while time.perf_counter() < deadline:
+                await client.post("/api/email/send-verification-code", data={"to": "someone@example.com"})
+
+        async def prober():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/api/")
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(prober(), *[sender() for _ in range(senders)])
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--senders", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--smtp-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    SlowSMTP.latency = args.smtp_latency
+    print(f"{'senders':>7} | {'requests':>8} | {'p50 ms':>8} | {'p99 ms':>8}")
+    with patch("smtplib.SMTP", SlowSMTP):
+        for senders in sorted({0, args.senders}):
+            latencies = asyncio.run(measure(args.duration, senders))
+            print(f"{senders:>7} | {len(latencies):>8} | {percentile(latencies, 50) * 1000:>8.1f} | {percentile(latencies, 99) * 1000:>8.1f}")
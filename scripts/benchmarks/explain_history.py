@@ -0,0 +1,90 @@
+"""
+Query plans of the operations history queries, on the database configured in env/database.env.
+
+The history of one user is listed newest first (first page and next page from a cursor) and filtered
+by date range. With the ix_operations_user_created index every query should be an index range scan:
+"SEARCH operations USING INDEX ix_operations_user_created" on SQLite, an "Index Scan" or
+"Index Only Scan" on PostgreSQL and a "range"/"ref" access on MySQL, with no sort step.
+
+    $ python scripts/benchmarks/explain_history.py --operations 20000
+"""
+import os
+import sys
+import uuid
+import argparse
+import datetime
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from sqlalchemy import insert, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from database import create_tables, engine, SessionLocal
+from models.user import User
+from models.operations import Operations, DEFAULT_OPERATION_FIELDS
+
+
+class Explain(Executable, ClauseElement):
+    """
+    EXPLAIN of a query, in the syntax of the database.
+    """
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def visit_explain(element, compiler, **kwargs):
+    prefix = "EXPLAIN QUERY PLAN" if compiler.dialect.name == "sqlite" else "EXPLAIN"
+    return f"{prefix} {compiler.process(element.statement, **kwargs)}"
+
+
+def seed(session, operations: int) -> str:
+    """
+    Create a user with a long history and a few other users, so the planner has a reason to use the index.
+    """
+    user_ids = [str(uuid.uuid4()) for _ in range(10)]
+    session.execute(insert(User), [{"id": user_id, "email": f"{user_id}@example.com"} for user_id in user_ids])
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    rows = [{"id": str(uuid.uuid4()), "user_id": user_ids[index % len(user_ids)], "subject": f"Subject {index}",
+             "created_at": start + datetime.timedelta(minutes=index)} for index in range(operations)]
+    for batch in range(0, len(rows), 1000):
+        session.execute(insert(Operations), rows[batch:batch + 1000])
+    session.commit()
+    return user_ids[0]
+
+
+def history_queries(session, user_id: str) -> dict:
+    """
+    Build the statements the history endpoints run, through the same code path as the API.
+    """
+    columns = Operations._select_fields(DEFAULT_OPERATION_FIELDS)
+    first_page = Operations._page(session, user_id, columns, 51)
+    after = (first_page[-1].cursor_created_at, first_page[-1].cursor_id)
+    since = first_page[-1].cursor_created_at - datetime.timedelta(days=1)
+    return {
+        "first page": Operations._page_query(session, user_id, columns, 51).statement,
+        "next page": Operations._page_query(session, user_id, columns, 51, after=after).statement,
+        "date range": Operations._page_query(session, user_id, columns, 51, since=since,
+                                             until=first_page[-1].cursor_created_at).statement,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=20000, help="Operations created before explaining, 0 to use the existing data")
+    args = parser.parse_args()
+    create_tables()
+    with SessionLocal() as session:
+        if args.operations:
+            user_id = seed(session, args.operations)
+        else:
+            user_id = session.execute(select(Operations.user_id).limit(1)).scalar_one()
+        statements = history_queries(session, user_id)
+        with engine.connect() as connection:
+            if engine.dialect.name == "postgresql":
+                connection.exec_driver_sql("ANALYZE operations")
+            for name, statement in statements.items():
+                print(f"== {name}")
+                for row in connection.execute(Explain(statement)):
+                    print("  ", " | ".join(str(value) for value in row))
@@ -0,0 +1,54 @@
+"""
+Login throughput of password verification, in the calling thread and in the password process pool.
+
+Every verification checks the same password against a hash made with the configured scheme and settings
+(PASSWORD_SCHEMES, PASSWORD_SCHEME_SETTINGS in env/secrets.env):
+
+    $ python scripts/benchmarks/password_hashing.py --logins 64
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from utils.password import (PASSWORD_SCHEMES, PASSWORD_WORKERS, hash_password, verify_and_update,
+                            verify_and_update_async, get_password_executor, shutdown_password_executor)
+from utils.concurrency import run_blocking
+
+
+async def burst(run, logins: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(run() for _ in range(logins)))
+    return time.perf_counter() - start
+
+
+def report(label: str, logins: int, elapsed: float, cores: int) -> None:
+    rate = logins / elapsed
+    print(f"{label:<22} {elapsed:6.2f}s  {rate:7.1f} logins/s  {rate / cores:6.1f} logins/s per core ({cores} cores)")
+
+
+async def main(logins: int) -> None:
+    password_hash = hash_password("Abcd1234")
+    print(f"scheme: {PASSWORD_SCHEMES[0]}  hash: {password_hash[:24]}...  logins: {logins}")
+    threads = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS)
+    elapsed = await burst(lambda: run_blocking(verify_and_update, "Abcd1234", password_hash, executor=threads), logins)
+    report("thread pool", logins, elapsed, PASSWORD_WORKERS)
+    threads.shutdown()
+    # Start the workers before timing, like a server does on its first logins
+    await asyncio.gather(*(verify_and_update_async("Abcd1234", password_hash) for _ in range(PASSWORD_WORKERS)))
+    elapsed = await burst(lambda: verify_and_update_async("Abcd1234", password_hash), logins)
+    report("process pool", logins, elapsed, PASSWORD_WORKERS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    args = parser.parse_args()
+    get_password_executor()
+    try:
+        asyncio.run(main(args.logins))
+    finally:
+        shutdown_password_executor()
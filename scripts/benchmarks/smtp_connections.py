@@ -0,0 +1,51 @@
+"""
+Messages per second of send_campaign against the number of parallel SMTP connections.
+
+Runs against the local fake SMTP server with a simulated round trip, so it needs no network:
+
+    $ python scripts/benchmarks/smtp_connections.py --messages 200 --latency 0.005
+"""
+import os
+import sys
+import time
+import argparse
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from src.emails.main import send_campaign, ConnectionLimiter, SendRateLimiter
+from tests.resource.smtp_server import FakeSMTPServer
+
+
+def benchmark(messages: int, latency: float, connections: int) -> float:
+    """
+    Send one campaign and return its throughput.
+
+    Args:
+        messages (int): Number of recipients.
+        latency (float): Simulated server round trip in seconds.
+        connections (int): Number of parallel SMTP sessions.
+
+    Returns:
+        float: Messages sent per second.
+    """
+    emails_list = [f"email{i}@example.com" for i in range(messages)]
+    with FakeSMTPServer(latency=latency) as server:
+        start = time.perf_counter()
+        success_receiver, _ = send_campaign("me@example.com", "secret", emails_list, "Subject", "<p>Body</p>",
+                                            connections=connections,
+                                            limiter=ConnectionLimiter(connections, connections),
+                                            send_limiter=SendRateLimiter(per_minute=0, per_day=0),
+                                            smtp_settings={"host": server.host, "port": server.port, "starttls": False})
+        elapsed = time.perf_counter() - start
+    assert len(success_receiver) == messages
+    return messages / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+    print(f"{'connections':>11} | {'msg/s':>8}")
+    for connections in args.connections:
+        print(f"{connections:>11} | {benchmark(args.messages, args.latency, connections):>8.1f}")
@@ -0,0 +1,50 @@
+"""
+Per-address cost of email validation, one call at a time and in batch:
+
+    $ python scripts/benchmarks/validity.py --addresses 100000
+"""
+import os
+import re
+import sys
+import time
+import argparse
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from utils.validity import is_valid_email, validate_emails
+
+# The pattern as it was matched before, from its string on every call
+RAW_EMAIL_PATTERN = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+
+
+def raw_is_valid_email(email: str) -> bool:
+    return bool(re.match(RAW_EMAIL_PATTERN, email))
+
+
+def make_addresses(count: int) -> list:
+    """
+    Build a list where one address in ten is invalid.
+    """
+    return [f"person{i}@example" if i % 10 == 0 else f"person{i}@example.com" for i in range(count)]
+
+
+def measure(label: str, run, count: int, repeat: int) -> None:
+    best = min(_timed(run) for _ in range(repeat))
+    print(f"{label:<28} {best * 1000:8.1f} ms  {best / count * 1e9:7.0f} ns/address")
+
+
+def _timed(run) -> float:
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--addresses", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    addresses = make_addresses(args.addresses)
+    print(f"addresses: {args.addresses}  (best of {args.repeat})")
+    measure("re.match(pattern string)", lambda: [raw_is_valid_email(email) for email in addresses], args.addresses, args.repeat)
+    measure("is_valid_email", lambda: [is_valid_email(email) for email in addresses], args.addresses, args.repeat)
+    measure("validate_emails", lambda: validate_emails(addresses), args.addresses, args.repeat)
@@ -60,7 +60,8 @@ if is_connect:
             linkedin_link VARCHAR(255),
             password_hash VARCHAR(255),
             phone_number VARCHAR(255),
-            email_password VARCHAR(255)
+            email_password VARCHAR(255),
+            created_at DATETIMEOFFSET
         )
         """
 
@@ -83,16 +84,25 @@ if is_connect:
             time VARCHAR(255),
             email_body TEXT,
             subject TEXT,
-            pdf_id VARCHAR(37),
+            pdf_id VARCHAR(64),
+            created_at DATETIMEOFFSET,
             success_receiver VARCHAR(255),
             failed_receiver VARCHAR(255),
             user_id VARCHAR(255),
+            status VARCHAR(16),
+            resume_name VARCHAR(255),
+            runner_id VARCHAR(37),
+            lease_expires_at DATETIMEOFFSET,
             FOREIGN KEY (user_id) REFERENCES users(id)
         )
         """
 
         # Execute the SQL query to create operations table
         cursor.execute(create_operations_table_query)
+        # The history of a user is read newest first, by date range
+        cursor.execute("CREATE INDEX ix_operations_user_created ON operations (user_id, created_at, id)")
+        # Unfinished campaigns are looked up at startup
+        cursor.execute("CREATE INDEX ix_operations_status ON operations (status)")
 
         # Commit the transaction
         connection.commit()
@@ -100,4 +110,32 @@ if is_connect:
     except Exception as e:
         print(f"Error creating operations table: {e}")
 
+    try:
+        # SQL query to create the campaign_recipients table, one row per recipient of an operation
+        create_campaign_recipients_table_query = """
+        CREATE TABLE IF NOT EXISTS campaign_recipients (
+            id INT IDENTITY(1,1) PRIMARY KEY,
+            operation_id VARCHAR(37) NOT NULL,
+            user_id VARCHAR(37) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            status VARCHAR(16) NOT NULL,
+            error TEXT,
+            sent_at DATETIMEOFFSET,
+            template_values TEXT,
+            FOREIGN KEY (operation_id) REFERENCES operations(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """
+
+        # Execute the SQL query to create campaign_recipients table and its indexes
+        cursor.execute(create_campaign_recipients_table_query)
+        cursor.execute("CREATE INDEX ix_campaign_recipients_user_email ON campaign_recipients (user_id, email)")
+        cursor.execute("CREATE INDEX ix_campaign_recipients_operation_status ON campaign_recipients (operation_id, status)")
+
+        # Commit the transaction
+        connection.commit()
+        print("Table Campaign Recipients Created !")
+    except Exception as e:
+        print(f"Error creating campaign_recipients table: {e}")
+
     connection.close()
@@ -63,7 +63,8 @@ if is_connect:
             linkedin_link VARCHAR2(255),
             password_hash VARCHAR2(255),
             phone_number VARCHAR2(255),
-            email_password VARCHAR2(255)
+            email_password VARCHAR2(255),
+            created_at TIMESTAMP WITH TIME ZONE
         )
         """
 
@@ -86,16 +87,25 @@ if is_connect:
             time VARCHAR2(255),
             email_body CLOB,
             subject CLOB,
-            pdf_id VARCHAR2(37),
+            pdf_id VARCHAR2(64),
+            created_at TIMESTAMP WITH TIME ZONE,
             success_receiver VARCHAR2(255),
             failed_receiver VARCHAR2(255),
             user_id VARCHAR2(255),
+            status VARCHAR2(16),
+            resume_name VARCHAR2(255),
+            runner_id VARCHAR2(37),
+            lease_expires_at TIMESTAMP WITH TIME ZONE,
             FOREIGN KEY (user_id) REFERENCES users(id)
         )
         """
 
         # Execute the SQL query to create operations table
         cursor.execute(create_operations_table_query)
+        # The history of a user is read newest first, by date range
+        cursor.execute("CREATE INDEX ix_operations_user_created ON operations (user_id, created_at, id)")
+        # Unfinished campaigns are looked up at startup
+        cursor.execute("CREATE INDEX ix_operations_status ON operations (status)")
 
         # Commit the transaction
         connection.commit()
@@ -103,4 +113,32 @@ if is_connect:
     except Exception as e:
         print(f"Error creating operations table: {e}")
 
+    try:
+        # SQL query to create the campaign_recipients table, one row per recipient of an operation
+        create_campaign_recipients_table_query = """
+        CREATE TABLE campaign_recipients (
+            id NUMBER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            operation_id VARCHAR2(37) NOT NULL,
+            user_id VARCHAR2(37) NOT NULL,
+            email VARCHAR2(255) NOT NULL,
+            status VARCHAR2(16) NOT NULL,
+            error CLOB,
+            sent_at TIMESTAMP WITH TIME ZONE,
+            template_values CLOB,
+            FOREIGN KEY (operation_id) REFERENCES operations(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+        """
+
+        # Execute the SQL query to create campaign_recipients table and its indexes
+        cursor.execute(create_campaign_recipients_table_query)
+        cursor.execute("CREATE INDEX ix_campaign_recipients_user_email ON campaign_recipients (user_id, email)")
+        cursor.execute("CREATE INDEX ix_campaign_recipients_operation_status ON campaign_recipients (operation_id, status)")
+
+        # Commit the transaction
+        connection.commit()
+        print("Table Campaign Recipients Created !")
+    except Exception as e:
+        print(f"Error creating campaign_recipients table: {e}")
+
     connection.close()
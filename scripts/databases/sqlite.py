@@ -14,6 +14,7 @@ try:
     cursor = connection.cursor()
 
     # Create database if it doesn't exist
+    cursor.execute("DROP TABLE IF EXISTS campaign_recipients")
     cursor.execute("DROP TABLE IF EXISTS users")
     cursor.execute("DROP TABLE IF EXISTS operations")
 
@@ -27,7 +28,8 @@ try:
             linkedin_link TEXT,
             password_hash TEXT,
             phone_number TEXT,
-            email_password TEXT
+            email_password TEXT,
+            created_at DATETIME
         )
     """)
 
@@ -43,10 +45,38 @@ try:
             success_receiver TEXT,
             failed_receiver TEXT,
             user_id TEXT,
+            created_at DATETIME,
+            status TEXT,
+            resume_name TEXT,
+            runner_id TEXT,
+            lease_expires_at DATETIME,
             FOREIGN KEY (user_id) REFERENCES users(id)
         )
     """)
 
+    # The history of a user is read newest first, by date range
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_operations_user_created ON operations (user_id, created_at, id)")
+    # Unfinished campaigns are looked up at startup
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_operations_status ON operations (status)")
+
+    # One row per recipient of an operation
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS campaign_recipients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            operation_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            email TEXT NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            sent_at DATETIME,
+            template_values TEXT,
+            FOREIGN KEY (operation_id) REFERENCES operations(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_campaign_recipients_user_email ON campaign_recipients (user_id, email)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_campaign_recipients_operation_status ON campaign_recipients (operation_id, status)")
+
     # Commit changes and close connection
     connection.commit()
     connection.close()
@@ -0,0 +1,36 @@
+"""
+Remove the stored resumes that no operation references any more.
+
+    $ python scripts/gc_resumes.py --min-age 86400 [--dry-run]
+"""
+import os
+import sys
+import argparse
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from pathlib import Path
+from database import SessionLocal
+from models.user import User
+from models.operations import Operations
+from utils.blob_store import BlobStore
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directory", default=str(Path("./data/resume")))
+    parser.add_argument("--min-age", type=float, default=24 * 60 * 60,
+                        help="Keep resumes written or reused less than this many seconds ago.")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    store = BlobStore(args.directory)
+    with SessionLocal() as session:
+        referenced_ids = Operations.get_referenced_pdf_ids(session)
+    if args.dry_run:
+        unreferenced = [blob_id for blob_id in store.list_ids() if blob_id not in referenced_ids]
+        print(f"{len(unreferenced)} unreferenced resume(s):")
+        for blob_id in unreferenced:
+            print(f"  {store.path(blob_id)}")
+    else:
+        removed = store.collect_garbage(referenced_ids, min_age=args.min_age)
+        print(f"Removed {len(removed)} unreferenced resume(s).")
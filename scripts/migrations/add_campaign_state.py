@@ -0,0 +1,97 @@
+"""
+Add the columns that let campaigns survive a restart to the operations table.
+
+- operations.status, resume_name, runner_id and lease_expires_at are added if missing.
+  Existing operations finished before the upgrade, their status is set to 'done'.
+- ix_operations_status on operations (status) is created if missing, so the unfinished
+  campaigns are found at startup without scanning the history.
+
+It can be run again safely, only what is missing is done:
+
+    $ python scripts/migrations/add_campaign_state.py
+"""
+import os
+import sys
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from sqlalchemy import inspect, text, update
+from database import engine, SessionLocal
+from models.operations import Operations
+
+DATETIME_TYPES: dict = {
+    "sqlite": "DATETIME",
+    "mysql": "DATETIME(6)",
+    "mariadb": "DATETIME(6)",
+    "postgresql": "TIMESTAMP WITH TIME ZONE",
+    "mssql": "DATETIMEOFFSET",
+    "oracle": "TIMESTAMP WITH TIME ZONE",
+}
+
+
+def column_types() -> dict:
+    """
+    Get the SQL type of each new column on the database in use.
+    """
+    varchar = "VARCHAR2" if engine.dialect.name == "oracle" else "VARCHAR"
+    return {
+        "status": f"{varchar}(16)",
+        "resume_name": f"{varchar}(255)",
+        "runner_id": f"{varchar}(37)",
+        "lease_expires_at": DATETIME_TYPES[engine.dialect.name],
+    }
+
+
+def add_columns() -> list:
+    """
+    Add the missing campaign state columns to operations.
+
+    Returns:
+        list: The names of the added columns.
+    """
+    existing = [column["name"] for column in inspect(engine).get_columns("operations")]
+    keyword = "ADD" if engine.dialect.name in ("mssql", "oracle") else "ADD COLUMN"
+    added: list = []
+    with engine.begin() as connection:
+        for name, column_type in column_types().items():
+            if name not in existing:
+                connection.execute(text(f"ALTER TABLE operations {keyword} {name} {column_type}"))
+                added.append(name)
+    return added
+
+
+def mark_done() -> int:
+    """
+    Set the status of the operations saved before the upgrade, which all finished.
+
+    Returns:
+        int: The number of operations updated.
+    """
+    with SessionLocal() as session:
+        result = session.execute(update(Operations).where(Operations.status.is_(None)).values(status=Operations.DONE)
+                                 .execution_options(synchronize_session=False))
+        session.commit()
+        return result.rowcount
+
+
+def create_status_index() -> bool:
+    """
+    Create the status index of operations if it is missing.
+
+    Returns:
+        bool: True if the index was created.
+    """
+    indexes = [index["name"] for index in inspect(engine).get_indexes("operations")]
+    if "ix_operations_status" in indexes:
+        return False
+    for index in Operations.__table__.indexes:
+        if index.name == "ix_operations_status":
+            index.create(engine)
+    return True
+
+
+if __name__ == "__main__":
+    for name in add_columns():
+        print(f"operations.{name} added.")
+    print(f"{mark_done()} operations marked done.")
+    if create_status_index():
+        print("ix_operations_status created.")
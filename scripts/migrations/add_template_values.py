@@ -0,0 +1,38 @@
+"""
+Add the column that keeps the placeholder values of personalized campaigns to campaign_recipients.
+
+- campaign_recipients.template_values is added if missing. Existing rows keep it empty:
+  they were sent with the same body for every recipient.
+
+It can be run again safely, only what is missing is done:
+
+    $ python scripts/migrations/add_template_values.py
+"""
+import os
+import sys
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from sqlalchemy import inspect, text
+from database import engine
+
+
+def add_column() -> bool:
+    """
+    Add campaign_recipients.template_values if it is missing.
+
+    Returns:
+        bool: True if the column was added.
+    """
+    existing = [column["name"] for column in inspect(engine).get_columns("campaign_recipients")]
+    if "template_values" in existing:
+        return False
+    keyword = "ADD" if engine.dialect.name in ("mssql", "oracle") else "ADD COLUMN"
+    column_type = "CLOB" if engine.dialect.name == "oracle" else "TEXT"
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE campaign_recipients {keyword} template_values {column_type}"))
+    return True
+
+
+if __name__ == "__main__":
+    if add_column():
+        print("campaign_recipients.template_values added.")
@@ -0,0 +1,105 @@
+"""
+Add the timezone-aware timestamps of users and operations and the index of the operations history.
+
+- operations.created_at and users.created_at are added if missing and filled from the date and time
+  strings of existing rows, which were written in the server's local time.
+- ix_operations_user_created on operations (user_id, created_at, id) is created if missing, so
+  listing the history of a user and filtering it by date are index range scans.
+
+It can be run again safely, only what is missing is done:
+
+    $ python scripts/migrations/add_timestamps.py
+"""
+import os
+import sys
+import datetime
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from sqlalchemy import inspect, text
+from database import engine, SessionLocal
+from models.user import User
+from models.operations import Operations
+
+COLUMN_TYPES: dict = {
+    "sqlite": "DATETIME",
+    "mysql": "DATETIME(6)",
+    "mariadb": "DATETIME(6)",
+    "postgresql": "TIMESTAMP WITH TIME ZONE",
+    "mssql": "DATETIMEOFFSET",
+    "oracle": "TIMESTAMP WITH TIME ZONE",
+}
+BATCH_SIZE: int = 1000
+
+
+def parse_created_at(date: str, time: str) -> datetime.datetime:
+    """
+    Rebuild the creation time of a row from its local date and time strings, in UTC.
+    """
+    try:
+        return datetime.datetime.fromisoformat(f"{date}T{time}").astimezone(datetime.timezone.utc)
+    except (TypeError, ValueError):
+        # Unreadable rows go to the start of the history
+        return datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_created_at(table: str) -> bool:
+    """
+    Add the created_at column to a table if it is missing.
+
+    Returns:
+        bool: True if the column was added.
+    """
+    columns = [column["name"] for column in inspect(engine).get_columns(table)]
+    if "created_at" in columns:
+        return False
+    keyword = "ADD" if engine.dialect.name in ("mssql", "oracle") else "ADD COLUMN"
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {table} {keyword} created_at {COLUMN_TYPES[engine.dialect.name]}"))
+    return True
+
+
+def backfill(model, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Fill created_at for the rows of a model without one, one committed batch at a time.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    updated = 0
+    with SessionLocal() as session:
+        while True:
+            rows = (session.query(model.id, model.date, model.time)
+                    .filter(model.created_at.is_(None)).limit(batch_size).all())
+            if not rows:
+                return updated
+            session.bulk_update_mappings(model, [
+                {"id": row_id, "created_at": parse_created_at(date, time)} for row_id, date, time in rows
+            ])
+            session.commit()
+            updated += len(rows)
+
+
+def create_history_index() -> bool:
+    """
+    Create the (user_id, created_at, id) index of operations if it is missing.
+
+    Returns:
+        bool: True if the index was created.
+    """
+    indexes = [index["name"] for index in inspect(engine).get_indexes("operations")]
+    if "ix_operations_user_created" in indexes:
+        return False
+    for index in Operations.__table__.indexes:
+        if index.name == "ix_operations_user_created":
+            index.create(engine)
+    return True
+
+
+if __name__ == "__main__":
+    for model in (Operations, User):
+        table = model.__tablename__
+        if add_created_at(table):
+            print(f"{table}.created_at added.")
+        print(f"{backfill(model)} {table} backfilled.")
+    if create_history_index():
+        print("ix_operations_user_created created.")
@@ -0,0 +1,56 @@
+"""
+Create the campaign_recipients table and fill it from the comma-joined receivers of existing operations.
+
+Operations are read in batches ordered by id and each batch is committed on its own, so the
+script can be stopped and run again: operations that already have recipients are skipped.
+
+    $ python scripts/migrations/backfill_campaign_recipients.py --batch-size 500
+"""
+import os
+import sys
+import argparse
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from sqlalchemy import exists
+from database import engine, SessionLocal
+from models.operations import Operations
+from models.campaign_recipient import CampaignRecipient
+
+
+def backfill(batch_size: int = 500) -> tuple[int, int]:
+    """
+    Record the recipients of every operation that has none yet.
+
+    Args:
+        batch_size (int, optional): Number of operations per committed batch. Default is 500.
+
+    Returns:
+        tuple[int, int]: The number of operations and of recipient rows written.
+    """
+    CampaignRecipient.__table__.create(engine, checkfirst=True)
+    operations_count, rows_count = 0, 0
+    last_id = ""
+    with SessionLocal() as session:
+        while True:
+            batch = (session.query(Operations.id, Operations.user_id, Operations.success_receiver,
+                                   Operations.failed_receiver, Operations.created_at)
+                     .filter(Operations.id > last_id, Operations.user_id.isnot(None))
+                     .filter(~exists().where(CampaignRecipient.operation_id == Operations.id))
+                     .order_by(Operations.id).limit(batch_size).all())
+            if not batch:
+                return operations_count, rows_count
+            for operation_id, user_id, success_receiver, failed_receiver, created_at in batch:
+                rows_count += CampaignRecipient.add_results(session, operation_id, user_id, success_receiver,
+                                                            failed_receiver, sent_at=created_at)
+            session.commit()
+            operations_count += len(batch)
+            last_id = batch[-1][0]
+            print(f"{operations_count} operations, {rows_count} recipients")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    operations_count, rows_count = backfill(args.batch_size)
+    print(f"Done: {rows_count} recipients of {operations_count} operations backfilled.")
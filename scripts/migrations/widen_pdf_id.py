@@ -0,0 +1,31 @@
+"""
+Widen operations.pdf_id to 64 characters, the length of the SHA-256 ids of the resume store.
+
+Run it once on databases created before resumes were stored by content hash:
+
+    $ python scripts/migrations/widen_pdf_id.py
+"""
+import os
+import sys
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from sqlalchemy import text
+from database import engine
+
+STATEMENTS: dict = {
+    "mysql": "ALTER TABLE operations MODIFY pdf_id VARCHAR(64)",
+    "mariadb": "ALTER TABLE operations MODIFY pdf_id VARCHAR(64)",
+    "postgresql": "ALTER TABLE operations ALTER COLUMN pdf_id TYPE VARCHAR(64)",
+    "mssql": "ALTER TABLE operations ALTER COLUMN pdf_id VARCHAR(64)",
+    "oracle": "ALTER TABLE operations MODIFY (pdf_id VARCHAR2(64))",
+}
+
+if __name__ == "__main__":
+    statement = STATEMENTS.get(engine.dialect.name)
+    if statement is None:
+        # SQLite does not enforce VARCHAR lengths
+        print(f"Nothing to do for {engine.dialect.name}.")
+    else:
+        with engine.begin() as connection:
+            connection.execute(text(statement))
+        print("operations.pdf_id widened to 64 characters.")
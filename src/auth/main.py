@@ -0,0 +1,180 @@
+import os
+import sys
+import datetime
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Union
+from cryptography.fernet import Fernet
+from dotenv import load_dotenv
+from fastapi import Depends, Form, HTTPException
+from sqlalchemy.orm import Session
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from database import get_session
+from models.user import User
+from utils.cache import LRUCache
+from utils.concurrency import run_blocking
+from utils.jwt import decode_access_token
+
+# Load variables from the specified .env file
+load_dotenv(dotenv_path=str(Path("./env/secrets.env")))
+
+JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY")
+ALGORITHM: str = os.getenv("ALGORITHM")
+AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 4096))
+AUTH_USER_CACHE_SIZE: int = int(os.getenv("AUTH_USER_CACHE_SIZE", 1024))
+AUTH_USER_CACHE_TTL: float = float(os.getenv("AUTH_USER_CACHE_TTL", 60))
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """
+    Read-only copy of the user a request is authenticated as.
+
+    It is not bound to any session, so it can be cached and shared between requests.
+
+    Attributes:
+        id (str): Unique identifier for the user.
+        email (str): User's email address.
+        username (str): User's username.
+        email_password (str): Encrypted email password.
+        phone_number (str): User's phone number.
+        linkedin_link (str): User's LinkedIn profile URL.
+    """
+    id: str
+    email: str
+    username: str
+    email_password: str
+    phone_number: str = None
+    linkedin_link: str = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthenticatedUser":
+        return cls(id=user.id, email=user.email, username=user.username, email_password=user.email_password,
+                   phone_number=user.phone_number, linkedin_link=user.linkedin_link)
+
+    def get_email_password(self, encryption_key: str) -> str:
+        """
+        Decrypt and retrieve the email password for the user.
+
+        Parameters:
+            encryption_key (str): The encryption key to use for decryption.
+
+        Returns:
+            str: The decrypted email password.
+        """
+        return Fernet(encryption_key).decrypt(self.email_password.encode()).decode()
+
+
+# Claims of the tokens already verified, a token is only decoded once
+token_cache = LRUCache(maxsize=AUTH_TOKEN_CACHE_SIZE)
+# Users the tokens belong to; the time to live bounds how long a deleted user stays authenticated
+user_cache = LRUCache(maxsize=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL)
+
+
+def get_token_user_id(access_token: str) -> Union[str, None]:
+    """
+    Verify an access token and get the ID of its user.
+
+    Args:
+        access_token (str): The JWT access token.
+
+    Returns:
+        Union[str, None]: The user ID, or None if the token is invalid or expired.
+    """
+    if not access_token:
+        return None
+    claims = token_cache.get(access_token)
+    if claims is None:
+        claims = decode_access_token(access_token, JWT_SECRET_KEY, ALGORITHM)
+        if not claims["valid"]:
+            # Invalid tokens are not cached, they would only push valid ones out
+            return None
+        token_cache.set(access_token, claims)
+    if claims["exp"] < datetime.datetime.now(datetime.timezone.utc):
+        token_cache.invalidate(access_token)
+        return None
+    return claims["user_id"]
+
+
+def load_user(session: Session, user_id: str) -> Union[AuthenticatedUser, None]:
+    """
+    Get the user with the given ID, from the cache or from the database.
+
+    Args:
+        session (Session): Session used when the user is not cached.
+        user_id (str): The user's ID.
+
+    Returns:
+        Union[AuthenticatedUser, None]: The user, or None if it does not exist.
+    """
+    user = user_cache.get(user_id)
+    if user is None:
+        db_user = User.get_user_by_id(session, user_id)
+        if db_user is None:
+            return None
+        user = AuthenticatedUser.from_user(db_user)
+        user_cache.set(user_id, user)
+    return user
+
+
+def invalidate_user(user_id: str) -> None:
+    """
+    Forget the cached copy of a user, to call whenever the user is modified.
+    """
+    user_cache.invalidate(user_id)
+
+
+async def authenticate(access_token: str, session: Session) -> AuthenticatedUser:
+    """
+    Get the user an access token belongs to.
+
+    Args:
+        access_token (str): The JWT access token.
+        session (Session): Session used when the user is not cached.
+
+    Returns:
+        AuthenticatedUser: The user.
+
+    Raises:
+        HTTPException: 401 if the token is invalid or expired, or its user does not exist.
+    """
+    user_id = get_token_user_id(access_token)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid access token")
+    # A cached user needs no trip to the executor
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await run_blocking(load_user, session, user_id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid access token")
+    return user
+
+
+async def current_user_id(access_token: str) -> str:
+    """
+    FastAPI dependency verifying the `access_token` path or query parameter, without loading the user.
+    """
+    user_id = get_token_user_id(access_token)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid access token")
+    return user_id
+
+
+async def current_user(access_token: str, session: Session = Depends(get_session)) -> AuthenticatedUser:
+    """
+    FastAPI dependency authenticating the `access_token` path or query parameter.
+
+    Example:
+        >>> @api_router.get("/operations/{access_token}/")
+        ... async def get_operation_user(user: AuthenticatedUser = Depends(current_user)):
+        ...     return user.id
+    """
+    return await authenticate(access_token, session)
+
+
+async def current_user_form(access_token: str = Form(None), session: Session = Depends(get_session)) -> AuthenticatedUser:
+    """
+    FastAPI dependency authenticating the `access_token` form field.
+    """
+    return await authenticate(access_token, session)
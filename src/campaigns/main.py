@@ -0,0 +1,400 @@
+import os
+import sys
+import time
+import uuid
+import hashlib
+import datetime
+import threading
+from pathlib import Path
+from typing import Callable, Union
+from dotenv import load_dotenv
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from database import SessionLocal
+from models.user import User
+from models.operations import Operations
+from models.campaign_recipient import CampaignRecipient
+from src.emails.main import send_campaign, SenderPaused
+from src.emails.templates import compile_template
+
+# Load variables from the specified .env file
+load_dotenv(dotenv_path=str(Path("./env/secrets.env")))
+load_dotenv(dotenv_path=str(Path("./env/campaign.env")))
+
+FERNET_KEY: str = os.getenv("FERNET_KEY")
+CAMPAIGN_CHECKPOINT_SIZE: int = int(os.getenv("CAMPAIGN_CHECKPOINT_SIZE", 20))
+CAMPAIGN_CHECKPOINT_SECONDS: float = float(os.getenv("CAMPAIGN_CHECKPOINT_SECONDS", 5))
+CAMPAIGN_LEASE_SECONDS: float = float(os.getenv("CAMPAIGN_LEASE_SECONDS", 60))
+CAMPAIGN_RESUME_SECONDS: float = float(os.getenv("CAMPAIGN_RESUME_SECONDS", 60))
+CAMPAIGN_MAX_PAUSE_SECONDS: float = float(os.getenv("CAMPAIGN_MAX_PAUSE_SECONDS", 60))
+
+# Identifies this process as the runner of the campaigns it sends
+RUNNER_ID: str = str(uuid.uuid4())
+
+
+def _new_runner_id() -> None:
+    global RUNNER_ID
+    RUNNER_ID = str(uuid.uuid4())
+
+
+# Forked workers (e.g. uvicorn --workers) must not share the leases of their parent
+os.register_at_fork(after_in_child=_new_runner_id)
+
+
+def campaign_message_id(operation_id: str, email: str, sender_email: str) -> str:
+    """
+    Get the Message-ID of the copy of a campaign sent to one address.
+
+    It is the same on every attempt, so a copy sent again after a restart is the same message
+    for mailboxes that de-duplicate by Message-ID, such as Gmail.
+
+    Args:
+        operation_id (str): ID of the operation.
+        email (str): The recipient's address.
+        sender_email (str): The sender's address, whose domain ends the id.
+
+    Returns:
+        str: The Message-ID, with its angle brackets.
+    """
+    digest = hashlib.sha256(f"{operation_id}:{email}".encode()).hexdigest()[:32]
+    return f"<{digest}@{sender_email.rsplit('@', 1)[-1]}>"
+
+
+class Checkpointer:
+    """
+    Report callback of a campaign that writes the outcome of each recipient to the database in batches.
+
+    Results are buffered and written every `size` recipients or `seconds` seconds, whichever
+    comes first, with one bulk UPDATE. After a crash only the recipients of the last unwritten
+    batch are still pending, and only those are sent again.
+
+    Args:
+        operation_id (str): ID of the operation.
+        row_ids (dict): ID of the campaign_recipients row of each address.
+        errors (dict): Why each failed address failed, filled by send_campaign.
+        report (Callable, optional): Called with (email, is_sent) after each recipient, e.g. the job report.
+        size (int, optional): Results per batch. Default is CAMPAIGN_CHECKPOINT_SIZE.
+        seconds (float, optional): Longest time a result stays unwritten. Default is CAMPAIGN_CHECKPOINT_SECONDS.
+        session_factory (Callable, optional): Opens database sessions. Default is SessionLocal.
+    """
+
+    def __init__(self, operation_id: str, row_ids: dict, errors: dict, report: Callable[[str, bool], None] = None,
+                 size: int = CAMPAIGN_CHECKPOINT_SIZE, seconds: float = CAMPAIGN_CHECKPOINT_SECONDS,
+                 session_factory: Callable = SessionLocal):
+        self.operation_id = operation_id
+        self.row_ids = row_ids
+        self.errors = errors
+        self.report = report
+        self.size = size
+        self.seconds = seconds
+        self.session_factory = session_factory
+        self.written: int = 0
+        self._buffer: list = []
+        self._flushed_at: float = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def __call__(self, email: str, is_sent: bool) -> None:
+        row = {
+            "id": self.row_ids[email],
+            "status": CampaignRecipient.SENT if is_sent else CampaignRecipient.FAILED,
+            "error": None if is_sent else self.errors.get(email),
+            "sent_at": datetime.datetime.now(datetime.timezone.utc),
+        }
+        with self._lock:
+            self._buffer.append(row)
+            is_due = len(self._buffer) >= self.size or time.monotonic() - self._flushed_at >= self.seconds
+        if is_due:
+            self.flush()
+        if self.report is not None:
+            self.report(email, is_sent)
+
+    def flush(self) -> None:
+        """
+        Write the buffered results now.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+                self._flushed_at = time.monotonic()
+            if not rows:
+                return
+            try:
+                with self.session_factory() as session:
+                    CampaignRecipient.checkpoint(session, rows)
+                    session.commit()
+            except Exception:
+                # Keep them for the next flush, they are still pending in the database
+                with self._lock:
+                    self._buffer[:0] = rows
+                raise
+            self.written += len(rows)
+
+
+class Lease:
+    """
+    Keeps the lease of a campaign while it sends, renewing it from a background thread.
+
+    When a renewal is refused, or renewals keep failing until the lease could expire before the
+    next one, `lost` is set and the campaign must stop sending: another process may take it.
+
+    Args:
+        operation_id (str): ID of the operation.
+        runner_id (str): ID of the process holding the lease.
+        seconds (float): How long the lease lasts; it is renewed every third of it.
+        session_factory (Callable, optional): Opens database sessions. Default is SessionLocal.
+    """
+
+    def __init__(self, operation_id: str, runner_id: str, seconds: float, session_factory: Callable = SessionLocal):
+        self.operation_id = operation_id
+        self.runner_id = runner_id
+        self.seconds = seconds
+        self.session_factory = session_factory
+        self.lost = threading.Event()
+        self._renewed_at: float = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._renew, name=f"lease-{operation_id}", daemon=True)
+
+    def _renew(self) -> None:
+        while not self._stop.wait(self.seconds / 3):
+            started_at = time.monotonic()
+            try:
+                with self.session_factory() as session:
+                    is_held = Operations.claim(session, self.operation_id, self.runner_id, self.seconds)
+            except Exception as e:
+                print(f"Error renewing the lease of campaign {self.operation_id}: {e}")
+                # Still held until it expires, but the next renewal would come too late
+                is_held = started_at + self.seconds / 3 < self._renewed_at + self.seconds
+            else:
+                if is_held:
+                    self._renewed_at = started_at
+            if not is_held:
+                print(f"Lost the lease of campaign {self.operation_id}, it stops sending")
+                self.lost.set()
+                return
+
+    def __enter__(self) -> "Lease":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def start_campaign(session, user, sender_email: str, email_subject: str, email_body: str, pdf_id: str,
+                   resume_name: str, emails_list: list, template_values: dict = None) -> str:
+    """
+    Persist a campaign before it sends anything: its operation and every recipient as pending.
+
+    The campaign is not leased yet, run_campaign takes the lease when its job starts.
+
+    Args:
+        session (Session): SQLAlchemy session object.
+        user (User): The user sending the campaign.
+        sender_email (str): The sender's email address.
+        email_subject (str): The subject of the email.
+        email_body (str): The body of the email in HTML format.
+        pdf_id (str): ID of the resume in the resume store.
+        resume_name (str): File name of the attached resume.
+        emails_list (list): The recipients, in sending order.
+        template_values (dict, optional): The placeholder values of each address when email_body is a template,
+            e.g. from recipient_values. They are saved with the recipients, so a resumed campaign renders the same bodies.
+
+    Returns:
+        str: The ID of the operation.
+    """
+    return Operations.start_operation(session, sender_email, email_body, email_subject, emails_list, pdf_id,
+                                      resume_name, user=user, template_values=template_values)
+
+
+def run_campaign(operation_id: str, sender_password: str, attachment_path: str,
+                 report: Callable[[str, bool], None] = None, runner_id: str = None,
+                 lease_seconds: float = CAMPAIGN_LEASE_SECONDS, checkpoint_size: int = CAMPAIGN_CHECKPOINT_SIZE,
+                 checkpoint_seconds: float = CAMPAIGN_CHECKPOINT_SECONDS, session_factory: Callable = SessionLocal,
+                 on_defer: Callable[[datetime.datetime], None] = None,
+                 max_pause: float = CAMPAIGN_MAX_PAUSE_SECONDS, **send_options) -> dict:
+    """
+    Send the pending recipients of a started campaign, checkpointing their outcome in batches, then finish it.
+
+    The lease of the campaign is taken first, and nothing is sent if another runner holds it.
+    It is renewed while sending, and sending stops as soon as it is lost, leaving the recipients
+    not sent yet pending for the new holder. If sending raises, every connection stops and the
+    lease is given back before the error is raised, so resume_campaigns can take the campaign again.
+
+    With `on_defer`, a pause of the sender longer than `max_pause` (a spent daily budget, a long
+    throttling backoff) is not slept through: sending stops, the last results are checkpointed,
+    the lease is given back until the pause ends and `on_defer` is called with that time, e.g.
+    the `defer` of the job report so the job runs again then and frees its worker meanwhile. Recipients already checkpointed are never sent
+    again, so a campaign run again after a crash goes on from its last checkpoint. Recipients saved with template values get the body of the
+    operation rendered as a template with their values, HTML-escaped.
+
+    Args:
+        operation_id (str): ID of the operation.
+        sender_password (str): The sender's email password.
+        attachment_path (str): Path to the resume to attach.
+        report (Callable, optional): Called with (email, is_sent) after each recipient, e.g. the job report.
+        runner_id (str, optional): ID of the process holding the lease. Default is this process.
+        lease_seconds (float, optional): How long the lease lasts without renewal. Default is CAMPAIGN_LEASE_SECONDS.
+        checkpoint_size (int, optional): Results written per batch. Default is CAMPAIGN_CHECKPOINT_SIZE.
+        checkpoint_seconds (float, optional): Longest time a result stays unwritten. Default is CAMPAIGN_CHECKPOINT_SECONDS.
+        session_factory (Callable, optional): Opens database sessions. Default is SessionLocal.
+        on_defer (Callable, optional): Called with the UTC time to run the campaign again after a long pause.
+            Default sleeps through every pause.
+        max_pause (float, optional): Longest pause slept through with `on_defer`. Default is CAMPAIGN_MAX_PAUSE_SECONDS.
+        **send_options: Keyword arguments for send_campaign (connections, smtp_session, on_pause, ...).
+            The smtp_session is closed before returning, even when nothing is sent.
+
+    Returns:
+        dict: Whether the operation is saved; False if another runner holds or took the lease.
+    """
+    runner_id = runner_id or RUNNER_ID
+    # The logged-in session of the request is closed here whatever happens, even if nothing is sent
+    smtp_session = send_options.pop("smtp_session", None)
+    try:
+        with session_factory() as session:
+            operation = session.query(Operations.from_email, Operations.subject, Operations.email_body,
+                                      Operations.resume_name, Operations.status).filter(Operations.id == operation_id).one()
+            if operation.status != Operations.RUNNING:
+                return {"saved": True}
+            # Taken when the job starts, not when it is queued: while it waited, another process may have taken it
+            if not Operations.claim(session, operation_id, runner_id, lease_seconds):
+                return {"saved": False}
+            pending = CampaignRecipient.get_pending(session, operation_id)
+        errors: dict = {}
+        checkpointer = Checkpointer(operation_id, {email: row_id for row_id, email, _ in pending}, errors, report,
+                                    checkpoint_size, checkpoint_seconds, session_factory)
+        template_values = {email: values for _, email, values in pending if values is not None}
+        render_body = None
+        if template_values:
+            # Compiled once, then each body is a join of the template pieces and the recipient's values
+            template = compile_template(operation.email_body)
+
+            def render_body(email: str) -> Union[str, None]:
+                values = template_values.get(email)
+                return None if values is None else template.render(values, escape=True)
+
+        try:
+            with Lease(operation_id, runner_id, lease_seconds, session_factory) as lease:
+                try:
+                    send_campaign(operation.from_email, sender_password, [email for _, email, _ in pending],
+                                  operation.subject, operation.email_body, attachment_path, operation.resume_name,
+                                  report=checkpointer, errors=errors,
+                                  message_id=lambda email: campaign_message_id(operation_id, email, operation.from_email),
+                                  render_body=render_body, smtp_session=smtp_session, stop=lease.lost,
+                                  max_pause=max_pause if on_defer is not None else None, **send_options)
+                finally:
+                    checkpointer.flush()
+        except SenderPaused as e:
+            # No worker, connection or lease is held while the sender waits, and no other runner takes it before
+            _release(operation_id, runner_id, session_factory, until=e.until)
+            on_defer(e.until)
+            return {"saved": False}
+        except Exception:
+            # The campaign stays running: the next resume_campaigns goes on from the last checkpoint
+            _release(operation_id, runner_id, session_factory)
+            raise
+        if lease.lost.is_set():
+            return {"saved": False}
+        with session_factory() as session:
+            is_saved = Operations.finish_operation(session, operation_id, runner_id)
+        return {"saved": is_saved}
+    finally:
+        if smtp_session is not None:
+            smtp_session.close()
+
+
+def _release(operation_id: str, runner_id: str, session_factory: Callable,
+             until: datetime.datetime = None) -> None:
+    try:
+        with session_factory() as session:
+            Operations.release(session, operation_id, runner_id, until)
+    except Exception as e:
+        # It is taken again once it expires
+        print(f"Error releasing the lease of campaign {operation_id}: {e}")
+
+
+def resume_campaigns(job_queue, attachment_path: Callable[[str], str], runner_id: str = None,
+                     lease_seconds: float = CAMPAIGN_LEASE_SECONDS, session_factory: Callable = SessionLocal,
+                     retry: bool = True, resume_seconds: float = CAMPAIGN_RESUME_SECONDS, **run_options) -> list:
+    """
+    Enqueue the unfinished campaigns, e.g. the ones cut short by a restart, from their last checkpoint.
+
+    A campaign is only enqueued once its lease expired, so a campaign another process is still
+    sending is left alone, and never while its job is still active in `job_queue`. The lease
+    itself is taken by run_campaign when the job starts. With `retry`, the unfinished campaigns
+    are looked for again when the next lease expires, and at least every `resume_seconds`, so a
+    campaign whose job failed or whose process stopped is taken again without a restart.
+
+    Args:
+        job_queue (JobQueue): Where the campaigns are enqueued; each job has the ID of its operation.
+        attachment_path (Callable): Gives the path of a stored resume from its ID.
+        runner_id (str, optional): ID of this process. Default is RUNNER_ID.
+        lease_seconds (float, optional): How long the lease lasts without renewal. Default is CAMPAIGN_LEASE_SECONDS.
+        session_factory (Callable, optional): Opens database sessions. Default is SessionLocal.
+        retry (bool, optional): Keep looking for unfinished campaigns until `job_queue` shuts down. Default is True.
+        resume_seconds (float, optional): Longest time between two looks. Default is CAMPAIGN_RESUME_SECONDS.
+        **run_options: Keyword arguments for run_campaign and send_campaign.
+
+    Returns:
+        list: The IDs of the resumed operations.
+    """
+    runner_id = runner_id or RUNNER_ID
+    resumed: list = []
+    next_expiry: Union[float, None] = None
+    now = datetime.datetime.now(datetime.timezone.utc)
+    try:
+        with session_factory() as session:
+            for operation in Operations.get_unfinished(session):
+                job = job_queue.get(operation["id"])
+                if job is not None and job.is_active:
+                    # Queued or sending in this process already
+                    continue
+                lease_expires_at = operation["lease_expires_at"]
+                if lease_expires_at is not None and lease_expires_at > now:
+                    remaining = (lease_expires_at - now).total_seconds()
+                    next_expiry = remaining if next_expiry is None else min(next_expiry, remaining)
+                    continue
+                try:
+                    user = User.get_user_by_id(session, operation["user_id"])
+                    sender_password = user.get_email_password(FERNET_KEY)
+                    pdf_id = session.query(Operations.pdf_id).filter(Operations.id == operation["id"]).scalar()
+                    total = len(CampaignRecipient.get_pending(session, operation["id"]))
+                except Exception as e:
+                    print(f"Error resuming campaign {operation['id']}: {e}")
+                    continue
+                job = _enqueue_resumed(job_queue, operation["id"], operation["user_id"], sender_password,
+                                       attachment_path(pdf_id), total, runner_id, lease_seconds, session_factory,
+                                       run_options)
+                if job is not None:
+                    resumed.append(operation["id"])
+    finally:
+        # Armed even when this look failed, e.g. the database was unreachable
+        if retry and not job_queue.is_closed:
+            delay = resume_seconds if next_expiry is None else min(next_expiry + 0.1, resume_seconds)
+            timer = threading.Timer(delay, _resume_again, args=(job_queue, attachment_path),
+                                    kwargs=dict(runner_id=runner_id, lease_seconds=lease_seconds,
+                                                session_factory=session_factory, retry=retry,
+                                                resume_seconds=resume_seconds, **run_options))
+            timer.daemon = True
+            timer.start()
+    return resumed
+
+
+def _resume_again(job_queue, attachment_path: Callable[[str], str], **options) -> None:
+    try:
+        resume_campaigns(job_queue, attachment_path, **options)
+    except Exception as e:
+        # The next look is armed already
+        print(f"Error resuming campaigns: {e}")
+
+
+def _enqueue_resumed(job_queue, operation_id: str, user_id: str, sender_password: str, attachment_path: str,
+                     total: int, runner_id: str, lease_seconds: float, session_factory: Callable, run_options: dict):
+    def campaign(report) -> dict:
+        return run_campaign(operation_id, sender_password, attachment_path, report=report,
+                            on_pause=getattr(report, "pause", None), on_defer=getattr(report, "defer", None),
+                            runner_id=runner_id, lease_seconds=lease_seconds, session_factory=session_factory,
+                            **run_options)
+
+    return job_queue.enqueue(campaign, total=total, owner_id=user_id, job_id=operation_id, unique=True)
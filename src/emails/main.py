@@ -7,7 +7,24 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
+from email.policy import SMTP as SMTP_POLICY
 import re
+import os
+import base64
+import threading
+import time
+import hashlib
+import random
+import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Union
+from dotenv import load_dotenv
+from src.emails.templates import DEFAULT_SECTOR, template_cache
+
+load_dotenv(dotenv_path=str(Path("./env/campaign.env")))
 
 def message_from_file(EntrepriseContactName: str, EntrepriseName: str, EntrepriseSecteurActivite: str, MyEmail: str,
                       MyPhone: str, MyName: str, MyLinkedIn: str, file_path: str) -> str:
@@ -27,75 +44,917 @@ def message_from_file(EntrepriseContactName: str, EntrepriseName: str, Entrepris
     Returns:
     - str: The generated HTML message.
     """
-    with open(file_path, 'r', encoding='utf-8') as file:
-        html_template = file.read()
-
-    html_message = html_template.format(
+    # The template is read and compiled once, then only rendered while the file is unchanged
+    html_message = template_cache.get(file_path).render(dict(
         EntrepriseContactName=EntrepriseContactName,
         EntrepriseName=EntrepriseName,
-        EntrepriseSecteurActivite="DEVELOPMENT INFORMATIQUE" if EntrepriseSecteurActivite is None else EntrepriseSecteurActivite,
+        EntrepriseSecteurActivite=DEFAULT_SECTOR if EntrepriseSecteurActivite is None else EntrepriseSecteurActivite,
         MyEmail=MyEmail,
         MyPhone=MyPhone,
         MyName=MyName,
         MyLinkedIn=MyLinkedIn
-    )
+    ))
 
     return html_message
 
 
-def send_email_smtp(sender_email: str, sender_password: str, to: str, email_subject: str, email_body: str,
-                    attachment_path: str = None, attachment_name: str = None) -> bool:
+SMTP_HOST: str = "smtp.gmail.com"
+SMTP_PORT: int = 587
+SMTP_MAX_CONNECTIONS: int = int(os.getenv("SMTP_MAX_CONNECTIONS", 20))
+SMTP_MAX_CONNECTIONS_PER_SENDER: int = int(os.getenv("SMTP_MAX_CONNECTIONS_PER_SENDER", 3))
+SMTP_CREDENTIAL_TTL: int = int(os.getenv("SMTP_CREDENTIAL_TTL", 600))
+SMTP_RATE_PER_MINUTE: int = int(os.getenv("SMTP_RATE_PER_MINUTE", 60))
+SMTP_RATE_PER_DAY: int = int(os.getenv("SMTP_RATE_PER_DAY", 500))
+SMTP_BACKOFF_BASE: float = float(os.getenv("SMTP_BACKOFF_BASE", 30))
+SMTP_BACKOFF_MAX: float = float(os.getenv("SMTP_BACKOFF_MAX", 900))
+SMTP_THROTTLE_RETRIES: int = int(os.getenv("SMTP_THROTTLE_RETRIES", 8))
+# Gmail answers these when the account sends too fast or is over its quota; 550 only with 5.4.5
+THROTTLE_CODES: tuple = (421, 454, 550)
+QUOTA_EXCEEDED_PATTERN = re.compile(r"5\.4\.5|quota|rate limit|too many", re.IGNORECASE)
+SMTP_RETRIES: int = int(os.getenv("SMTP_RETRIES", 3))
+SMTP_RETRY_BASE: float = float(os.getenv("SMTP_RETRY_BASE", 1))
+SMTP_RETRY_MAX: float = float(os.getenv("SMTP_RETRY_MAX", 30))
+# Replies about the sender's credentials rather than the message
+AUTH_CODES: tuple = (530, 534, 535)
+# Headers of a UTF-8, base64 encoded HTML part, as MIMEText writes them
+HTML_PART_HEADERS: bytes = (b'Content-Type: text/html; charset="utf-8"\r\nMIME-Version: 1.0\r\n'
+                            b'Content-Transfer-Encoding: base64\r\n\r\n')
+
+
+class CredentialCache:
     """
-    Send an email using SMTP.
+    Remembers which sender credentials logged in successfully, for a limited time.
+
+    Entries are keyed by the sender and a SHA-256 hash of the secret, so the secret
+    itself is never kept in memory by the cache.
+
+    Parameters:
+    - ttl (int, optional): Seconds a successful login stays valid. Default is SMTP_CREDENTIAL_TTL.
+    """
+
+    def __init__(self, ttl: int = SMTP_CREDENTIAL_TTL):
+        self.ttl = ttl
+        self._entries: dict = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sender_email: str, sender_password: str) -> tuple:
+        return (str(sender_email).lower(), hashlib.sha256(str(sender_password).encode()).hexdigest())
+
+    def is_valid(self, sender_email: str, sender_password: str) -> bool:
+        """
+        Check if the credentials logged in successfully less than `ttl` seconds ago.
+        """
+        key = self.key(sender_email, sender_password)
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False
+            return True
+
+    def remember(self, sender_email: str, sender_password: str) -> None:
+        """
+        Record a successful login.
+        """
+        with self._lock:
+            self._entries[self.key(sender_email, sender_password)] = time.monotonic() + self.ttl
+
+    def invalidate(self, sender_email: str, sender_password: str) -> None:
+        """
+        Forget the credentials, e.g. after the server rejected them.
+        """
+        with self._lock:
+            self._entries.pop(self.key(sender_email, sender_password), None)
+
+
+credential_cache = CredentialCache()
+
+
+class SMTPSession:
+    """
+    Campaign-scoped SMTP session.
+
+    Connects and logs in once, then sends every message of a campaign over the
+    same connection. When the server drops the connection, the session reconnects
+    and retries the message once.
 
     Parameters:
     - sender_email (str): The sender's email address.
     - sender_password (str): The sender's email password.
-    - to (str): The recipient's email address.
+    - host (str, optional): The SMTP server host.
+    - port (int, optional): The SMTP server port.
+    - starttls (bool, optional): Upgrade the connection with STARTTLS before logging in.
+
+    Example:
+    >>> with SMTPSession("me@gmail.com", "xxxx xxxx xxxx xxxx") as smtp_session:
+    ...     send_email_smtp("me@gmail.com", "xxxx xxxx xxxx xxxx", "to@example.com", "Subject", "Body",
+    ...                     smtp_session=smtp_session)
+    True
+    """
+
+    def __init__(self, sender_email: str, sender_password: str, host: str = SMTP_HOST, port: int = SMTP_PORT,
+                 starttls: bool = True):
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.server: smtplib.SMTP | None = None
+        self.connections: int = 0
+
+    def connect(self) -> smtplib.SMTP:
+        """
+        Open the connection, upgrade it with STARTTLS and log in.
+
+        Returns:
+        - smtplib.SMTP: The authenticated SMTP connection.
+        """
+        self.close()
+        server = smtplib.SMTP(self.host, self.port)
+        try:
+            if self.starttls:
+                server.starttls()
+            server.login(self.sender_email, self.sender_password)
+        except smtplib.SMTPAuthenticationError:
+            credential_cache.invalidate(self.sender_email, self.sender_password)
+            server.close()
+            raise
+        except Exception:
+            server.close()
+            raise
+        credential_cache.remember(self.sender_email, self.sender_password)
+        self.server = server
+        self.connections += 1
+        return server
+
+    def sendmail(self, to: str, message: str | bytes) -> None:
+        """
+        Send an already composed message, reconnecting once if the connection was dropped.
+
+        Parameters:
+        - to (str): The recipient's email address.
+        - message (str | bytes): The serialized message.
+        """
+        if self.server is None:
+            self.connect()
+        try:
+            self.server.sendmail(self.sender_email, to, message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self.connect()
+            self.server.sendmail(self.sender_email, to, message)
+
+    def close(self) -> None:
+        """
+        Close the connection if it is open.
+        """
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+        finally:
+            self.server = None
+
+    def __enter__(self) -> "SMTPSession":
+        # The connection is opened lazily by the first send, so a failed login is
+        # reported per recipient like before instead of aborting the whole campaign.
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class PreparedMessage:
+    """
+    An email composed and serialized once, then addressed to each recipient.
+
+    The HTML body and the base64 attachment part are encoded a single time; sending to a
+    recipient only prepends its `To` header to the cached bytes. A recipient with a body of
+    its own, e.g. a personalized template, only has its HTML part encoded, in base64; the
+    attachment part is still shared.
+
+    Parameters:
+    - sender_email (str): The sender's email address.
     - email_subject (str): The subject of the email.
     - email_body (str): The body of the email in HTML format.
     - attachment_path (str, optional): Path to the attachment file.
     - attachment_name (str, optional): Name of the attachment file.
 
-    Returns:
-    - bool: True if the email is sent successfully, False otherwise.
+    Example:
+    >>> prepared = PreparedMessage("me@gmail.com", "Subject", "<p>Body</p>", "./resume.pdf")
+    >>> prepared.for_recipient("to@example.com")[:20]
+    b'To: to@example.com\r\n'
     """
-    is_sent = False
-    try:
-        # Set up the SMTP server
-        smtp_server = smtplib.SMTP('smtp.gmail.com', 587)
-        smtp_server.starttls()
-        smtp_server.login(sender_email, sender_password)
 
+    def __init__(self, sender_email: str, email_subject: str, email_body: str,
+                 attachment_path: str = None, attachment_name: str = None):
         # Compose the email
         msg = MIMEMultipart()
         msg['From'] = sender_email
-        msg['To'] = to
         msg['Subject'] = email_subject
 
-        msg.attach(MIMEText(email_body, 'html'))
+        body_part = MIMEText(email_body, 'html')
+        msg.attach(body_part)
 
         if attachment_path:
             if not attachment_name:
                 attachment_name = attachment_path.split("/")[-1]
-            attachment = open(attachment_path, "rb")
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload((attachment).read())
+            with open(attachment_path, "rb") as attachment:
+                part = MIMEBase('application', 'octet-stream')
+                part.set_payload(attachment.read())
             encoders.encode_base64(part)
             part.add_header('Content-Disposition', "attachment; filename= %s" % attachment_name)
             msg.attach(part)
 
-        # Send the email
-        smtp_server.sendmail(sender_email, to, msg.as_string())
-        smtp_server.quit()
-        is_sent = True
+        self.sender_email = sender_email
+        self.policy = msg.policy.clone(linesep="\r\n")
+        self.message_bytes: bytes = msg.as_bytes(policy=self.policy)
+        # What comes before and after the HTML part, to put another body in its place
+        body_bytes = body_part.as_bytes(policy=self.policy)
+        start = self.message_bytes.index(body_bytes)
+        self._before_body: bytes = self.message_bytes[:start]
+        self._after_body: bytes = self.message_bytes[start + len(body_bytes):]
+
+    def for_recipient(self, to: str, message_id: str = None, email_body: str = None) -> bytes:
+        """
+        Get the serialized message addressed to one recipient.
+
+        Parameters:
+        - to (str): The recipient's email address.
+        - message_id (str, optional): Message-ID header of this copy, e.g. to send it again with the same id.
+        - email_body (str, optional): The HTML body of this copy. Default is the body of the message.
+
+        Returns:
+        - bytes: The message, ready for SMTP.sendmail.
+        """
+        to = str(to)
+        headers = [("To", to)] + ([("Message-ID", message_id)] if message_id else [])
+        if any("\r" in value or "\n" in value for _, value in headers):
+            raise ValueError(f"Invalid recipient address: {to!r}")
+        header_bytes = b"".join(SMTP_POLICY.fold_binary(name, value) for name, value in headers)
+        if email_body is None:
+            return header_bytes + self.message_bytes
+        # The same part as MIMEText(email_body, 'html') gives for a UTF-8 body, without the email generator
+        body_bytes = HTML_PART_HEADERS + base64.encodebytes(email_body.encode("utf-8")).replace(b"\n", b"\r\n")
+        return header_bytes + self._before_body + body_bytes + self._after_body
+
+
+def send_email_smtp(sender_email: str, sender_password: str, to: str, email_subject: str, email_body: str,
+                    attachment_path: str = None, attachment_name: str = None,
+                    smtp_session: SMTPSession = None, prepared_message: PreparedMessage = None,
+                    retry_policy: "RetryPolicy" = None) -> bool:
+    """
+    Send an email using SMTP.
+
+    Network errors and temporary (4xx) replies are retried with a jittered exponential backoff;
+    permanent (5xx) and authentication failures are not.
+
+    Parameters:
+    - sender_email (str): The sender's email address.
+    - sender_password (str): The sender's email password.
+    - to (str): The recipient's email address.
+    - email_subject (str): The subject of the email.
+    - email_body (str): The body of the email in HTML format.
+    - attachment_path (str, optional): Path to the attachment file.
+    - attachment_name (str, optional): Name of the attachment file.
+    - smtp_session (SMTPSession, optional): An open campaign session to send through.
+      When omitted, a connection is opened and closed for this email only.
+    - prepared_message (PreparedMessage, optional): The campaign message, already composed.
+      When given, the subject, body and attachment arguments are ignored.
+    - retry_policy (RetryPolicy, optional): How transient failures are retried. Default is the module policy.
+
+    Returns:
+    - bool: True if the email is sent successfully, False otherwise.
+    """
+    try:
+        if prepared_message is None:
+            prepared_message = PreparedMessage(sender_email, email_subject, email_body, attachment_path, attachment_name)
+        message = prepared_message.for_recipient(to)
+    except Exception as e:
+        print(f"Error sending email: {classify_smtp_error(e)}")
+        return False
+
+    # Send the email
+    if smtp_session is not None:
+        failure = deliver(smtp_session, to, message, retry_policy)
+    else:
+        with SMTPSession(sender_email, sender_password) as smtp_session:
+            failure = deliver(smtp_session, to, message, retry_policy)
+    if failure is not None:
+        print(f"Error sending email: {failure}")
+    return failure is None
+
+
+
+
+class ConnectionLimiter:
+    """
+    Caps the number of SMTP connections open at the same time, globally and per sender account.
+
+    Parameters:
+    - max_connections (int): Maximum number of connections for all senders.
+    - max_connections_per_sender (int): Maximum number of connections for one sender.
+    """
+
+    def __init__(self, max_connections: int = SMTP_MAX_CONNECTIONS,
+                 max_connections_per_sender: int = SMTP_MAX_CONNECTIONS_PER_SENDER):
+        self.max_connections = max_connections
+        self.max_connections_per_sender = max_connections_per_sender
+        self._global = threading.BoundedSemaphore(max_connections)
+        self._senders: dict = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, sender_email: str):
+        """
+        Wait for a free connection slot for the sender and hold it until the block exits.
+
+        Parameters:
+        - sender_email (str): The sender's email address.
+        """
+        with self._lock:
+            sender = self._senders.setdefault(sender_email.lower(),
+                                              threading.BoundedSemaphore(self.max_connections_per_sender))
+        # Always take the sender slot first so two campaigns can never wait on each other
+        with sender, self._global:
+            yield
+
+
+connection_limiter = ConnectionLimiter()
+
+
+def smtp_reply(error: Exception) -> tuple[Union[int, None], str]:
+    """
+    Get the reply code and text of a failed SMTP command.
+
+    Parameters:
+    - error (Exception): The exception raised by smtplib.
+
+    Returns:
+    - tuple: The reply code, None if the server did not answer, and the reply text.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        code, message = next(iter(error.recipients.values()))
+    elif isinstance(error, smtplib.SMTPResponseException):
+        code, message = error.smtp_code, error.smtp_error
+    else:
+        return None, str(error)
+    if isinstance(message, bytes):
+        message = message.decode(errors="replace")
+    return code, message
+
+
+def is_throttle_reply(code: Union[int, None], message: str) -> bool:
+    """
+    Check if an SMTP reply means the sender is rate limited rather than the recipient refused.
+
+    Parameters:
+    - code (int): The reply code.
+    - message (str): The reply text.
+
+    Returns:
+    - bool: True for 421 and 454, and for 550 when it is about the sending quota.
+    """
+    if code not in THROTTLE_CODES:
+        return False
+    return code != 550 or bool(QUOTA_EXCEEDED_PATTERN.search(message or ""))
+
+
+class CampaignStopped(Exception):
+    """
+    Raised inside send_campaign when its stop event is set; the recipient is left unsent.
+    """
+
+
+class SenderPaused(Exception):
+    """
+    Raised instead of waiting when a sender is paused for longer than the caller is willing to wait.
+
+    Attributes:
+        until (datetime.datetime): When the sender may send again, in UTC.
+    """
+
+    def __init__(self, until: datetime.datetime):
+        super().__init__(f"Sender paused until {until.isoformat()}")
+        self.until = until
+
+
+class SendFailure:
+    """
+    Why a message could not be sent.
+
+    Attributes:
+        kind (str): THROTTLED, TRANSIENT (other 4xx replies), PERMANENT (5xx replies and invalid
+            messages), AUTH (rejected credentials) or CONNECTION (no usable connection).
+        code (int): The SMTP reply code, None if the server did not answer.
+        message (str): The reply text or the error message.
+
+    Example:
+    >>> str(classify_smtp_error(smtplib.SMTPRecipientsRefused({"to@example.com": (550, b"5.1.1 User unknown")})))
+    'permanent: 550 5.1.1 User unknown'
+    """
+
+    THROTTLED: str = "throttled"
+    TRANSIENT: str = "transient"
+    PERMANENT: str = "permanent"
+    AUTH: str = "auth"
+    CONNECTION: str = "connection"
+
+    def __init__(self, kind: str, code: Union[int, None] = None, message: str = ""):
+        self.kind = kind
+        self.code = code
+        self.message = message
+
+    @property
+    def is_retryable(self) -> bool:
+        """
+        True if sending the same message again later may work.
+        """
+        return self.kind in (self.TRANSIENT, self.CONNECTION)
+
+    def __str__(self) -> str:
+        reply = f"{self.code} {self.message}" if self.code is not None else self.message
+        return f"{self.kind}: {reply}".strip()
+
+    def __repr__(self) -> str:
+        return f"SendFailure({self.kind!r}, {self.code!r}, {self.message!r})"
+
+
+def classify_smtp_error(error: Exception) -> SendFailure:
+    """
+    Classify an error raised while sending a message.
+
+    Parameters:
+    - error (Exception): The exception raised by smtplib, the socket or the message composition.
+
+    Returns:
+    - SendFailure: The kind of failure, with the reply code and text.
+    """
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return SendFailure(SendFailure.AUTH, *smtp_reply(error))
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return SendFailure(SendFailure.CONNECTION, *smtp_reply(error))
+    code, message = smtp_reply(error)
+    if code is None and isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException):
+        # Socket errors and timeouts; smtplib errors are OSErrors too but come with a reply
+        return SendFailure(SendFailure.CONNECTION, code, message)
+    if code is None or not 400 <= code < 600:
+        return SendFailure(SendFailure.PERMANENT, code, message)
+    if is_throttle_reply(code, message):
+        return SendFailure(SendFailure.THROTTLED, code, message)
+    if code in AUTH_CODES:
+        return SendFailure(SendFailure.AUTH, code, message)
+    return SendFailure(SendFailure.TRANSIENT if code < 500 else SendFailure.PERMANENT, code, message)
+
+
+class RetryPolicy:
+    """
+    Bounded retries with exponential backoff and full jitter.
+
+    The n-th retry waits a random time between 0 and min(max_delay, base * 2 ** n) seconds, so
+    connections failing at the same time do not all come back at the same time.
+
+    Parameters:
+    - retries (int, optional): Retries after the first attempt. Default is SMTP_RETRIES.
+    - base (float, optional): Upper bound of the first wait in seconds. Default is SMTP_RETRY_BASE.
+    - max_delay (float, optional): Upper bound of any wait in seconds. Default is SMTP_RETRY_MAX.
+    - sleep (Callable, optional): Called with the seconds to wait. Default is time.sleep.
+    - random (Callable, optional): Returns a float in [0, 1). Default is random.random.
+    """
+
+    def __init__(self, retries: int = SMTP_RETRIES, base: float = SMTP_RETRY_BASE, max_delay: float = SMTP_RETRY_MAX,
+                 sleep: Callable[[float], None] = time.sleep, random: Callable[[], float] = random.random):
+        self.retries = retries
+        self.base = base
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._random = random
+
+    def delay(self, attempt: int) -> float:
+        """
+        Seconds to wait before the retry number `attempt`, counted from 0.
+        """
+        return self._random() * min(self.max_delay, self.base * 2 ** attempt)
+
+    def backoff(self, attempt: int) -> None:
+        self._sleep(self.delay(attempt))
+
+
+smtp_retry_policy = RetryPolicy()
+
+
+def deliver(smtp_session: SMTPSession, to: str, message: bytes, retry_policy: RetryPolicy = None,
+            before_attempt: Callable[[], None] = None,
+            on_throttled: Callable[[SendFailure], bool] = None) -> Union[SendFailure, None]:
+    """
+    Send a serialized message, retrying transient failures.
+
+    An authentication failure removes the sender's credentials from the credential cache.
+
+    Parameters:
+    - smtp_session (SMTPSession): The session to send through.
+    - to (str): The recipient's email address.
+    - message (bytes): The serialized message.
+    - retry_policy (RetryPolicy, optional): How transient and connection failures are retried. Default is the module policy.
+    - before_attempt (Callable, optional): Called before every attempt, e.g. to wait for the rate limiter.
+    - on_throttled (Callable, optional): Called with a throttled failure; return True to send again
+      without using a retry. Without it, throttled replies are retried like transient ones.
+
+    Returns:
+    - Union[SendFailure, None]: None if the message was sent, otherwise why the last attempt failed.
+    """
+    retry_policy = retry_policy if retry_policy is not None else smtp_retry_policy
+    retried = 0
+    while True:
+        if before_attempt is not None:
+            before_attempt()
+        try:
+            smtp_session.sendmail(to, message)
+            return None
+        except Exception as e:
+            failure = classify_smtp_error(e)
+        if failure.kind == SendFailure.AUTH:
+            # The login went through but the server now rejects the account, the next check must log in again
+            credential_cache.invalidate(smtp_session.sender_email, smtp_session.sender_password)
+        if failure.kind == SendFailure.THROTTLED and on_throttled is not None:
+            if on_throttled(failure):
+                continue
+            return failure
+        if not (failure.is_retryable or failure.kind == SendFailure.THROTTLED) or retried >= retry_policy.retries:
+            return failure
+        retry_policy.backoff(retried)
+        retried += 1
+
+
+class TokenBucket:
+    """
+    Holds up to `capacity` tokens, refilled continuously at `rate` tokens per second.
+
+    Parameters:
+    - capacity (int): Maximum number of tokens, i.e. the burst allowed.
+    - rate (float): Tokens added per second.
+    - now (float): Current time of the limiter clock.
+    """
+
+    def __init__(self, capacity: int, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """
+        Seconds until a token is available, 0 if one is available now.
+        """
+        self.refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self.refill(now)
+        self.tokens -= 1
+
+    def drain(self, now: float) -> None:
+        self.refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class SendRateLimiter:
+    """
+    Paces the messages of each sender account with a per-minute and a per-day token bucket,
+    and backs off when the server answers that the account is throttled.
+
+    Every throttled reply doubles the sender's backoff, from `backoff_base` up to `backoff_max`,
+    and the next successful send resets it. A 550 5.4.5 (daily quota exceeded) also empties the
+    daily bucket, so sending resumes at the daily rate instead of hammering the server.
+
+    The buckets live in the memory of the process: each process of a multi-worker server
+    gives every sender its own full budget.
+
+    Parameters:
+    - per_minute (int, optional): Messages per minute and sender, 0 for no limit. Default is SMTP_RATE_PER_MINUTE.
+    - per_day (int, optional): Messages per day and sender, 0 for no limit. Default is SMTP_RATE_PER_DAY.
+    - backoff_base (float, optional): Seconds paused after the first throttled reply. Default is SMTP_BACKOFF_BASE.
+    - backoff_max (float, optional): Longest pause after a throttled reply. Default is SMTP_BACKOFF_MAX.
+    - clock (Callable, optional): Monotonic clock in seconds. Default is time.monotonic.
+    - sleep (Callable, optional): Called with the seconds to wait. Default is time.sleep.
+
+    Example:
+    >>> limiter = SendRateLimiter(per_minute=20, per_day=500)
+    >>> limiter.wait("me@gmail.com")  # returns at once while the sender has budget left
+    >>> limiter.stats()["sends"]
+    1
+    """
+
+    def __init__(self, per_minute: int = SMTP_RATE_PER_MINUTE, per_day: int = SMTP_RATE_PER_DAY,
+                 backoff_base: float = SMTP_BACKOFF_BASE, backoff_max: float = SMTP_BACKOFF_MAX,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self._sleep = sleep
+        self._senders: dict = {}
+        self._lock = threading.Lock()
+        self.counters: Counter = Counter()
+
+    def _state(self, sender_email: str, now: float) -> dict:
+        key = sender_email.lower()
+        state = self._senders.get(key)
+        if state is None:
+            state = self._senders[key] = {
+                "minute": TokenBucket(self.per_minute, self.per_minute / 60, now) if self.per_minute else None,
+                "day": TokenBucket(self.per_day, self.per_day / 86400, now) if self.per_day else None,
+                "backoff": 0.0,
+                "blocked_until": 0.0,
+            }
+        return state
+
+    def reserve(self, sender_email: str) -> tuple[float, bool]:
+        """
+        Take a send token of the sender if one is free.
+
+        Parameters:
+        - sender_email (str): The sender's email address.
+
+        Returns:
+        - tuple: 0 and False when the token was taken. Otherwise the seconds to wait before trying
+          again, and True if the sender is paused (throttled or out of daily budget) rather than paced.
+        """
+        with self._lock:
+            now = self._clock()
+            state = self._state(sender_email, now)
+            blocked = max(0.0, state["blocked_until"] - now)
+            day = state["day"].delay(now) if state["day"] else 0.0
+            minute = state["minute"].delay(now) if state["minute"] else 0.0
+            delay = max(blocked, day, minute)
+            if delay > 0:
+                return delay, max(blocked, day) >= minute
+            for bucket in (state["minute"], state["day"]):
+                if bucket is not None:
+                    bucket.take(now)
+            self.counters["sends"] += 1
+            return 0.0, False
+
+    def wait(self, sender_email: str, on_pause: Callable[[float], None] = None, max_pause: float = None) -> None:
+        """
+        Block until the sender may send one more message, and take its token.
+
+        Parameters:
+        - sender_email (str): The sender's email address.
+        - on_pause (Callable, optional): Called with the seconds left before sending resumes when the
+          sender is paused, as opposed to only paced.
+        - max_pause (float, optional): Longest pause waited for, in seconds. Default waits for any pause.
+
+        Raises:
+        - SenderPaused: If the sender is paused for longer than `max_pause`; no token is taken.
+        """
+        while True:
+            delay, is_paused = self.reserve(sender_email)
+            if delay <= 0:
+                return
+            if is_paused and max_pause is not None and delay > max_pause:
+                with self._lock:
+                    self.counters["deferred"] += 1
+                raise SenderPaused(datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=delay))
+            with self._lock:
+                self.counters["waits"] += 1
+                self.counters["pauses"] += int(is_paused)
+                self.counters["wait_seconds"] += delay
+            if is_paused and on_pause is not None:
+                on_pause(delay)
+            self._sleep(delay)
+
+    def throttled(self, sender_email: str, code: int, message: str = "") -> float:
+        """
+        Record a throttled reply of the server and pause the sender.
+
+        Parameters:
+        - sender_email (str): The sender's email address.
+        - code (int): The reply code, 421, 454 or 550.
+        - message (str, optional): The reply text.
+
+        Returns:
+        - float: The seconds the sender is paused for.
+        """
+        with self._lock:
+            now = self._clock()
+            state = self._state(sender_email, now)
+            state["backoff"] = min(self.backoff_max, state["backoff"] * 2 or self.backoff_base)
+            state["blocked_until"] = max(state["blocked_until"], now + state["backoff"])
+            self.counters["throttled"] += 1
+            self.counters[f"throttled_{code}"] += 1
+            if code == 550 and state["day"] is not None:
+                state["day"].drain(now)
+                self.counters["quota_exceeded"] += 1
+            return state["backoff"]
+
+    def succeeded(self, sender_email: str) -> None:
+        """
+        Record a message accepted by the server, which ends the backoff of the sender.
+        """
+        with self._lock:
+            self._state(sender_email, self._clock())["backoff"] = 0.0
+
+    def stats(self) -> dict:
+        """
+        Get the counters of the limiter.
+
+        Returns:
+        - dict: Tokens taken ('sends'), waits, pauses and seconds waited, pauses too long to wait
+          ('deferred'), and throttled replies, in total and by code ('throttled_421', ...), and daily quotas exceeded.
+        """
+        with self._lock:
+            return dict(self.counters)
+
+
+rate_limiter = SendRateLimiter()
+
+
+def send_campaign(sender_email: str, sender_password: str, emails_list: list, email_subject: str, email_body: str,
+                  attachment_path: str = None, attachment_name: str = None,
+                  report: Callable[[str, bool], None] = None, connections: int = 1,
+                  limiter: ConnectionLimiter = None, smtp_settings: dict = None,
+                  smtp_session: SMTPSession = None, send_limiter: SendRateLimiter = None,
+                  on_pause: Callable[[Union[datetime.datetime, None]], None] = None,
+                  throttle_retries: int = SMTP_THROTTLE_RETRIES, retry_policy: RetryPolicy = None,
+                  errors: dict = None, message_id: Callable[[str], str] = None,
+                  render_body: Callable[[str], Union[str, None]] = None,
+                  stop: threading.Event = None, max_pause: float = None) -> tuple[list, list]:
+    """
+    Send the same email to every address of a list, fanned out over parallel SMTP sessions.
+
+    Each session pulls the next recipient from the shared list, so a slow connection does not
+    hold back the others, and the results are collected in the order of `emails_list`.
+
+    Sends are paced by the sender's rate limiter. When the server answers that the account is
+    throttled, the campaign pauses and sends the same recipient again once the backoff is over,
+    instead of failing it and every recipient after it.
+
+    Parameters:
+    - sender_email (str): The sender's email address.
+    - sender_password (str): The sender's email password.
+    - emails_list (list): The recipients' email addresses.
+    - email_subject (str): The subject of the email.
+    - email_body (str): The body of the email in HTML format.
+    - attachment_path (str, optional): Path to the attachment file.
+    - attachment_name (str, optional): Name of the attachment file.
+    - report (Callable, optional): Called with (email, is_sent) after each recipient, possibly from several threads.
+    - connections (int, optional): Number of parallel SMTP sessions. Default is 1.
+    - limiter (ConnectionLimiter, optional): Connection caps to respect. Default is the module limiter.
+    - smtp_settings (dict, optional): Extra keyword arguments for SMTPSession (host, port, starttls).
+    - smtp_session (SMTPSession, optional): An already open session, e.g. from open_smtp_session,
+      used by the first connection instead of logging in again. It is closed at the end.
+    - send_limiter (SendRateLimiter, optional): Per-sender rate limits to respect. Default is the module rate limiter.
+    - on_pause (Callable, optional): Called with the UTC time sending resumes when the campaign pauses,
+      and with None once it sends again.
+    - throttle_retries (int, optional): Times a recipient is sent again after a throttled reply before it fails.
+    - retry_policy (RetryPolicy, optional): How network errors and temporary replies are retried. Default is the module policy.
+    - errors (dict, optional): Filled with why each failed receiver failed, by address, e.g.
+      'permanent: 550 5.1.1 User unknown'.
+    - message_id (Callable, optional): Gives the Message-ID header of the copy sent to an address.
+    - render_body (Callable, optional): Gives the HTML body of the copy sent to an address, e.g. a template
+      rendered for the recipient, or None to send `email_body`. The attachment is still encoded once.
+    - stop (threading.Event, optional): Once set, no more recipient is sent, e.g. when the campaign
+      lease is lost. The recipients left are neither reported nor in the returned lists.
+      The other sessions also stop when one of them raises, e.g. from `report`, and the error is raised.
+    - max_pause (float, optional): Longest pause of the sender waited for, in seconds, e.g. to give back
+      the worker of a job rather than hold it through a spent daily budget. Default waits for any pause.
+
+    Returns:
+    - tuple: The list of successful receivers and the list of failed receivers.
+
+    Raises:
+    - SenderPaused: Once every session stopped, if the sender was paused for longer than `max_pause`.
+      The recipients not sent yet are neither reported nor failed.
+    """
+    limiter = limiter if limiter is not None else connection_limiter
+    send_limiter = send_limiter if send_limiter is not None else rate_limiter
+    smtp_settings = smtp_settings or {}
+    # None until the recipient is attempted
+    results: list = [None] * len(emails_list)
+    try:
+        # Encode the body and the attachment once for the whole campaign
+        prepared_message = PreparedMessage(sender_email, email_subject, email_body, attachment_path, attachment_name)
     except Exception as e:
-        print(f"Error sending email: {e}")
-        is_sent = False
-    finally:
-        return is_sent
+        print(f"Error preparing email: {e}")
+        if smtp_session is not None:
+            smtp_session.close()
+        for email in emails_list:
+            if errors is not None:
+                errors[email] = str(classify_smtp_error(e))
+            if report is not None:
+                report(email, False)
+        return [], list(emails_list)
+    next_index = iter(range(len(emails_list)))
+    # Set when a worker raises, so the other ones stop too
+    failed = threading.Event()
+    # When the sender may send again, once a pause longer than max_pause stopped a worker
+    deferred: list = []
+
+    def is_stopped() -> bool:
+        return failed.is_set() or bool(deferred) or (stop is not None and stop.is_set())
+
+    def check_stop() -> None:
+        if is_stopped():
+            raise CampaignStopped()
+
+    def before_attempt() -> None:
+        check_stop()
+        send_limiter.wait(sender_email, on_pause=pause, max_pause=max_pause)
+        # The rate limit may have waited long enough for the campaign to be stopped
+        check_stop()
+    index_lock = threading.Lock()
+    open_sessions: list = [smtp_session] if smtp_session is not None else []
+    paused: list = [False]
+
+    def pause(delay: float) -> None:
+        with index_lock:
+            paused[0] = True
+        if on_pause is not None:
+            on_pause(datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=delay))
 
+    def send(smtp_session: SMTPSession, email: str) -> Union[bool, None]:
+        throttled: list = [0]
 
+        def on_throttled(failure: SendFailure) -> bool:
+            if throttled[0] >= throttle_retries:
+                return False
+            throttled[0] += 1
+            pause(send_limiter.throttled(sender_email, failure.code, failure.message))
+            return True
+
+        try:
+            message = prepared_message.for_recipient(email, message_id(email) if message_id else None,
+                                                     render_body(email) if render_body else None)
+        except Exception as e:
+            failure = classify_smtp_error(e)
+        else:
+            try:
+                failure = deliver(smtp_session, email, message, retry_policy, before_attempt=before_attempt,
+                                  on_throttled=on_throttled)
+            except CampaignStopped:
+                return None
+            except SenderPaused as e:
+                with index_lock:
+                    deferred.append(e.until)
+                return None
+        if failure is not None:
+            print(f"Error sending email to {email}: {failure}")
+            if errors is not None:
+                with index_lock:
+                    errors[email] = str(failure)
+            return False
+        send_limiter.succeeded(sender_email)
+        with index_lock:
+            resumed, paused[0] = paused[0], False
+        if resumed and on_pause is not None:
+            on_pause(None)
+        return True
+
+    def worker() -> None:
+        with index_lock:
+            session = open_sessions.pop() if open_sessions else SMTPSession(sender_email, sender_password, **smtp_settings)
+        with limiter.acquire(sender_email), session as smtp_session:
+            try:
+                while True:
+                    with index_lock:
+                        index = next(next_index, None)
+                    if index is None or is_stopped():
+                        return
+                    email = emails_list[index]
+                    is_sent = send(smtp_session, email)
+                    if is_sent is None:
+                        # Stopped: this recipient and the ones left stay unsent
+                        return
+                    results[index] = is_sent
+                    if report is not None:
+                        report(email, is_sent)
+            except BaseException:
+                failed.set()
+                raise
+
+    workers = max(1, min(connections, limiter.max_connections_per_sender, len(emails_list)))
+    if workers == 1:
+        worker()
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="smtp") as executor:
+            for future in [executor.submit(worker) for _ in range(workers)]:
+                future.result()
+
+    if deferred:
+        raise SenderPaused(max(deferred))
+    success_receiver: list = [email for email, is_sent in zip(emails_list, results) if is_sent is True]
+    failed_receiver: list = [email for email, is_sent in zip(emails_list, results) if is_sent is False]
+    return success_receiver, failed_receiver
 
 
 def message_from_html(MyEmail: str, MyPhone: str, MyName: str, MyLinkedIn: str, file_path: str) -> str:
@@ -112,15 +971,12 @@ def message_from_html(MyEmail: str, MyPhone: str, MyName: str, MyLinkedIn: str,
     Returns:
     - str: The generated HTML message.
     """
-    with open(file_path, 'r', encoding='utf-8') as file:
-        html_template = file.read()
-
-    html_message = html_template.format(
+    html_message = template_cache.get(file_path).render(dict(
         MyEmail=MyEmail,
         MyPhone=MyPhone,
         MyName=MyName,
         MyLinkedIn=MyLinkedIn
-    )
+    ))
     return html_message
 
 
@@ -132,27 +988,41 @@ def check_gmail_connection(email: str, password: str) -> bool:
     - email (str): The Gmail account's email address.
     - password (str): The password for the Gmail account.
 
+    Credentials that logged in successfully within SMTP_CREDENTIAL_TTL seconds are not checked
+    again, see open_smtp_session.
+
     Returns:
     - bool: True if the connection is successful, False otherwise.
     """
-    try:
-        # Set up the SMTP server
-        smtp_server = smtplib.SMTP('smtp.gmail.com', 587)
-        smtp_server.starttls()
-        smtp_server.login(email, password)
-        smtp_server.quit()
-        return True
-    except:
+    smtp_session = open_smtp_session(email, password)
+    if smtp_session is None:
         return False
+    smtp_session.close()
+    return True
 
 
+def open_smtp_session(email: str, password: str, **smtp_settings) -> Union[SMTPSession, None]:
+    """
+    Check the credentials of a sender and return a session to send with.
 
+    Credentials that logged in successfully within SMTP_CREDENTIAL_TTL seconds are not checked
+    again, and the session connects on its first send. Otherwise the session logs in now and
+    the open connection is returned, so the check costs no extra handshake.
 
+    Parameters:
+    - email (str): The sender's email address.
+    - password (str): The sender's email password.
+    - **smtp_settings: Extra keyword arguments for SMTPSession (host, port, starttls).
 
-
-
-
-
-
-
-
+    Returns:
+    - Union[SMTPSession, None]: The session, or None if the login failed.
+    """
+    smtp_session = SMTPSession(email, password, **smtp_settings)
+    if credential_cache.is_valid(email, password):
+        return smtp_session
+    try:
+        smtp_session.connect()
+        return smtp_session
+    except (smtplib.SMTPException, OSError):
+        # Refused credentials, unreachable server or dropped connection
+        return None
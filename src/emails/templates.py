@@ -0,0 +1,165 @@
+import os
+import sys
+import html
+from string import Formatter
+from functools import lru_cache
+from pathlib import Path
+from typing import Union
+from dotenv import load_dotenv
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from utils.cache import LRUCache
+
+load_dotenv(dotenv_path=str(Path("./env/campaign.env")))
+
+TEMPLATE_CACHE_SIZE: int = int(os.getenv("TEMPLATE_CACHE_SIZE", 64))
+# Sector written when a company does not give one
+DEFAULT_SECTOR: str = "DEVELOPMENT INFORMATIQUE"
+# Placeholders of the internship templates, see message_from_file
+TEMPLATE_FIELDS: tuple = ("EntrepriseContactName", "EntrepriseName", "EntrepriseSecteurActivite",
+                          "MyEmail", "MyPhone", "MyName", "MyLinkedIn")
+
+
+class CompiledTemplate:
+    """
+    A `str.format` template parsed once into its literal text and its placeholders.
+
+    Rendering fills the placeholder slots of the precomputed pieces and joins them, instead of
+    parsing the template again for every message. The result is the same as `text.format(**values)`.
+
+    Parameters:
+    - text (str): The template, e.g. the content of an HTML file with {MyName} placeholders.
+
+    Raises:
+    - ValueError: If the template is malformed, e.g. an unmatched '{'.
+
+    Example:
+    >>> template = CompiledTemplate("<p>Hello {EntrepriseContactName}, {{ok}}</p>")
+    >>> template.render({"EntrepriseContactName": "Jane"})
+    '<p>Hello Jane, {ok}</p>'
+    >>> template.fields
+    {'EntrepriseContactName'}
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._pieces: list = []
+        # (index in _pieces, placeholder name, format string of the placeholder or None when it is a plain {name})
+        self._slots: list = []
+        self.fields: set = set()
+        for literal, field_name, format_spec, conversion in Formatter().parse(text):
+            if literal:
+                self._pieces.append(literal)
+            if field_name is None:
+                continue
+            name = field_name.split(".", 1)[0].split("[", 1)[0]
+            is_plain = name == field_name and name and not name.isdigit() and not format_spec and not conversion
+            field_format = None if is_plain else "{%s%s%s}" % (field_name, f"!{conversion}" if conversion else "",
+                                                               f":{format_spec}" if format_spec else "")
+            self._slots.append((len(self._pieces), name, field_format))
+            self._pieces.append(None)
+            self.fields.add(name)
+
+    def render(self, values: dict, escape: bool = False) -> str:
+        """
+        Fill the placeholders of the template.
+
+        Parameters:
+        - values (dict): The value of each placeholder, by name. Extra values are ignored.
+        - escape (bool, optional): HTML-escape the values, e.g. when they come from an uploaded file. Default is False.
+
+        Returns:
+        - str: The rendered text.
+
+        Raises:
+        - KeyError: If a placeholder has no value.
+        """
+        pieces = self._pieces.copy()
+        for index, name, field_format in self._slots:
+            value = str(values[name]) if field_format is None else field_format.format_map(values)
+            pieces[index] = html.escape(value) if escape else value
+        return "".join(pieces)
+
+
+class TemplateCache:
+    """
+    Compiled templates of files, loaded once and kept until the file changes.
+
+    A template is read and compiled the first time it is used, then served from memory while
+    the modification time and size of its file stay the same; only a stat is done per call.
+
+    Parameters:
+    - maxsize (int, optional): Maximum number of templates kept. Default is TEMPLATE_CACHE_SIZE.
+    """
+
+    def __init__(self, maxsize: int = TEMPLATE_CACHE_SIZE):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def get(self, file_path: str) -> CompiledTemplate:
+        """
+        Get the compiled template of a file.
+
+        Parameters:
+        - file_path (str): The path to the template file.
+
+        Returns:
+        - CompiledTemplate: The template, compiled from the current content of the file.
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self._cache.get(path)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with open(path, 'r', encoding='utf-8') as file:
+            template = CompiledTemplate(file.read())
+        self._cache.set(path, (version, template))
+        return template
+
+    def clear(self) -> None:
+        """
+        Forget every template.
+        """
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+template_cache = TemplateCache()
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(text: str) -> CompiledTemplate:
+    """
+    Get the compiled template of a text, e.g. the body of a campaign. The same text is compiled once.
+
+    Parameters:
+    - text (str): The template.
+
+    Returns:
+    - CompiledTemplate: The compiled template.
+    """
+    return CompiledTemplate(text)
+
+
+def recipient_values(EntrepriseContactName: Union[str, None], EntrepriseName: Union[str, None],
+                     EntrepriseSecteurActivite: Union[str, None], MyEmail: str, MyPhone: str, MyName: str,
+                     MyLinkedIn: str) -> dict:
+    """
+    Get the placeholder values of the message sent to one company.
+
+    Missing contact and company names are left empty, and a missing sector is DEFAULT_SECTOR.
+
+    Returns:
+    - dict: The value of each of TEMPLATE_FIELDS.
+    """
+    return {
+        "EntrepriseContactName": EntrepriseContactName or "",
+        "EntrepriseName": EntrepriseName or "",
+        "EntrepriseSecteurActivite": EntrepriseSecteurActivite or DEFAULT_SECTOR,
+        "MyEmail": MyEmail or "",
+        "MyPhone": MyPhone or "",
+        "MyName": MyName or "",
+        "MyLinkedIn": MyLinkedIn or "",
+    }
@@ -0,0 +1,299 @@
+import abc
+import threading
+import uuid
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Union
+
+
+class Job:
+    """
+    A background job and its progress.
+
+    Attributes:
+        id (str): Unique identifier for the job.
+        owner_id (str): ID of the user who enqueued the job.
+        status (str): One of 'pending', 'running', 'paused', 'done' or 'failed'.
+        total (int): Number of items the job has to process.
+        success_receiver (list): Items processed successfully.
+        failed_receiver (list): Items that failed.
+        result (dict): Value returned by the task once it finishes.
+        error (str): Error message if the task raised.
+        created_at (datetime.datetime): When the job was enqueued.
+        paused_until (datetime.datetime): When a paused job expects to resume, in UTC.
+    """
+
+    def __init__(self, total: int, owner_id: str = None, job_id: str = None):
+        self.id: str = job_id or str(uuid.uuid4())
+        self.owner_id: str = owner_id
+        self.status: str = "pending"
+        self.total: int = total
+        self.success_receiver: list = []
+        self.failed_receiver: list = []
+        self.result: dict = {}
+        self.error: str = ""
+        self.created_at: datetime.datetime = datetime.datetime.now(datetime.timezone.utc)
+        self.paused_until: Union[datetime.datetime, None] = None
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of items not processed yet.
+        """
+        return self.total - len(self.success_receiver) - len(self.failed_receiver)
+
+    @property
+    def is_active(self) -> bool:
+        """
+        Whether the job is still pending, running or paused.
+        """
+        return self.status in ("pending", "running", "paused")
+
+    def to_dict(self, receivers: bool = False) -> dict:
+        """
+        Convert the job to a JSON serializable dictionary.
+
+        While the job is active only the counters are returned, so polling a large campaign
+        does not copy its receivers each time.
+
+        Parameters:
+            receivers (bool, optional): Also return the receivers of an active job. Default is False.
+
+        Returns:
+            dict: The job status and progress counters, and the receivers once the job is over.
+        """
+        status = {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "sent": len(self.success_receiver),
+            "failed": len(self.failed_receiver),
+            "pending": self.pending,
+            "result": self.result,
+            "error": self.error,
+            "paused_until": self.paused_until.isoformat() if self.paused_until else None,
+        }
+        if receivers or not self.is_active:
+            status["success_receiver"] = list(self.success_receiver)
+            status["failed_receiver"] = list(self.failed_receiver)
+        return status
+
+
+class JobBackend(abc.ABC):
+    """
+    Storage for job state. Subclass it to keep jobs somewhere else than in process memory.
+    """
+
+    @abc.abstractmethod
+    def save(self, job: Job) -> None:
+        """
+        Store the current state of a job.
+
+        Parameters:
+            job (Job): The job to store.
+        """
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> Union[Job, None]:
+        """
+        Get a job by its ID.
+
+        Parameters:
+            job_id (str): The job's ID.
+
+        Returns:
+            Union[Job, None]: The job if found, otherwise None.
+        """
+
+
+class InMemoryJobBackend(JobBackend):
+    """
+    Keeps jobs in a dictionary of the current process.
+    """
+
+    def __init__(self):
+        self._jobs: dict = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: Job) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Union[Job, None]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+class JobReporter:
+    """
+    Callback given to the task of a job to report its progress.
+
+    Calling it records one processed item; `pause` lets the task tell that it is waiting,
+    e.g. for a rate limit, and when it expects to go on. `defer` asks for the task to be run
+    again later instead of waiting in its worker.
+
+    Parameters:
+        job (Job): The job being run.
+        backend (JobBackend): Where the job state is saved after each change.
+        lock (threading.Lock): Lock guarding the job state.
+    """
+
+    def __init__(self, job: Job, backend: JobBackend, lock: threading.Lock):
+        self.job = job
+        self.backend = backend
+        self.lock = lock
+        self.deferred_until: Union[datetime.datetime, None] = None
+
+    def __call__(self, item: str, is_success: bool) -> None:
+        with self.lock:
+            if is_success:
+                self.job.success_receiver.append(item)
+            else:
+                self.job.failed_receiver.append(item)
+            self.backend.save(self.job)
+
+    def pause(self, until: Union[datetime.datetime, None]) -> None:
+        """
+        Mark the job as paused until a given time, or as running again.
+
+        Parameters:
+            until (Union[datetime.datetime, None]): When the job expects to resume, None when it resumed.
+        """
+        with self.lock:
+            if self.job.status not in ("running", "paused"):
+                return
+            self.job.status = "running" if until is None else "paused"
+            self.job.paused_until = until
+            self.backend.save(self.job)
+
+    def defer(self, until: datetime.datetime) -> None:
+        """
+        Run the task again at a given time once it returns, instead of finishing the job.
+
+        The job stays paused in between and its worker is free for other jobs. The task must be
+        able to go on from where it stopped, e.g. a campaign resumed from its checkpoint.
+
+        Parameters:
+            until (datetime.datetime): When to run the task again, in UTC.
+        """
+        self.deferred_until = until
+
+
+class JobQueue:
+    """
+    In-process job queue drained by a pool of worker threads.
+
+    Parameters:
+        backend (JobBackend, optional): Where job state is stored. Default is InMemoryJobBackend.
+        max_workers (int, optional): Number of worker threads. Default is 4.
+
+    Example:
+        >>> queue = JobQueue()
+        >>> job = queue.enqueue(lambda report: report("a@example.com", True), total=1)
+        >>> queue.get(job.id).status
+        'done'
+    """
+
+    def __init__(self, backend: JobBackend = None, max_workers: int = 4):
+        self.backend: JobBackend = backend if backend is not None else InMemoryJobBackend()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._closed: bool = False
+        # Timers of the deferred jobs, cancelled by shutdown
+        self._timers: set = set()
+
+    @property
+    def is_closed(self) -> bool:
+        """
+        Whether the queue was shut down; it accepts no more jobs.
+        """
+        return self._closed
+
+    def enqueue(self, task: Callable[[Callable[[str, bool], None]], dict], total: int, owner_id: str = None,
+                job_id: str = None, unique: bool = False) -> Union[Job, None]:
+        """
+        Enqueue a task and return at once.
+
+        Parameters:
+            task (Callable): Function called with a `report(item, is_success)` callback, which it
+                calls once per processed item, and whose `report.pause(until)` marks the job paused.
+                Its return value is stored as the job result, unless it called `report.defer(until)`:
+                the job then stays paused and the task is called again at that time.
+            total (int): Number of items the task will report.
+            owner_id (str, optional): ID of the user who owns the job.
+            job_id (str, optional): ID of the job, e.g. the ID of what it works on. Default is a new UUID.
+            unique (bool, optional): Enqueue nothing if the job with this ID is still pending, running
+                or paused. Default is False.
+
+        Returns:
+            Job: The pending job, or None if `unique` and the job is already active.
+        """
+        with self._lock:
+            if unique and job_id is not None:
+                existing = self.backend.get(job_id)
+                if existing is not None and existing.is_active:
+                    return None
+            job = Job(total=total, owner_id=owner_id, job_id=job_id)
+            self.backend.save(job)
+        self._executor.submit(self._run, job, task)
+        return job
+
+    def get(self, job_id: str) -> Union[Job, None]:
+        """
+        Get a job by its ID.
+
+        Parameters:
+            job_id (str): The job's ID.
+
+        Returns:
+            Union[Job, None]: The job if found, otherwise None.
+        """
+        return self.backend.get(job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the workers.
+
+        Parameters:
+            wait (bool, optional): Wait for the queued jobs to finish. Default is True.
+        """
+        with self._lock:
+            self._closed = True
+            timers, self._timers = self._timers, set()
+        for timer in timers:
+            # The job stays paused, e.g. for the next process to resume
+            timer.cancel()
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: Job, task: Callable) -> None:
+        report = JobReporter(job, self.backend, self._lock)
+        with self._lock:
+            job.status, job.paused_until = "running", None
+            self.backend.save(job)
+        try:
+            result = task(report) or {}
+            status = "done"
+        except Exception as e:
+            print(f"Error running job {job.id}: {e}")
+            job.error = str(e)
+            result, status = {}, "failed"
+        with self._lock:
+            if status == "done" and report.deferred_until is not None:
+                job.status, job.paused_until = "paused", report.deferred_until
+                self.backend.save(job)
+                if not self._closed:
+                    delay = (report.deferred_until - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+                    timer = threading.Timer(max(0.0, delay), self._run_again, args=(job, task))
+                    timer.daemon = True
+                    self._timers.add(timer)
+                    timer.start()
+                return
+            job.result, job.status, job.paused_until = result, status, None
+            self.backend.save(job)
+
+    def _run_again(self, job: Job, task: Callable) -> None:
+        with self._lock:
+            self._timers.discard(threading.current_thread())
+            if self._closed:
+                return
+            self._executor.submit(self._run, job, task)
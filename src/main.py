@@ -1,31 +1,34 @@
 import os
 import sys
-import uuid
+import json
+import datetime
 parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
 sys.path.append(parent_dir)
-from utils.file_txt import parse_text_file
+from utils.file_txt import iter_recipients,iter_contacts
 
 from fastapi import (
-                    FastAPI, File, UploadFile, Form, status, HTTPException,APIRouter
-                    )   
+                    FastAPI, File, UploadFile, Form, status, HTTPException,APIRouter,Depends,Query
+                    )
+from fastapi.responses import StreamingResponse   
 from exceptions.exceptions import (
                             FileExtensionException,FileNotFoundException,
                             PasswordException,EmailException,EmailConnectionFailedException,
-                            LinkException,UserExistException
+                            LinkException,UserExistException,FileTooLargeException
                             )
 from src.emails.main import (
-                            send_email_smtp,check_gmail_connection
+                            send_email_smtp,open_smtp_session
                             )
+from src.emails.templates import TEMPLATE_FIELDS,compile_template,recipient_values
 from utils.validity import (is_gmail_password_structure,is_valid_email,
                             is_valid_password,is_linkedin_profile_link)
-import shutil
 from pathlib import Path
 from contextlib import asynccontextmanager
 # from models import Operations,User
 from models.user import User
-from models.operations import Operations
+from models.operations import Operations,OPERATION_FIELDS,DEFAULT_OPERATION_FIELDS
+from models.campaign_recipient import CampaignRecipient
 from utils.jwt import (
-                        create_access_token,decode_access_token
+                        create_access_token
                       )
 from utils.file_pdf import (
                             encrypt_pdf_to_base64,decrypt_pdf_from_base64
@@ -34,16 +37,27 @@ from utils.file_img import (
                             encrypt_image_to_base64,decrypt_image_from_base64
                              )
 from utils.generate import generate_random_code
+from utils.concurrency import run_blocking
+from utils.password import hash_password_async, verify_and_update_async, shutdown_password_executor
+from utils.blob_store import BlobStore
+from utils.workspace import Workspace,WorkspaceQuotaExceeded,sweep_stale
 from dotenv import load_dotenv
-from database import init_db
+from database import create_tables,get_session,SessionLocal
+from sqlalchemy.orm import Session
 from chat.main import get_possible_job_titles,get_email_body
+from src.jobs.main import JobQueue
+from src.campaigns.main import start_campaign,run_campaign,resume_campaigns
+from src.auth.main import (AuthenticatedUser,current_user,current_user_form,
+                           current_user_id,invalidate_user)
 
-session=init_db()
+create_tables()
 
 # Load variables from the specified .env file
 load_dotenv(dotenv_path=str(Path("./env/secrets.env")))
 load_dotenv(dotenv_path=str(Path("./env/communication.env")))
 load_dotenv(dotenv_path=str(Path("./env/secrets.env")))
+load_dotenv(dotenv_path=str(Path("./env/campaign.env")))
+load_dotenv(dotenv_path=str(Path("./env/server.env")))
 
 ACCESS_TOKEN_EXPIRE_MINUTES=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY")
@@ -52,8 +66,28 @@ FERNET_KEY:str=os.getenv("FERNET_KEY")
 EMAIL_PROJECT:str=os.getenv("EMAIL_PROJECT")
 PASSWORD_EMAIL_PROJECT:str=os.getenv("PASSWORD_EMAIL_PROJECT")
 PDF_ENCRYPTION_SECRET:str=os.getenv("PDF_ENCRYPTION_SECRET")
+CAMPAIGN_WORKERS:int=int(os.getenv("CAMPAIGN_WORKERS",4))
+CAMPAIGN_CONNECTIONS:int=int(os.getenv("CAMPAIGN_CONNECTIONS",3))
+OPERATIONS_PAGE_SIZE:int=int(os.getenv("OPERATIONS_PAGE_SIZE",50))
+OPERATIONS_MAX_PAGE_SIZE:int=int(os.getenv("OPERATIONS_MAX_PAGE_SIZE",500))
 
-app = FastAPI()
+# Resumes sent by campaigns, stored by content hash
+resume_store=BlobStore(str(Path("./data/resume")))
+
+# Campaigns are sent in the background by this pool of workers
+job_queue=JobQueue(max_workers=CAMPAIGN_WORKERS)
+
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    # Workspaces of requests cut short by a crash are not cleaned up by their request
+    await run_blocking(sweep_stale)
+    # Campaigns cut short by a restart go on from their last checkpoint
+    await run_blocking(resume_campaigns,job_queue,resume_store.path,connections=CAMPAIGN_CONNECTIONS)
+    yield
+    job_queue.shutdown(wait=False)
+    shutdown_password_executor(wait=False)
+
+app = FastAPI(lifespan=lifespan)
 
 # Create a router for API endpoints
 api_router = APIRouter(prefix="/api")
@@ -66,19 +100,18 @@ async def index():
     return {"messgae":"I am working good !"}
 
 @api_router.post("/email/send-internship")
-async def send_emails(access_token:str= Form(None),emails: UploadFile = File(None), email_body: str = Form(...),
+async def send_emails(emails: UploadFile = File(None), email_body: str = Form(...),
                       resume: UploadFile = File(None), email_subject: str = Form(...), 
-                      file_separator: str = Form(...)):
+                      file_separator: str = Form(...), skip_previous: bool = Form(False),
+                      personalize: bool = Form(False),
+                      user: AuthenticatedUser = Depends(current_user_form), session: Session = Depends(get_session)):
     """
     Send internship emails with attachments.
+
+    With `personalize`, the emails file is a CSV of (email, contact name, company, sector) and the
+    body is a template rendered for each recipient with the placeholders of message_from_file.
     """
-    decode_token:dict=decode_access_token(access_token,JWT_SECRET_KEY,ALGORITHM)
-    if not decode_token["valid"]:
-        raise HTTPException(status_code=401, detail="Invalid access token")
-    user_id:str=decode_token["user_id"]
-    user:User|None=User.get_user_by_id(session,user_id)
-    if user is None:
-        raise HTTPException(status_code=401, detail="Invalid access token")
+    user_id:str=user.id
     sender_email:str=user.email
     sender_password:str=user.get_email_password(encryption_key=FERNET_KEY)
     # Check if any of the files are null
@@ -88,8 +121,19 @@ async def send_emails(access_token:str= Form(None),emails: UploadFile = File(Non
     if resume is None:
         raise FileNotFoundException(detail="Resume PDF files are missing.")
     
-    # Check if the emails file is a TXT file
-    if not emails.filename.lower().endswith('.txt'):
+    # Check if the emails file is a TXT file, or a CSV of contacts for a personalized campaign
+    if personalize:
+        if not emails.filename.lower().endswith(('.txt','.csv')):
+            raise FileExtensionException(detail="The contacts file must be a CSV or TXT file.")
+        # Check the template before anything is stored, a campaign never fails on its body
+        try:
+            unknown_fields:set=compile_template(email_body).fields-set(TEMPLATE_FIELDS)
+        except ValueError as e:
+            raise EmailException(detail=f"The email body is not a valid template: {e}")
+        if unknown_fields:
+            raise EmailException(detail=f"Unknown placeholders in the email body: {', '.join(sorted(unknown_fields))}. "
+                                        f"The placeholders are {', '.join(TEMPLATE_FIELDS)}.")
+    elif not emails.filename.lower().endswith('.txt'):
         raise FileExtensionException(detail="The emails file must be a TXT file.")    
     
     # Check if the resume file is a PDF file
@@ -102,53 +146,76 @@ async def send_emails(access_token:str= Form(None),emails: UploadFile = File(Non
     if not is_valid_email(sender_email):
         raise EmailException(detail="The email form is incorrect")
 
-    #Check the validity of email and password to connect to gmail
-    if not check_gmail_connection(sender_email,sender_password):
+    #Check the validity of email and password to connect to gmail, the campaign reuses this connection
+    smtp_session=await run_blocking(open_smtp_session,sender_email,sender_password)
+    if smtp_session is None:
         raise EmailConnectionFailedException("Failed to connect to gmail.")
-    temp_dir:str = str(Path("./temp"))
-    resume_dir:str = str(Path("./data/resume"))
-    data_dir:str = str(Path("./data"))
-    # Check if data directory exists, if not, create it
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-
-    # Check if resume directory exists within data directory, if not, create it
-    if not os.path.exists(resume_dir):
-        os.makedirs(resume_dir)
-    
-    # Check if temp_dir exists, if not, create it
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
+    resume_name:str=resume.filename
+    rejected_receiver:list=[]
+    skipped_receiver:list=[]
+
+    def store_files()->tuple[str,list,str]:
+        # Resumes are stored once per content, sending the same resume again writes nothing.
+        # A new resume is staged in the private workspace of this request, never at a shared path.
+        with Workspace() as workspace:
+            try:
+                pdf_id:str=resume_store.put_stream(resume.file,workspace=workspace)
+            except WorkspaceQuotaExceeded:
+                raise FileTooLargeException(detail=f"The resume file must be smaller than {workspace.quota} bytes.")
+
+        # Parse the emails straight from the upload: invalid and duplicate addresses never reach the sender
+        contacts:dict={}
+        if personalize:
+            contacts={contact["email"]:contact for contact in iter_contacts(emails.file, file_separator, rejected_receiver)}
+            emails_list:list = list(contacts)
+        else:
+            emails_list:list = list(iter_recipients(emails.file, file_separator, rejected_receiver))
+
+        # Leave out the addresses this user already mailed successfully, looked up through the (user_id, email) index
+        if skip_previous:
+            emails_list,skipped=CampaignRecipient.exclude_contacted(session,user_id,emails_list)
+            skipped_receiver.extend(skipped)
+
+        # The placeholder values of each recipient are saved with it, its body is rendered when it is sent
+        template_values:dict=None
+        if personalize:
+            template_values={email:recipient_values(contacts[email]["contact_name"],contacts[email]["company"],
+                                                    contacts[email]["sector"],sender_email,user.phone_number,
+                                                    user.username,user.linkedin_link)
+                             for email in emails_list}
+
+        # The campaign is saved before anything is sent, with every recipient pending,
+        # so it can go on from its last checkpoint if the server restarts
+        operation_id:str=start_campaign(session,user,sender_email,email_subject,email_body,pdf_id,resume_name,
+                                        emails_list,template_values=template_values)
+        return pdf_id,emails_list,operation_id
 
+    try:
+        pdf_id,emails_list,operation_id=await run_blocking(store_files)
+    except Exception:
+        smtp_session.close()
+        raise
+    resume_path:str=resume_store.path(pdf_id)
 
-    pdf_id:str = str(uuid.uuid4())
-    with open(f"{temp_dir}/emails.txt", "wb") as emails_file:
-        shutil.copyfileobj(emails.file, emails_file)
+    def campaign(report)->dict:
+        # The request session is closed by now, the campaign opens its own
+        # A long pause of the sender ends this run and the job runs again when it is over, the session logs in again then
+        return run_campaign(operation_id,sender_password,resume_path,report=report,connections=CAMPAIGN_CONNECTIONS,smtp_session=smtp_session,on_pause=report.pause,on_defer=report.defer)
 
-    with open(f"{resume_dir}/{pdf_id}.pdf", "wb") as resume_file:
-        shutil.copyfileobj(resume.file, resume_file)
-    
-    # Proceed with processing if the files are of the correct types
-    success_receiver:list = []
-    failed_receiver:list = []
-    # Use parse_text_file to parse the emails file with the specified separator
-    emails_list:list = parse_text_file(f"{temp_dir}/emails.txt", file_separator)
-
-    # Iterate over the parsed emails list and process each email address
-    for email in emails_list:
-        if send_email_smtp(sender_email,sender_password,email,email_subject,email_body,f"{resume_dir}/{pdf_id}.pdf",resume.filename):
-            success_receiver.append(email)
-        else:
-            failed_receiver.append(email)
-    try:
-        is_saved_operations:bool=Operations.create_operation(session,sender_email,email_body,email_subject,",".join(success_receiver),",".join(failed_receiver),pdf_id,user_id)
-    except ValueError as ve:
-        raise UserExistException(detail="User does not exist with the provided user id")
-    os.remove(f"{temp_dir}/emails.txt")
+    # Send in the background and let the client poll /email/jobs/{job_id}, the job has the id of the operation
+    job=job_queue.enqueue(campaign,total=len(emails_list),owner_id=user_id,job_id=operation_id)
+    return {"job_id":job.id,"status":job.status,"total":job.total,"rejected_receiver":rejected_receiver,"skipped_receiver":skipped_receiver}
 
-    if is_saved_operations:
-        return {"success_receiver": success_receiver, "failed_receiver": failed_receiver,"saved":is_saved_operations}
-    return {"success_receiver": success_receiver, "failed_receiver": failed_receiver,"saved":False}
+
+@api_router.get("/email/jobs/{job_id}")
+async def get_campaign_job(job_id:str,receivers:bool=False,user_id:str=Depends(current_user_id)):
+    """
+    Get the progress of a campaign sent by /email/send-internship, with its receivers once it is over or if asked.
+    """
+    job=job_queue.get(job_id)
+    if job is None or job.owner_id!=user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict(receivers=receivers)
 
 
 
@@ -168,31 +235,37 @@ async def send_verification_email_code(to: str = Form(...),language:str = Form("
     """
     if not is_valid_email(to):
         raise EmailException(detail="The email form is incorrect")
-    #Check the validity of email and password to connect to gmail
-    if not check_gmail_connection(EMAIL_PROJECT,PASSWORD_EMAIL_PROJECT):
+    #Check the validity of email and password to connect to gmail, the code is sent over this connection
+    smtp_session=await run_blocking(open_smtp_session,EMAIL_PROJECT,PASSWORD_EMAIL_PROJECT)
+    if smtp_session is None:
         raise EmailConnectionFailedException("Failed to connect to gmail.")
     code_generated:str=generate_random_code(length,type_)
     email_subject:str="Verification code"
     email_body:str=f"<h1>Your code is {code_generated}</h1>"
-    is_send:bool=send_email_smtp(
-        sender_email=EMAIL_PROJECT,
-        sender_password=PASSWORD_EMAIL_PROJECT,
-        to=to,
-        email_subject=email_subject,
-        email_body=email_body
-    )
+    try:
+        is_send:bool=await run_blocking(
+            send_email_smtp,
+            sender_email=EMAIL_PROJECT,
+            sender_password=PASSWORD_EMAIL_PROJECT,
+            to=to,
+            email_subject=email_subject,
+            email_body=email_body,
+            smtp_session=smtp_session
+        )
+    finally:
+        await run_blocking(smtp_session.close)
 
     return {"code":(code_generated if is_send else "")}  
     
 
 @api_router.post("/users/email-exist")
-async def check_email_exist(email: str = Form(...)):
+async def check_email_exist(email: str = Form(...), session: Session = Depends(get_session)):
     """
     Check if an email exists.
     """
     if not is_valid_email(email):
         raise EmailException(detail="The email form is incorrect")
-    user:User|None=User.get_user_by_email(session,email)
+    user:User|None=await run_blocking(User.get_user_by_email,session,email)
     if user:
         access_token = create_access_token(user.id,ACCESS_TOKEN_EXPIRE_MINUTES,JWT_SECRET_KEY,ALGORITHM)
         return {"exist":True,"access_token":access_token}
@@ -206,7 +279,8 @@ async def create_user(
     linkedin_link: str = Form(None),
     password: str = Form(...),
     phone_number: str = Form(...),
-    email_password: str = Form(None)
+    email_password: str = Form(None),
+    session: Session = Depends(get_session)
 ):
     """
     Create a new user.
@@ -233,7 +307,9 @@ async def create_user(
             raise LinkException("Invalid linkdin link structure")
 
         # Save user to database
-        is_created:bool=User.create_user(session,username, email, linkedin_link, password, phone_number, email_password,FERNET_KEY)
+        # Hashing is CPU bound, it runs in the password process pool
+        password_hash:str=await hash_password_async(password)
+        is_created:bool=await run_blocking(User.create_user,session,username, email, linkedin_link, password, phone_number, email_password,FERNET_KEY,password_hash)
         if not is_created:
             raise UserExistException(f"User already exist with this email {email}")
         
@@ -247,40 +323,53 @@ async def create_user(
 @api_router.post("/users/login")
 async def login(
     email: str = Form(...),
-    password: str = Form(...)
+    password: str = Form(...),
+    session: Session = Depends(get_session)
 ):
     """
     User login.
     """
-    # Verify login credentials
-    is_valid_login, user_id = User.verify_login(session,email, password)
-    
+    # Verify login credentials, the hash is checked in the password process pool
+    user:User|None=await run_blocking(User.get_user_by_email,session,email)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    is_valid_login, new_hash = await verify_and_update_async(password, user.password_hash)
     if not is_valid_login:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    user_id:str=user.id
+
+    # Upgrade a hash made with an outdated scheme or settings
+    if new_hash is not None:
+        user.password_hash=new_hash
+        await run_blocking(session.commit)
     
     # Create access token
     access_token = create_access_token(user_id,ACCESS_TOKEN_EXPIRE_MINUTES,JWT_SECRET_KEY,ALGORITHM)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @api_router.put("/users/change-password")
-def change_password(
+async def change_password(
     new_password: str= Form(...),
-    access_token: str= Form(...)
+    authenticated_user: AuthenticatedUser = Depends(current_user_form),
+    session: Session = Depends(get_session)
     ):
-    # Get the user from the database
-    decode_token:dict=decode_access_token(access_token,JWT_SECRET_KEY,ALGORITHM)
-    if not decode_token["valid"]:
-        raise HTTPException(status_code=401, detail="Invalid access token")
-    user_id:str=decode_token["user_id"]
-    user:User|None=User.get_user_by_id(session,user_id)
+    # Get the user from the database, the cached copy is read-only
+    user:User|None=await run_blocking(User.get_user_by_id,session,authenticated_user.id)
     if user is None:
         raise HTTPException(status_code=401, detail="Invalid access token")
     # Check if email password has correct structure
     if not is_valid_password(new_password):
         raise PasswordException("Invalid password structure")
-    # Set the new password
-    user.set_password(new_password)
-    session.commit()
+
+    password_hash:str=await hash_password_async(new_password)
+
+    def set_password()->None:
+        # Set the new password
+        user.password_hash=password_hash
+        session.commit()
+
+    await run_blocking(set_password)
+    invalidate_user(user.id)
     
     # Update the user in the database    
     return {"message": "Password changed successfully"}
@@ -310,82 +399,128 @@ async def create_operation(
     subject: str = Form(...),
     success_receiver: str = Form(...),
     failed_receiver: str = Form(...),
-    access_token: str = Form(...),
-    pdf_id: str = Form(...)
+    pdf_id: str = Form(...),
+    user: AuthenticatedUser = Depends(current_user_form),
+    session: Session = Depends(get_session)
 ):
     """
     Create a new operation associated with a user.
     """
-    
-    decode_token:dict=decode_access_token(access_token,JWT_SECRET_KEY,ALGORITHM)
-    if not decode_token["valid"]:
-        raise HTTPException(status_code=401, detail="Invalid access token")
-    user_id:str=decode_token["user_id"]
-    user:User|None=User.get_user_by_id(session,user_id)
-    if user is None:
-        raise HTTPException(status_code=401, detail="Invalid access token")
     from_email:str=user.email
     try:
         # Create the operation
-        operation = Operations.create_operation(
+        operation = await run_blocking(
+            Operations.create_operation,
             session,
             from_email=from_email,
             email_body=email_body,
             subject=subject,
             success_receiver=success_receiver,
             failed_receiver=failed_receiver,
-            user_id=user_id,
-            pdf_id=pdf_id
+            pdf_id=pdf_id,
+            user=user
         )
         return {"message": "Operation created successfully"}
     except ValueError as ve:
         raise UserExistException(detail="User does not exist with the provided user id")
     
 
+def parse_fields(fields:str|None,default:tuple)->tuple:
+    """
+    Parse the comma separated `fields` query parameter of the operations endpoints.
+    """
+    if not fields:
+        return default
+    selected:tuple=tuple(field.strip() for field in fields.split(",") if field.strip())
+    unknown:list=[field for field in selected if field not in OPERATION_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(OPERATION_FIELDS)}")
+    return selected
+
+
+@api_router.get("/operations/{access_token}/")
+async def get_operation_user(user: AuthenticatedUser = Depends(current_user), session: Session = Depends(get_session),
+                             limit:int=Query(OPERATIONS_PAGE_SIZE,ge=1,le=OPERATIONS_MAX_PAGE_SIZE),
+                             cursor:str|None=None,fields:str|None=None,
+                             since:datetime.datetime|None=None,until:datetime.datetime|None=None):
+    """
+    Get a page of the operations of the user of an access_token, the most recent first.
+    """
+    print("/operations/{access_token}/")
+    selected_fields:tuple=parse_fields(fields,DEFAULT_OPERATION_FIELDS)
+    try:
+        operations_info,next_cursor = await run_blocking(Operations.get_operations_page,session,user=user,
+                                                         limit=limit,cursor=cursor,fields=selected_fields,
+                                                         since=since,until=until)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"data":operations_info,"next_cursor":next_cursor}
+
+
+# Registered before /{operation_id}/, which would take "export" for an operation id
+@api_router.get("/operations/{access_token}/export/")
+async def export_operations(user: AuthenticatedUser = Depends(current_user),fields:str|None=None,
+                            since:datetime.datetime|None=None,until:datetime.datetime|None=None):
+    """
+    Export every operation of the user of an access_token as a streamed JSON document.
+    """
+    selected_fields:tuple=parse_fields(fields,OPERATION_FIELDS)
+
+    def export():
+        # The request session is closed before the body is streamed, the export opens its own
+        with SessionLocal() as export_session:
+            chunk:list=['{"data":[']
+            size:int=0
+            separator:str=""
+            for operation in Operations.iter_operations(export_session,user=user,fields=selected_fields,
+                                                        since=since,until=until):
+                item:str=separator+json.dumps(operation)
+                separator=","
+                chunk.append(item)
+                size+=len(item)
+                # Send about 64 KiB at a time rather than one write per operation
+                if size>=65536:
+                    yield "".join(chunk).encode()
+                    chunk,size=[],0
+            chunk.append("]}")
+            yield "".join(chunk).encode()
+
+    return StreamingResponse(export(),media_type="application/json",
+                             headers={"Content-Disposition":'attachment; filename="operations.json"'})
+
+
 @api_router.get("/operations/{access_token}/{operation_id}/")
-async def get_operation(access_token:str,operation_id: str):
+async def get_operation(operation_id: str, user: AuthenticatedUser = Depends(current_user), session: Session = Depends(get_session)):
     """
     Get an operation by operation ID.
     """
     print("/operations/{access_token}/{operation_id}/")
-    decode_token:dict=decode_access_token(access_token,JWT_SECRET_KEY,ALGORITHM)
-    if not decode_token["valid"]:
-        raise HTTPException(status_code=401, detail="Invalid access token")
-    user_id:str=decode_token["user_id"]
-    user:User|None=User.get_user_by_id(session,user_id)
-    if user is None:
-        raise HTTPException(status_code=401, detail="Invalid access token")
     try:
-        operation = Operations.get_operation_by_id(session, operation_id, user_id)
+        operation = await run_blocking(Operations.get_operation_by_id,session, operation_id, user=user)
     except ValueError as ve:
         raise UserExistException(detail="User does not exist with the provided user id")
     return {"data": operation}  
 
 
-@api_router.get("/operations/{access_token}/")
-async def get_operation_user(access_token:str):
+@api_router.get("/operations/{access_token}/{operation_id}/recipients/")
+async def get_operation_recipients(operation_id: str, user: AuthenticatedUser = Depends(current_user),
+                                   session: Session = Depends(get_session),
+                                   limit:int=Query(OPERATIONS_PAGE_SIZE,ge=1,le=OPERATIONS_MAX_PAGE_SIZE),
+                                   cursor:int|None=None,status:str|None=None):
     """
-    Get an operation by access_token(user ID).
+    Get a page of the recipients of an operation, in sending order.
     """
-    print("/operations/{access_token}/")
-    decode_token:dict=decode_access_token(access_token,JWT_SECRET_KEY,ALGORITHM)
-    if not decode_token["valid"]:
-        raise HTTPException(status_code=401, detail="Invalid access token")
-    user_id:str=decode_token["user_id"]
-    user:User|None=User.get_user_by_id(session,user_id)
-    if user is None:
-        raise HTTPException(status_code=401, detail="Invalid access token")
-    try:
-        operations_info:list = Operations.get_operations_info(session, user_id)
-    except ValueError as ve:
-        raise UserExistException(detail="User does not exist with the provided user id")
-    return {"data":operations_info}
+    if status is not None and status not in (CampaignRecipient.SENT,CampaignRecipient.FAILED,CampaignRecipient.PENDING):
+        raise HTTPException(status_code=400, detail="Unknown status, it is one of sent, failed, pending")
+    recipients,next_cursor = await run_blocking(CampaignRecipient.get_recipients_page,session,operation_id,user.id,
+                                                status=status,limit=limit,cursor=cursor)
+    return {"data":recipients,"next_cursor":next_cursor}
 
 
 
 
 @api_router.post("/chat/possible-job-titles")
-async def get_possible_job_titles_(resume: UploadFile = File(None)):
+async def get_possible_job_titles_(resume: UploadFile = File(None),fresh:bool=Form(False)):
     """
     Send internship emails with attachments.
     """
@@ -397,34 +532,17 @@ async def get_possible_job_titles_(resume: UploadFile = File(None)):
     if not resume.filename.lower().endswith('.pdf'):
         raise FileExtensionException(detail="The resume file must be a PDF file.")
 
-    temp_dir = str(Path("./temp"))
-    resume_dir = str(Path("./temp/resume"))
-
-    # Check if resume directory exists within data directory, if not, create it
-    if not os.path.exists(resume_dir):
-        os.makedirs(resume_dir)
-    
-    # Check if temp_dir exists, if not, create it
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
+    # The PDF is parsed straight from the spooled upload, no temporary file is written.
+    # PDF parsing and the LLM call are blocking, run them off the event loop
+    possible_job_titles = await run_blocking(get_possible_job_titles,resume.file,fresh)
 
-    pdf_id = str(uuid.uuid4())
-    resume_pdf = f"{resume_dir}/{pdf_id}.pdf"
-    
-    with open(resume_pdf, "wb") as resume_file:
-        shutil.copyfileobj(resume.file, resume_file)
-    
-    # Await the asynchronous function
-    possible_job_titles = get_possible_job_titles(resume_pdf)
-
-    os.remove(resume_pdf)
     return {"possible_job_titles": possible_job_titles}
 
     
 
 
 @api_router.post("/chat/generated-email-body")
-async def get_email_body_(resume: UploadFile = File(None),language:str=Form("English"),email_subject:str=Form(...)):
+async def get_email_body_(resume: UploadFile = File(None),language:str=Form("English"),email_subject:str=Form(...),fresh:bool=Form(False)):
     """
     Send internship emails with attachments.
     """
@@ -437,27 +555,10 @@ async def get_email_body_(resume: UploadFile = File(None),language:str=Form("Eng
     if not resume.filename.lower().endswith('.pdf'):
         raise FileExtensionException(detail="The resume file must be a PDF file.")
 
-    temp_dir:str = str(Path("./temp"))
-    resume_dir:str = str(Path("./temp/resume"))
-
+    # The PDF is parsed straight from the spooled upload, no temporary file is written.
+    # PDF parsing and the LLM call are blocking, run them off the event loop
+    email_body= await run_blocking(get_email_body,resume.file,email_subject,language,fresh)
 
-    # Check if resume directory exists within data directory, if not, create it
-    if not os.path.exists(resume_dir):
-        os.makedirs(resume_dir)
-    
-    # Check if temp_dir exists, if not, create it
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
-
-    pdf_id:str = str(uuid.uuid4())
-    resume_pdf:str=f"{resume_dir}/{pdf_id}.pdf"
-    with open(resume_pdf, "wb") as resume_file:
-        shutil.copyfileobj(resume.file, resume_file)
-    
-    email_body= get_email_body(resume_pdf,email_subject,language)
-
-    
-    os.remove(resume_pdf)
     return {"email_body": email_body}
 
 
@@ -0,0 +1,84 @@
+import os
+import sys
+import io
+import unittest
+from unittest.mock import patch, MagicMock
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from pathlib import Path
+import chat.main
+from chat.main import (get_pages_contents_from_pdf, resume_text_cache, get_possible_job_titles,
+                       get_email_body, llm_response_cache)
+
+
+class FakeLLM:
+    """
+    Stand-in for the Gemini chat model that counts its calls.
+    """
+
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = 0
+
+    def invoke(self, prompt: str):
+        self.calls += 1
+        return MagicMock(content=self.content)
+
+
+class TestResumeTextCache(unittest.TestCase):
+    def setUp(self):
+        resume_text_cache.memory.clear()
+
+    def test_same_pdf_is_parsed_once(self):
+        pdf_path = str(Path("./tests/resource/test.pdf"))
+        with patch.object(chat.main, "PdfReader", wraps=chat.main.PdfReader) as loader:
+            first = get_pages_contents_from_pdf(pdf_path)
+            second = get_pages_contents_from_pdf(pdf_path)
+        self.assertEqual(first, second)
+        self.assertIn("Hello test pdf", first)
+        loader.assert_called_once()
+        self.assertEqual(resume_text_cache.stats()["memory"]["hits"], 1)
+        self.assertEqual(resume_text_cache.stats()["memory"]["misses"], 1)
+
+    def test_reads_from_a_stream(self):
+        with open(str(Path("./tests/resource/test.pdf")), "rb") as pdf_file:
+            stream = io.BytesIO(pdf_file.read())
+        stream.seek(10)
+        self.assertIn("Hello test pdf", get_pages_contents_from_pdf(stream))
+
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    def setUp(self):
+        llm_response_cache.clear()
+        self.pdf_path = str(Path("./tests/resource/test.pdf"))
+
+    def test_job_titles_are_generated_once(self):
+        fake_llm = FakeLLM("- Software Engineer\n- Data Analyst\n")
+        with patch.object(chat.main, "get_llm", return_value=fake_llm):
+            first = get_possible_job_titles(self.pdf_path)
+            second = get_possible_job_titles(self.pdf_path)
+        self.assertEqual(first, ["Software Engineer", "Data Analyst"])
+        self.assertEqual(first, second)
+        self.assertEqual(fake_llm.calls, 1)
+
+    def test_email_body_key_uses_normalized_inputs(self):
+        fake_llm = FakeLLM("<p>Hello</p>")
+        with patch.object(chat.main, "get_llm", return_value=fake_llm):
+            get_email_body(self.pdf_path, "Stage PFE", "English")
+            get_email_body(self.pdf_path, "  stage   pfe ", "english")
+            self.assertEqual(fake_llm.calls, 1)
+            get_email_body(self.pdf_path, "Stage PFE", "French")
+            self.assertEqual(fake_llm.calls, 2)
+
+    def test_fresh_bypasses_the_cache(self):
+        fake_llm = FakeLLM("<p>Hello</p>")
+        with patch.object(chat.main, "get_llm", return_value=fake_llm):
+            get_email_body(self.pdf_path, "Stage PFE", "English")
+            get_email_body(self.pdf_path, "Stage PFE", "English", fresh=True)
+        self.assertEqual(fake_llm.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
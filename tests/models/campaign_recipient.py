@@ -0,0 +1,92 @@
+import os
+import sys
+import tempfile
+import unittest
+from cryptography.fernet import Fernet
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+os.environ.setdefault("DB_TYPE", "sqlite")
+os.environ.setdefault("DB_FILE_PATH", os.path.join(tempfile.mkdtemp(), "recipients.db"))
+from database import create_tables, SessionLocal
+from models.user import User
+from models.operations import Operations
+from models.campaign_recipient import CampaignRecipient
+
+
+class TestCampaignRecipient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        create_tables()
+        with SessionLocal() as session:
+            for email in ("first@example.com", "second@example.com"):
+                User.create_user(session, "recipients", email, "", "Abcd1234", "1", "",
+                                 Fernet.generate_key().decode(), password_hash="not used")
+            cls.user = User.get_user_by_email(session, "first@example.com")
+            cls.other_user = User.get_user_by_email(session, "second@example.com")
+            Operations.create_operation(session, cls.user.email, "Body", "Campaign", ["a@example.com", "B@example.com"],
+                                        "c@example.com", "pdf", user=cls.user,
+                                        errors={"c@example.com": "550 5.1.1 User unknown"})
+            Operations.create_operation(session, cls.other_user.email, "Body", "Other", "d@example.com", "",
+                                        "pdf", user=cls.other_user)
+            cls.operation_id = session.query(Operations.id).filter_by(user_id=cls.user.id).first()[0]
+
+    def test_receivers_are_not_joined(self):
+        with SessionLocal() as session:
+            operation = Operations.get_operation_by_id(session, self.operation_id, user=self.user)
+            self.assertEqual(operation["recipients"], {"sent": 2, "failed": 1, "pending": 0, "total": 3})
+            self.assertEqual(session.query(Operations.success_receiver, Operations.failed_receiver)
+                             .filter(Operations.id == self.operation_id).one(), (None, None))
+
+    def test_recipients_page(self):
+        with SessionLocal() as session:
+            page, cursor = CampaignRecipient.get_recipients_page(session, self.operation_id, self.user.id, limit=2)
+            self.assertEqual([row["email"] for row in page], ["a@example.com", "b@example.com"])
+            self.assertIsNotNone(cursor)
+            page, cursor = CampaignRecipient.get_recipients_page(session, self.operation_id, self.user.id,
+                                                                 limit=2, cursor=cursor)
+            self.assertEqual([(row["email"], row["error"]) for row in page], [("c@example.com", "550 5.1.1 User unknown")])
+            self.assertIsNone(cursor)
+            page, _ = CampaignRecipient.get_recipients_page(session, self.operation_id, self.user.id,
+                                                            status=CampaignRecipient.FAILED)
+            self.assertEqual([row["email"] for row in page], ["c@example.com"])
+            # Another user's operation has no recipients for this user
+            self.assertEqual(CampaignRecipient.get_recipients_page(session, self.operation_id, self.other_user.id),
+                             ([], None))
+
+    def test_campaign_stats_and_recipients(self):
+        with SessionLocal() as session:
+            self.assertEqual(CampaignRecipient.get_campaign_stats(session, self.operation_id),
+                             {"sent": 2, "failed": 1, "pending": 0, "total": 3})
+            self.assertEqual(CampaignRecipient.get_recipients(session, self.operation_id, CampaignRecipient.FAILED),
+                             [{"email": "c@example.com", "status": "failed", "error": "550 5.1.1 User unknown"}])
+            self.assertEqual(CampaignRecipient.get_campaign_stats(session, "missing"), {"sent": 0, "failed": 0, "pending": 0, "total": 0})
+
+    def test_prior_contact(self):
+        with SessionLocal() as session:
+            self.assertTrue(CampaignRecipient.has_contacted(session, self.user.id, " b@EXAMPLE.com"))
+            # Failed sends and other users' sends do not count
+            self.assertFalse(CampaignRecipient.has_contacted(session, self.user.id, "c@example.com"))
+            self.assertFalse(CampaignRecipient.has_contacted(session, self.user.id, "d@example.com"))
+            self.assertEqual(CampaignRecipient.get_contacted(session, self.user.id,
+                                                             ["A@example.com", "c@example.com", "z@example.com", "a@example.com"]),
+                             {"a@example.com"})
+
+    def test_exclude_contacted(self):
+        with SessionLocal() as session:
+            remaining, skipped = CampaignRecipient.exclude_contacted(
+                session, self.user.id, ["z@example.com", "b@example.com", "c@example.com", "d@example.com", "a@example.com"])
+        self.assertEqual(remaining, ["z@example.com", "c@example.com", "d@example.com"])
+        self.assertEqual(skipped, ["b@example.com", "a@example.com"])
+
+    def test_add_results_in_batches(self):
+        emails = [f"bulk{index}@example.com" for index in range(2500)]
+        with SessionLocal() as session:
+            Operations.create_operation(session, self.user.email, "Body", "Bulk", emails, [], "pdf", user=self.user)
+            self.assertEqual(CampaignRecipient.get_contacted(session, self.user.id, emails), set(emails))
+            self.assertEqual(CampaignRecipient.split_receivers(" A@example.com,,b@example.com "),
+                             ["a@example.com", "b@example.com"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import os
+import sys
+import datetime
+import tempfile
+import unittest
+from contextlib import contextmanager
+from cryptography.fernet import Fernet
+from sqlalchemy import event
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+os.environ.setdefault("DB_TYPE", "sqlite")
+os.environ.setdefault("DB_FILE_PATH", os.path.join(tempfile.mkdtemp(), "operations.db"))
+for name, value in {"ACCESS_TOKEN_EXPIRE_MINUTES": "60", "JWT_SECRET_KEY": "operations-test-secret", "ALGORITHM": "HS256",
+                    "FERNET_KEY": Fernet.generate_key().decode(), "GEMINI_API_KEY": "unused", "MODEL_NAME": "unused"}.items():
+    os.environ.setdefault(name, value)
+from database import create_tables, engine, SessionLocal
+from models.user import User
+from models.operations import Operations, DEFAULT_OPERATION_FIELDS
+
+
+@contextmanager
+def count_queries():
+    """
+    Count the statements sent to the database inside the block.
+    """
+    statements: list = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+class TestOperationsQueries(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        create_tables()
+        with SessionLocal() as session:
+            User.create_user(session, "ops", "ops@example.com", "", "Abcd1234", "1", "",
+                             os.environ["FERNET_KEY"], password_hash="not used")
+            cls.user = User.get_user_by_email(session, "ops@example.com")
+            Operations.create_operation(session, "ops@example.com", "Body", "Subject", "a@example.com", "",
+                                        "pdf", user=cls.user)
+            cls.operation_id = session.query(Operations.id).filter_by(user_id=cls.user.id).first()[0]
+
+    def test_resolved_user_costs_no_query(self):
+        with SessionLocal() as session:
+            with count_queries() as statements:
+                operations = Operations.get_operations_info(session, user=self.user)
+            self.assertEqual(len(statements), 1)
+            self.assertEqual(operations[0]["id"], self.operation_id)
+            with count_queries() as statements:
+                operation = Operations.get_operation_by_id(session, self.operation_id, user=self.user)
+            # The operation, then the counts of its recipients
+            self.assertEqual(len(statements), 2)
+            self.assertEqual(operation["subject"], "Subject")
+            self.assertEqual(operation["recipients"], {"sent": 1, "failed": 0, "pending": 0, "total": 1})
+            self.assertNotIn("success_receiver", operation)
+            with count_queries() as statements:
+                Operations.create_operation(session, "ops@example.com", "Body", "Other", "", "", "pdf", user=self.user)
+            self.assertEqual(len(statements), 1)
+
+    def test_user_id_is_still_checked(self):
+        with SessionLocal() as session:
+            with count_queries() as statements:
+                self.assertEqual(Operations.get_operation_by_id(session, self.operation_id, self.user.id)["id"],
+                                 self.operation_id)
+            self.assertEqual(len(statements), 3)
+            with self.assertRaises(ValueError):
+                Operations.get_operations_info(session, "missing-user")
+
+
+class TestOperationsPagination(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        create_tables()
+        with SessionLocal() as session:
+            User.create_user(session, "pages", "pages@example.com", "", "Abcd1234", "1", "",
+                             os.environ["FERNET_KEY"], password_hash="not used")
+            cls.user = User.get_user_by_email(session, "pages@example.com")
+            for index in range(7):
+                Operations.create_operation(session, "pages@example.com", "Body", f"Subject {index}", "", "", "pdf",
+                                            user=cls.user)
+            cls.expected = [operation_id for (operation_id,) in session.query(Operations.id)
+                            .filter_by(user_id=cls.user.id)
+                            .order_by(Operations.created_at.desc(), Operations.id.desc())]
+
+    def test_pages_cover_the_history_once(self):
+        seen, cursor = [], None
+        with SessionLocal() as session:
+            while True:
+                page, cursor = Operations.get_operations_page(session, user=self.user, limit=3, cursor=cursor)
+                seen.extend(operation["id"] for operation in page)
+                if cursor is None:
+                    break
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(seen[0], self.expected[0])
+
+    def test_fields(self):
+        with SessionLocal() as session:
+            page, _ = Operations.get_operations_page(session, user=self.user, limit=1, fields=("subject", "created_at"))
+            self.assertEqual(list(page[0]), ["subject", "created_at"])
+            self.assertEqual(page[0]["subject"], "Subject 6")
+            with self.assertRaises(ValueError):
+                Operations.get_operations_page(session, user=self.user, fields=("password_hash",))
+            with self.assertRaises(ValueError):
+                Operations.get_operations_page(session, user=self.user, cursor="not a cursor")
+
+    def test_timestamps_are_timezone_aware(self):
+        with SessionLocal() as session:
+            page, _ = Operations.get_operations_page(session, user=self.user, limit=1, fields=("created_at",))
+            user = User.get_user_by_id(session, self.user.id)
+        self.assertTrue(page[0]["created_at"].endswith("+00:00"))
+        self.assertEqual(user.created_at.tzinfo, datetime.timezone.utc)
+
+    def test_date_range(self):
+        with SessionLocal() as session:
+            operations = list(Operations.iter_operations(session, user=self.user, fields=("id", "created_at")))
+            newest = datetime.datetime.fromisoformat(operations[0]["created_at"])
+            oldest = datetime.datetime.fromisoformat(operations[-1]["created_at"])
+            page, _ = Operations.get_operations_page(session, user=self.user, since=oldest, until=newest)
+            self.assertEqual([operation["id"] for operation in page],
+                             [operation["id"] for operation in operations if operation["created_at"] != operations[0]["created_at"]])
+            page, _ = Operations.get_operations_page(session, user=self.user, since=newest + datetime.timedelta(seconds=1))
+            self.assertEqual(page, [])
+
+    @unittest.skipUnless(engine.dialect.name == "sqlite", "EXPLAIN QUERY PLAN is SQLite syntax")
+    def test_history_queries_use_the_index(self):
+        columns = Operations._select_fields(DEFAULT_OPERATION_FIELDS)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with SessionLocal() as session:
+            for query in (Operations._page_query(session, self.user.id, columns, 50),
+                          Operations._page_query(session, self.user.id, columns, 50, after=(now, "id")),
+                          Operations._page_query(session, self.user.id, columns, 50, since=now - datetime.timedelta(days=1), until=now)):
+                statement = query.statement.compile(dialect=engine.dialect)
+                plan = session.connection().exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", tuple(statement.params[name] for name in statement.positiontup)).all()
+                details = " ".join(row[-1] for row in plan)
+                self.assertIn("USING INDEX ix_operations_user_created", details)
+                self.assertNotIn("TEMP B-TREE", details)
+
+    def test_iter_operations_in_batches(self):
+        with SessionLocal() as session:
+            with count_queries() as statements:
+                operations = list(Operations.iter_operations(session, user=self.user, fields=("id",), batch_size=2))
+        self.assertEqual([operation["id"] for operation in operations], self.expected)
+        self.assertEqual(len(statements), 4)
+
+
+class TestOperationsEndpointsQueries(unittest.TestCase):
+    """
+    Pins the number of database round trips of the operations endpoints.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        from fastapi.testclient import TestClient
+        from src.main import app, ACCESS_TOKEN_EXPIRE_MINUTES, JWT_SECRET_KEY, ALGORITHM
+        from src.auth import main as auth
+        from utils.jwt import create_access_token
+        create_tables()
+        with SessionLocal() as session:
+            if not User.email_exists(session, "endpoint@example.com"):
+                User.create_user(session, "endpoint", "endpoint@example.com", "", "Abcd1234", "1", "",
+                                 os.environ["FERNET_KEY"], password_hash="not used")
+            cls.user_id = User.get_user_by_email(session, "endpoint@example.com").id
+        cls.user_cache = auth.user_cache
+        cls.client = TestClient(app)
+        cls.token = create_access_token(cls.user_id, ACCESS_TOKEN_EXPIRE_MINUTES, JWT_SECRET_KEY, ALGORITHM)
+
+    def setUp(self):
+        self.user_cache.clear()
+
+    def request(self, method, url, **kwargs):
+        with count_queries() as statements:
+            response = self.client.request(method, url, **kwargs)
+        self.assertEqual(response.status_code, 200, response.text)
+        return response, len(statements)
+
+    def test_round_trips(self):
+        form = {"email_body": "Body", "subject": "Subject", "success_receiver": "a@example.com",
+                "failed_receiver": "b@example.com", "pdf_id": "pdf", "access_token": self.token}
+        # The first request loads the user, the next ones find it in the authentication cache.
+        # Creating an operation inserts it, then its recipients in one batch.
+        _, queries = self.request("POST", "/api/operations/", data=form)
+        self.assertEqual(queries, 3)
+        _, queries = self.request("POST", "/api/operations/", data=form)
+        self.assertEqual(queries, 2)
+        response, queries = self.request("GET", f"/api/operations/{self.token}/")
+        self.assertEqual(queries, 1)
+        operation_id = response.json()["data"][0]["id"]
+        _, queries = self.request("GET", f"/api/operations/{self.token}/{operation_id}/")
+        self.assertEqual(queries, 2)
+        response, queries = self.request("GET", f"/api/operations/{self.token}/{operation_id}/recipients/")
+        self.assertEqual(queries, 1)
+        self.assertEqual([(row["email"], row["status"]) for row in response.json()["data"]],
+                         [("a@example.com", "sent"), ("b@example.com", "failed")])
+
+    def test_pagination_and_export(self):
+        form = {"email_body": "Body", "subject": "Subject", "success_receiver": "a@example.com",
+                "failed_receiver": "b@example.com", "pdf_id": "pdf", "access_token": self.token}
+        for _ in range(3):
+            self.request("POST", "/api/operations/", data=form)
+        response, _ = self.request("GET", f"/api/operations/{self.token}/", params={"limit": 2, "fields": "id,subject"})
+        first_page = response.json()
+        self.assertEqual(len(first_page["data"]), 2)
+        self.assertEqual(list(first_page["data"][0]), ["id", "subject"])
+        self.assertIsNotNone(first_page["next_cursor"])
+        response, _ = self.request("GET", f"/api/operations/{self.token}/",
+                                   params={"limit": 2, "cursor": first_page["next_cursor"]})
+        self.assertNotIn(response.json()["data"][0]["id"], [operation["id"] for operation in first_page["data"]])
+        self.assertEqual(self.client.get(f"/api/operations/{self.token}/", params={"fields": "password_hash"}).status_code, 400)
+        self.assertEqual(self.client.get(f"/api/operations/{self.token}/", params={"cursor": "garbage"}).status_code, 400)
+        response, _ = self.request("GET", f"/api/operations/{self.token}/export/", params={"fields": "id,created_at"})
+        exported = response.json()["data"]
+        self.assertGreaterEqual(len(exported), 3)
+        self.assertEqual(exported[0]["id"], first_page["data"][0]["id"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import base64
+import socketserver
+import threading
+import time
+from typing import Callable, Union
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Local SMTP server for tests and benchmarks.
+
+    Speaks enough ESMTP for smtplib (EHLO, AUTH PLAIN, MAIL, RCPT, DATA, RSET, NOOP, QUIT),
+    accepts any credentials and keeps every received message in memory. STARTTLS is not
+    supported, so clients must connect with `starttls=False`.
+
+    Parameters:
+        latency (float, optional): Seconds to wait before answering each command, to simulate a round trip.
+        rcpt_reply (Callable, optional): Called with each recipient; return a reply line such as
+            "550 5.1.1 User unknown" to reject it, or None to accept it.
+        disconnect_after (int, optional): Drop the connection after this many messages.
+        password (str, optional): Only accept logins with this password. Default accepts any credentials.
+
+    Example:
+        >>> with FakeSMTPServer() as server:
+        ...     SMTPSession("me@example.com", "secret", port=server.port, starttls=False).sendmail("to@example.com", "Hi")
+        ...     len(server.messages)
+        1
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 rcpt_reply: Callable[[str], Union[str, None]] = None, disconnect_after: int = None,
+                 password: str = None):
+        super().__init__((host, port), _SMTPHandler)
+        self.latency = latency
+        self.rcpt_reply = rcpt_reply
+        self.disconnect_after = disconnect_after
+        self.password = password
+        self.messages: list = []
+        self.connections: int = 0
+        self.active_connections: int = 0
+        self.max_active_connections: int = 0
+        self.logins: int = 0
+        self.quits: int = 0
+        self.lock = threading.Lock()
+        self._thread: Union[threading.Thread, None] = None
+
+    @property
+    def host(self) -> str:
+        return self.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    @property
+    def recipients(self) -> list:
+        """
+        Recipients of every received message, in reception order.
+        """
+        with self.lock:
+            return [rcpt for _, rcpt_tos, _ in self.messages for rcpt in rcpt_tos]
+
+    def start(self) -> "FakeSMTPServer":
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeSMTPServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line: str) -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        with self.server.lock:
+            self.server.connections += 1
+            self.server.active_connections += 1
+            self.server.max_active_connections = max(self.server.max_active_connections,
+                                                     self.server.active_connections)
+        self.counted = True
+        try:
+            self.converse()
+        except ConnectionResetError:
+            # The client died, e.g. a worker killed mid-campaign
+            pass
+        finally:
+            self.release()
+
+    def release(self) -> None:
+        with self.server.lock:
+            if self.counted:
+                self.server.active_connections -= 1
+                self.counted = False
+
+    def converse(self) -> None:
+        sent = 0
+        mail_from, rcpt_tos = None, []
+        self.reply("220 fake ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.wfile.write(b"250-fake\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+            elif verb == "HELO":
+                self.reply("250 fake")
+            elif verb == "AUTH":
+                with self.server.lock:
+                    self.server.logins += 1
+                credentials = base64.b64decode(command.split(" ")[-1]).split(b"\0")
+                if self.server.password is not None and credentials[-1].decode() != self.server.password:
+                    self.reply("535 5.7.8 Authentication credentials invalid")
+                else:
+                    self.reply("235 2.7.0 Authentication successful")
+            elif verb == "MAIL":
+                mail_from, rcpt_tos = command[10:].strip("<> "), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                rcpt = command[8:].strip("<> ")
+                rejection = self.server.rcpt_reply(rcpt) if self.server.rcpt_reply else None
+                if rejection:
+                    self.reply(rejection)
+                else:
+                    rcpt_tos.append(rcpt)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    data.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                with self.server.lock:
+                    self.server.messages.append((mail_from, rcpt_tos, b"".join(data)))
+                self.reply("250 OK queued")
+                sent += 1
+                if self.server.disconnect_after and sent >= self.server.disconnect_after:
+                    return
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                with self.server.lock:
+                    self.server.quits += 1
+                # The client may open its next connection as soon as it reads the reply
+                self.release()
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
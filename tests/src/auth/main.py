@@ -0,0 +1,84 @@
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+from cryptography.fernet import Fernet
+from fastapi import HTTPException
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+os.environ.setdefault("DB_TYPE", "sqlite")
+os.environ.setdefault("DB_FILE_PATH", os.path.join(tempfile.mkdtemp(), "auth.db"))
+from database import create_tables, SessionLocal
+from models.user import User
+from utils.jwt import create_access_token
+from src.auth import main as auth
+from src.auth.main import authenticate, get_token_user_id, invalidate_user
+
+SECRET = "auth-test-secret"
+
+
+class TestAuthenticate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        create_tables()
+        cls.key = Fernet.generate_key().decode()
+        with SessionLocal() as session:
+            User.create_user(session, "auth", "auth@example.com", "", "Abcd1234", "1", "abcd efgh ijkl mnop", cls.key,
+                             password_hash="not used")
+            cls.user_id = User.get_user_by_email(session, "auth@example.com").id
+
+    def setUp(self):
+        auth.token_cache.clear()
+        auth.user_cache.clear()
+        patcher = patch.multiple(auth, JWT_SECRET_KEY=SECRET, ALGORITHM="HS256")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.token = create_access_token(self.user_id, 5, SECRET, "HS256")
+
+    def authenticate(self, token):
+        with SessionLocal() as session:
+            return asyncio.run(authenticate(token, session))
+
+    def test_token_is_decoded_once(self):
+        with patch("src.auth.main.decode_access_token", wraps=auth.decode_access_token) as decode:
+            self.assertEqual(get_token_user_id(self.token), self.user_id)
+            self.assertEqual(get_token_user_id(self.token), self.user_id)
+        decode.assert_called_once()
+
+    def test_invalid_and_expired_tokens(self):
+        self.assertIsNone(get_token_user_id(None))
+        self.assertIsNone(get_token_user_id("garbage"))
+        self.assertIsNone(get_token_user_id(create_access_token(self.user_id, 5, "other secret", "HS256")))
+        self.assertIsNone(get_token_user_id(create_access_token(self.user_id, -1, SECRET, "HS256")))
+        self.assertEqual(len(auth.token_cache), 0)
+
+    def test_user_is_loaded_once(self):
+        with patch("src.auth.main.User.get_user_by_id", wraps=User.get_user_by_id) as get_user:
+            first = self.authenticate(self.token)
+            second = self.authenticate(self.token)
+        get_user.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertEqual(first.email, "auth@example.com")
+        self.assertEqual(first.get_email_password(self.key), "abcd efgh ijkl mnop")
+
+    def test_invalidate_user(self):
+        self.authenticate(self.token)
+        invalidate_user(self.user_id)
+        with patch("src.auth.main.User.get_user_by_id", wraps=User.get_user_by_id) as get_user:
+            self.authenticate(self.token)
+        get_user.assert_called_once()
+
+    def test_unknown_user_is_rejected(self):
+        token = create_access_token("missing-user", 5, SECRET, "HS256")
+        with self.assertRaises(HTTPException) as context:
+            self.authenticate(token)
+        self.assertEqual(context.exception.status_code, 401)
+        with self.assertRaises(HTTPException):
+            self.authenticate("garbage")
+
+
+if __name__ == '__main__':
+    unittest.main()
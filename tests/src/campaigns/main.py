@@ -0,0 +1,293 @@
+import os
+import sys
+import time
+import email
+import datetime
+import tempfile
+import threading
+import unittest
+import multiprocessing
+from collections import defaultdict
+from cryptography.fernet import Fernet
+from sqlalchemy import update
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+os.environ.setdefault("DB_TYPE", "sqlite")
+os.environ.setdefault("DB_FILE_PATH", os.path.join(tempfile.mkdtemp(), "campaigns.db"))
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+from database import create_tables, engine, SessionLocal
+from models.user import User
+from models.operations import Operations
+from models.campaign_recipient import CampaignRecipient
+from src.campaigns import main as campaigns
+from src.campaigns.main import start_campaign, run_campaign, resume_campaigns, campaign_message_id
+from src.emails.main import SendRateLimiter, SMTPSession
+from src.emails.templates import recipient_values
+from src.jobs.main import JobQueue
+from tests.resource.smtp_server import FakeSMTPServer
+
+ATTACHMENT_PATH = os.path.join(parent_dir, "tests", "resource", "test.pdf")
+
+
+def send_until_killed(operation_id: str, smtp_settings: dict) -> None:
+    # Runs in the forked worker: its connections must not be shared with the parent
+    engine.dispose(close=False)
+    run_campaign(operation_id, "secret", ATTACHMENT_PATH, runner_id="killed-worker", lease_seconds=0.6,
+                 checkpoint_size=5, smtp_settings=smtp_settings, send_limiter=SendRateLimiter(0, 0))
+
+
+class TestResumableCampaigns(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        create_tables()
+        with SessionLocal() as session:
+            User.create_user(session, "campaigns", "sender@example.com", "", "Abcd1234", "1", "secret",
+                             os.environ["FERNET_KEY"], password_hash="not used")
+            cls.user = User.get_user_by_email(session, "sender@example.com")
+
+    def setUp(self):
+        self.emails_list = [f"email{index}@example.com" for index in range(60)]
+        self.queue = JobQueue(max_workers=1)
+
+    def tearDown(self):
+        self.queue.shutdown()
+
+    def start(self) -> str:
+        with SessionLocal() as session:
+            return start_campaign(session, self.user, self.user.email, "Subject", "<p>Body</p>", "pdf", "resume.pdf",
+                                  self.emails_list)
+
+    def recipients(self, operation_id: str) -> dict:
+        with SessionLocal() as session:
+            return {row["email"]: row["status"] for row in CampaignRecipient.get_recipients(session, operation_id)}
+
+    def test_campaign_is_saved_before_sending(self):
+        operation_id = self.start()
+        with SessionLocal() as session:
+            self.assertEqual(CampaignRecipient.get_campaign_stats(session, operation_id),
+                             {"sent": 0, "failed": 0, "pending": 60, "total": 60})
+            self.assertEqual([row["id"] for row in Operations.get_unfinished(session)].count(operation_id), 1)
+            # The lease is taken by the first runner, another one cannot take it while it runs
+            self.assertTrue(Operations.claim(session, operation_id, "killed-worker", 60))
+            self.assertFalse(Operations.claim(session, operation_id, "other-worker", 60))
+            self.assertFalse(Operations.finish_operation(session, operation_id, "other-worker"))
+            self.assertTrue(Operations.finish_operation(session, operation_id, "killed-worker"))
+
+    def test_killed_worker_is_resumed_exactly_once(self):
+        operation_id = self.start()
+        with FakeSMTPServer(latency=0.002) as server:
+            smtp_settings = {"host": server.host, "port": server.port, "starttls": False}
+            worker = multiprocessing.get_context("fork").Process(target=send_until_killed,
+                                                                 args=(operation_id, smtp_settings))
+            worker.start()
+            deadline = time.monotonic() + 10
+            while len(server.messages) < 23 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            worker.kill()
+            worker.join()
+            received_before_kill = len(server.messages)
+            checkpointed = {address for address, status in self.recipients(operation_id).items()
+                            if status == CampaignRecipient.SENT}
+            self.assertGreater(len(checkpointed), 0)
+            self.assertLess(received_before_kill, len(self.emails_list))
+
+            # The lease of the killed worker still runs: the campaign is not taken yet
+            self.assertEqual(resume_campaigns(self.queue, lambda pdf_id: ATTACHMENT_PATH, runner_id="restarted",
+                                              retry=False), [])
+            time.sleep(0.7)
+            resumed = resume_campaigns(self.queue, lambda pdf_id: ATTACHMENT_PATH, runner_id="restarted",
+                                       retry=False, smtp_settings=smtp_settings, send_limiter=SendRateLimiter(0, 0))
+            self.assertEqual(resumed, [operation_id])
+            self.queue.shutdown()
+            self.assertEqual(self.queue.get(operation_id).status, "done")
+
+        message_ids = defaultdict(list)
+        for _, rcpt_tos, data in server.messages:
+            message_ids[rcpt_tos[0]].append(email.message_from_bytes(data)["Message-ID"])
+        # Every recipient got the campaign, checkpointed ones were not sent again
+        self.assertEqual(set(message_ids), set(self.emails_list))
+        for address in checkpointed:
+            self.assertEqual(len(message_ids[address]), 1, address)
+        # Recipients sent after the last checkpoint are sent again with the same Message-ID
+        for address, ids in message_ids.items():
+            self.assertEqual(set(ids), {campaign_message_id(operation_id, address, self.user.email)})
+        self.assertLessEqual(len(server.messages) - len(self.emails_list), 5 + 1)
+
+        with SessionLocal() as session:
+            operation = Operations.get_operation_by_id(session, operation_id, user=self.user)
+            self.assertEqual(CampaignRecipient.get_campaign_stats(session, operation_id)["sent"], 60)
+            self.assertNotIn(operation_id, [row["id"] for row in Operations.get_unfinished(session)])
+        self.assertEqual(operation["recipients"], {"sent": 60, "failed": 0, "pending": 0, "total": 60})
+        self.assertEqual(list(self.recipients(operation_id)), self.emails_list)
+
+    def test_finished_campaign_is_not_sent_again(self):
+        operation_id = self.start()
+        with FakeSMTPServer() as server:
+            smtp_settings = {"host": server.host, "port": server.port, "starttls": False}
+            for _ in range(2):
+                self.assertEqual(run_campaign(operation_id, "secret", ATTACHMENT_PATH, runner_id="killed-worker",
+                                              smtp_settings=smtp_settings, send_limiter=SendRateLimiter(0, 0)),
+                                 {"saved": True})
+        self.assertEqual(len(server.messages), 60)
+        self.assertEqual(set(self.recipients(operation_id).values()), {CampaignRecipient.SENT})
+
+    def test_personalized_bodies_are_rendered_from_the_saved_values(self):
+        emails_list = self.emails_list[:3]
+        template_values = {address: recipient_values(f"Contact {index}", "A & B", None,
+                                                     self.user.email, "0600", "Me", "linkedin.com/in/me")
+                           for index, address in enumerate(emails_list[1:], start=1)}
+        with SessionLocal() as session:
+            operation_id = start_campaign(session, self.user, self.user.email, "Subject",
+                                          "<p>{EntrepriseContactName} {EntrepriseName} {EntrepriseSecteurActivite}</p>",
+                                          "pdf", "resume.pdf", emails_list, template_values=template_values)
+        with FakeSMTPServer() as server:
+            smtp_settings = {"host": server.host, "port": server.port, "starttls": False}
+            run_campaign(operation_id, "secret", ATTACHMENT_PATH, runner_id="killed-worker",
+                         smtp_settings=smtp_settings, send_limiter=SendRateLimiter(0, 0))
+        bodies = {rcpt_tos[0]: email.message_from_bytes(data).get_payload()[0].get_payload(decode=True).decode()
+                  for _, rcpt_tos, data in server.messages}
+        self.assertEqual(bodies, {
+            # Saved without values: the body is sent as it is
+            emails_list[0]: "<p>{EntrepriseContactName} {EntrepriseName} {EntrepriseSecteurActivite}</p>",
+            emails_list[1]: "<p>Contact 1 A &amp; B DEVELOPMENT INFORMATIQUE</p>",
+            emails_list[2]: "<p>Contact 2 A &amp; B DEVELOPMENT INFORMATIQUE</p>",
+        })
+
+    def test_runner_without_the_lease_sends_nothing(self):
+        operation_id = self.start()
+        with SessionLocal() as session:
+            self.assertTrue(Operations.claim(session, operation_id, "other-worker", 60))
+        with FakeSMTPServer() as server:
+            smtp_settings = {"host": server.host, "port": server.port, "starttls": False}
+            self.assertEqual(run_campaign(operation_id, "secret", ATTACHMENT_PATH, runner_id="killed-worker",
+                                          smtp_settings=smtp_settings, send_limiter=SendRateLimiter(0, 0)),
+                             {"saved": False})
+        self.assertEqual(server.messages, [])
+        self.assertEqual(set(self.recipients(operation_id).values()), {CampaignRecipient.PENDING})
+
+    def test_request_session_is_closed_when_nothing_is_sent(self):
+        operation_id = self.start()
+        with SessionLocal() as session:
+            self.assertTrue(Operations.claim(session, operation_id, "other-worker", 60))
+        with FakeSMTPServer() as server:
+            smtp_session = SMTPSession(self.user.email, "secret", host=server.host, port=server.port, starttls=False)
+            smtp_session.connect()
+            self.assertEqual(run_campaign(operation_id, "secret", ATTACHMENT_PATH, runner_id="killed-worker",
+                                          smtp_session=smtp_session, send_limiter=SendRateLimiter(0, 0)),
+                             {"saved": False})
+            self.assertIsNone(smtp_session.server)
+            deadline = time.monotonic() + 5
+            while server.quits < 1 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            self.assertEqual(server.quits, 1)
+        self.assertEqual(server.messages, [])
+
+    def test_sending_stops_when_the_lease_is_lost(self):
+        operation_id = self.start()
+
+        def take_lease():
+            # Another process takes the campaign, as if the lease had expired
+            with SessionLocal() as session:
+                session.execute(update(Operations).where(Operations.id == operation_id)
+                                .values(runner_id="other-worker", lease_expires_at=datetime.datetime.now(
+                                    datetime.timezone.utc) + datetime.timedelta(seconds=60)))
+                session.commit()
+
+        with FakeSMTPServer(latency=0.01) as server:
+            smtp_settings = {"host": server.host, "port": server.port, "starttls": False}
+            threading.Timer(0.1, take_lease).start()
+            result = run_campaign(operation_id, "secret", ATTACHMENT_PATH, runner_id="killed-worker",
+                                  lease_seconds=0.15, checkpoint_size=1, smtp_settings=smtp_settings,
+                                  send_limiter=SendRateLimiter(0, 0))
+        self.assertEqual(result, {"saved": False})
+        statuses = self.recipients(operation_id)
+        sent = [address for address, status in statuses.items() if status == CampaignRecipient.SENT]
+        self.assertGreater(len(sent), 0)
+        self.assertEqual(len(server.messages), len(sent))
+        self.assertIn(CampaignRecipient.PENDING, statuses.values())
+        with SessionLocal() as session:
+            self.assertIn(operation_id, [row["id"] for row in Operations.get_unfinished(session)])
+
+    def test_failed_run_stops_every_connection_and_gives_the_lease_back(self):
+        operation_id = self.start()
+        reported = []
+
+        def report(address, is_sent):
+            reported.append(address)
+            if len(reported) == 5:
+                raise RuntimeError("report failed")
+
+        with FakeSMTPServer(latency=0.002) as server:
+            smtp_settings = {"host": server.host, "port": server.port, "starttls": False}
+            with self.assertRaises(RuntimeError):
+                run_campaign(operation_id, "secret", ATTACHMENT_PATH, report=report, runner_id="killed-worker",
+                             connections=3, checkpoint_size=1, smtp_settings=smtp_settings,
+                             send_limiter=SendRateLimiter(0, 0))
+            # The other connections stopped with the one that failed
+            self.assertLess(len(server.messages), 10)
+            with SessionLocal() as session:
+                self.assertIsNone(session.query(Operations.runner_id).filter(Operations.id == operation_id).scalar())
+            # Taken again at once instead of when the lease expires
+            resumed = resume_campaigns(self.queue, lambda pdf_id: ATTACHMENT_PATH, runner_id="restarted",
+                                       retry=False, smtp_settings=smtp_settings, send_limiter=SendRateLimiter(0, 0))
+            self.assertIn(operation_id, resumed)
+            self.queue.shutdown()
+        self.assertEqual(self.queue.get(operation_id).status, "done")
+        self.assertEqual(set(self.recipients(operation_id).values()), {CampaignRecipient.SENT})
+
+    def test_long_pause_frees_the_worker_and_the_lease(self):
+        operation_id = self.start()
+        send_limiter = SendRateLimiter(0, 0, backoff_base=1, backoff_max=1)
+        send_limiter.throttled(self.user.email, 421)
+        other_ran = threading.Event()
+        with FakeSMTPServer() as server:
+            smtp_settings = {"host": server.host, "port": server.port, "starttls": False}
+            job = self.queue.enqueue(
+                lambda report: run_campaign(operation_id, "secret", ATTACHMENT_PATH, report=report,
+                                            on_pause=report.pause, on_defer=report.defer, max_pause=0.1,
+                                            runner_id="killed-worker", smtp_settings=smtp_settings,
+                                            send_limiter=send_limiter),
+                total=len(self.emails_list), job_id=operation_id)
+            # The only worker runs another job while the sender is paused
+            self.queue.enqueue(lambda report: other_ran.set(), total=0)
+            self.assertTrue(other_ran.wait(5))
+            self.assertEqual(job.status, "paused")
+            with SessionLocal() as session:
+                runner_id, lease_expires_at = (session.query(Operations.runner_id, Operations.lease_expires_at)
+                                               .filter(Operations.id == operation_id).one())
+                self.assertIsNone(runner_id)
+                self.assertGreater(lease_expires_at, datetime.datetime.now(datetime.timezone.utc))
+                # No other runner takes it before the pause ends
+                self.assertFalse(Operations.claim(session, operation_id, "other-worker", 60))
+            deadline = time.monotonic() + 10
+            while job.status != "done" and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(job.result, {"saved": True})
+        self.assertEqual(len(server.messages), len(self.emails_list))
+        self.assertEqual(set(self.recipients(operation_id).values()), {CampaignRecipient.SENT})
+
+    def test_queued_campaign_is_not_enqueued_again(self):
+        operation_id = self.start()
+        release = threading.Event()
+        # Keep the only worker busy, the campaign waits in the queue
+        self.queue.enqueue(lambda report: release.wait(), total=0)
+        resumed = resume_campaigns(self.queue, lambda pdf_id: ATTACHMENT_PATH, runner_id="restarted", retry=False)
+        self.assertIn(operation_id, resumed)
+        self.assertNotIn(operation_id, resume_campaigns(self.queue, lambda pdf_id: ATTACHMENT_PATH,
+                                                        runner_id="restarted", retry=False))
+        with SessionLocal() as session:
+            Operations.finish_operation(session, operation_id)
+        release.set()
+
+    def test_forked_workers_get_their_own_runner_id(self):
+        reader, writer = multiprocessing.get_context("fork").Pipe()
+        worker = multiprocessing.get_context("fork").Process(target=lambda: writer.send(campaigns.RUNNER_ID))
+        worker.start()
+        runner_id = reader.recv()
+        worker.join()
+        self.assertNotEqual(runner_id, campaigns.RUNNER_ID)
+
+
+if __name__ == '__main__':
+    unittest.main()
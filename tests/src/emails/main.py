@@ -1,4 +1,6 @@
 import unittest
+import threading
+import email
 from unittest.mock import patch, MagicMock
 import os
 import sys
@@ -7,6 +9,7 @@ from pathlib import Path
 parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
 sys.path.append(parent_dir)
 from src.emails.main import *
+from tests.resource.smtp_server import FakeSMTPServer
 
 # Load variables from the specified .env file
 load_dotenv(dotenv_path=str(Path("./env/tests.env")))
@@ -56,6 +59,26 @@ class TestEmailFunctions(unittest.TestCase):
             result = send_email_smtp(sender_email, sender_password, receive_email, "Subject", "Hello *Body*")
             self.assertEqual(result, expected_result)
 
+    def test_smtp_session_reuses_connection(self):
+        with patch('smtplib.SMTP') as mock_smtp:
+            instance = mock_smtp.return_value
+            with SMTPSession(sender_email, sender_password) as smtp_session:
+                for _ in range(3):
+                    self.assertTrue(send_email_smtp(sender_email, sender_password, receive_email, "Subject", "Body", smtp_session=smtp_session))
+            mock_smtp.assert_called_once()
+            instance.login.assert_called_once()
+            self.assertEqual(instance.sendmail.call_count, 3)
+            instance.quit.assert_called_once()
+
+    def test_smtp_session_reconnects_when_dropped(self):
+        with patch('smtplib.SMTP') as mock_smtp:
+            instance = mock_smtp.return_value
+            instance.sendmail.side_effect = [smtplib.SMTPServerDisconnected("dropped"), None]
+            with SMTPSession(sender_email, sender_password) as smtp_session:
+                self.assertTrue(send_email_smtp(sender_email, sender_password, receive_email, "Subject", "Body", smtp_session=smtp_session))
+            self.assertEqual(mock_smtp.call_count, 2)
+            self.assertEqual(smtp_session.connections, 2)
+
     def test_message_from_html(self):
         expected_html_message = """<!DOCTYPE html>
 <html lang="en">
@@ -83,6 +106,7 @@ class TestEmailFunctions(unittest.TestCase):
 
     @patch('smtplib.SMTP')
     def test_check_gmail_connection(self, mock_smtp):
+        credential_cache.invalidate(sender_email, sender_password)
         instance = mock_smtp.return_value
         instance.starttls.return_value = None
         instance.login.return_value = None
@@ -91,10 +115,312 @@ class TestEmailFunctions(unittest.TestCase):
         instance.starttls.assert_called_once()
         instance.login.assert_called_once_with(sender_email, sender_password)
         instance.quit.assert_called_once()
+        instance.login.side_effect = smtplib.SMTPAuthenticationError(535, b"5.7.8 Bad credentials")
+        self.assertFalse(check_gmail_connection(sender_email, "wrong"))
     
     def test_is_valid_email(self):
         self.assertTrue(is_valid_email(sender_email))
         self.assertFalse(is_valid_email("test.example.com"))
 
+class TestSendCampaign(unittest.TestCase):
+    def setUp(self):
+        self.emails_list = [f"email{i}@example.com" for i in range(20)]
+
+    def send(self, server, **kwargs):
+        kwargs.setdefault("send_limiter", SendRateLimiter(per_minute=0, per_day=0))
+        return send_campaign("me@example.com", "secret", self.emails_list, "Subject", "Body",
+                             smtp_settings={"host": server.host, "port": server.port, "starttls": False}, **kwargs)
+
+    def test_one_connection_for_the_whole_campaign(self):
+        with FakeSMTPServer() as server:
+            success_receiver, failed_receiver = self.send(server)
+        self.assertEqual(success_receiver, self.emails_list)
+        self.assertEqual(failed_receiver, [])
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(server.logins, 1)
+
+    def test_parallel_connections_keep_recipient_order(self):
+        with FakeSMTPServer(latency=0.002, rcpt_reply=lambda rcpt: "550 5.1.1 User unknown" if rcpt.startswith("email1") else None) as server:
+            success_receiver, failed_receiver = self.send(server, connections=3, limiter=ConnectionLimiter(10, 3))
+        self.assertEqual(server.connections, 3)
+        self.assertEqual(failed_receiver, [email for email in self.emails_list if email.startswith("email1")])
+        self.assertEqual(success_receiver, [email for email in self.emails_list if not email.startswith("email1")])
+        self.assertCountEqual(server.recipients, success_receiver)
+
+    def test_connection_caps(self):
+        with FakeSMTPServer(latency=0.002) as server:
+            self.send(server, connections=8, limiter=ConnectionLimiter(10, 2))
+        self.assertLessEqual(server.max_active_connections, 2)
+        with FakeSMTPServer(latency=0.002) as server:
+            limiter = ConnectionLimiter(2, 5)
+            threads = [threading.Thread(target=self.send, args=(server,), kwargs={"connections": 5, "limiter": limiter}) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertLessEqual(server.max_active_connections, 2)
+        self.assertEqual(len(server.messages), 2 * len(self.emails_list))
+
+    def test_attachment_is_encoded_once(self):
+        attachment_path = str(Path("./tests/resource/test.pdf"))
+        with FakeSMTPServer() as server, patch('src.emails.main.encoders.encode_base64', wraps=encoders.encode_base64) as encode:
+            success_receiver, _ = send_campaign("me@example.com", "secret", self.emails_list, "Subject", "Body",
+                                                attachment_path, "resume.pdf",
+                                                smtp_settings={"host": server.host, "port": server.port, "starttls": False})
+        self.assertEqual(success_receiver, self.emails_list)
+        encode.assert_called_once()
+        with open(attachment_path, "rb") as attachment:
+            expected_attachment = attachment.read()
+        for _, rcpt_tos, data in server.messages:
+            message = email.message_from_bytes(data)
+            self.assertEqual(message['To'], rcpt_tos[0])
+            self.assertEqual(message.get_payload()[1].get_filename(), "resume.pdf")
+            self.assertEqual(message.get_payload()[1].get_payload(decode=True), expected_attachment)
+
+    def test_personalized_bodies_share_the_attachment(self):
+        attachment_path = str(Path("./tests/resource/test.pdf"))
+        with FakeSMTPServer() as server, patch('src.emails.main.encoders.encode_base64', wraps=encoders.encode_base64) as encode:
+            success_receiver, _ = send_campaign("me@example.com", "secret", self.emails_list, "Subject", "Body",
+                                                attachment_path, "resume.pdf",
+                                                smtp_settings={"host": server.host, "port": server.port, "starttls": False},
+                                                send_limiter=SendRateLimiter(per_minute=0, per_day=0),
+                                                render_body=lambda to: None if to == "email0@example.com" else f"<p>Bonjour {to} é</p>")
+        self.assertEqual(success_receiver, self.emails_list)
+        encode.assert_called_once()
+        with open(attachment_path, "rb") as attachment:
+            expected_attachment = attachment.read()
+        for _, rcpt_tos, data in server.messages:
+            body, attachment = email.message_from_bytes(data).get_payload()
+            expected_body = "Body" if rcpt_tos[0] == "email0@example.com" else f"<p>Bonjour {rcpt_tos[0]} é</p>"
+            self.assertEqual(body.get_payload(decode=True).decode(body.get_content_charset()), expected_body)
+            self.assertEqual(attachment.get_payload(decode=True), expected_attachment)
+
+    def test_reconnects_when_server_drops_the_connection(self):
+        with FakeSMTPServer(disconnect_after=5) as server:
+            success_receiver, failed_receiver = self.send(server)
+        self.assertEqual(success_receiver, self.emails_list)
+        self.assertEqual(server.connections, 4)
+
+    def test_pauses_and_resumes_when_throttled(self):
+        replies = iter(["421 4.7.0 Try again later", "421 4.7.0 Try again later"])
+
+        def rcpt_reply(rcpt):
+            if rcpt == "email3@example.com":
+                return "550 5.1.1 User unknown"
+            return next(replies, None) if rcpt == "email5@example.com" else None
+
+        pauses = []
+        send_limiter = SendRateLimiter(per_minute=0, per_day=0, backoff_base=0.01, backoff_max=0.02)
+        with FakeSMTPServer(rcpt_reply=rcpt_reply) as server:
+            success_receiver, failed_receiver = self.send(server, send_limiter=send_limiter, on_pause=pauses.append)
+        # The throttled recipient is sent again, only the unknown one fails
+        self.assertEqual(failed_receiver, ["email3@example.com"])
+        self.assertEqual(len(success_receiver), 19)
+        self.assertEqual(send_limiter.stats()["throttled_421"], 2)
+        self.assertIsInstance(pauses[0], datetime.datetime)
+        self.assertIsNone(pauses[-1])
+
+    def test_stops_when_the_daily_budget_is_spent(self):
+        reported = []
+        with FakeSMTPServer() as server:
+            with self.assertRaises(SenderPaused) as raised:
+                self.send(server, connections=3, send_limiter=SendRateLimiter(per_minute=0, per_day=5),
+                          report=lambda email, is_sent: reported.append(email), max_pause=60)
+        # Every connection stopped instead of waiting for the next token of the day
+        self.assertEqual(len(server.messages), 5)
+        self.assertEqual(sorted(reported), sorted(server.recipients))
+        self.assertGreater(raised.exception.until,
+                           datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1))
+
+    def test_transient_failures_are_retried(self):
+        attempts = {}
+
+        def rcpt_reply(rcpt):
+            attempts[rcpt] = attempts.get(rcpt, 0) + 1
+            if rcpt == "email2@example.com" and attempts[rcpt] <= 2:
+                return "451 4.3.0 Mail server temporarily rejected message"
+            if rcpt == "email4@example.com":
+                return "450 4.2.1 Mailbox busy"
+            if rcpt == "email6@example.com":
+                return "552 5.2.2 Mailbox full"
+            return None
+
+        errors, delays = {}, []
+        policy = RetryPolicy(retries=3, base=1, max_delay=2, sleep=delays.append, random=lambda: 0.5)
+        with FakeSMTPServer(rcpt_reply=rcpt_reply) as server:
+            success_receiver, failed_receiver = self.send(server, retry_policy=policy, errors=errors)
+        self.assertEqual(failed_receiver, ["email4@example.com", "email6@example.com"])
+        self.assertIn("email2@example.com", success_receiver)
+        # Permanent failures are not retried, transient ones at most `retries` times
+        self.assertEqual((attempts["email2@example.com"], attempts["email4@example.com"], attempts["email6@example.com"]), (3, 4, 1))
+        self.assertEqual(delays, [0.5, 1.0, 0.5, 1.0, 1.0])
+        self.assertEqual(errors, {"email4@example.com": "transient: 450 4.2.1 Mailbox busy",
+                                  "email6@example.com": "permanent: 552 5.2.2 Mailbox full"})
+
+    def test_fails_after_the_throttle_retries(self):
+        with FakeSMTPServer(rcpt_reply=lambda rcpt: "421 4.7.0 Try again later") as server:
+            success_receiver, failed_receiver = self.send(
+                server, send_limiter=SendRateLimiter(0, 0, backoff_base=0.001, backoff_max=0.001), throttle_retries=2)
+        self.assertEqual(success_receiver, [])
+        self.assertEqual(failed_receiver, self.emails_list)
+
+
+class TestSendRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.slept = []
+
+        def sleep(seconds):
+            self.slept.append(seconds)
+            self.now += seconds
+
+        self.limiter = SendRateLimiter(per_minute=2, per_day=3, backoff_base=30, backoff_max=100,
+                                       clock=lambda: self.now, sleep=sleep)
+
+    def test_per_minute_and_per_day_budgets(self):
+        self.assertEqual(self.limiter.reserve("me@example.com"), (0.0, False))
+        self.assertEqual(self.limiter.reserve("ME@example.com"), (0.0, False))
+        # Paced by the minute bucket, one token every 30 seconds
+        self.assertEqual(self.limiter.reserve("me@example.com"), (30.0, False))
+        # Other senders have their own budget
+        self.assertEqual(self.limiter.reserve("other@example.com"), (0.0, False))
+        self.limiter.wait("me@example.com")
+        self.assertEqual(self.slept, [30.0])
+        # The daily budget is spent: the sender is paused until a token comes back
+        self.now += 60
+        delay, is_paused = self.limiter.reserve("me@example.com")
+        self.assertTrue(is_paused)
+        self.assertAlmostEqual(delay, 86400 / 3 - 90)
+        stats = self.limiter.stats()
+        self.assertEqual((stats["sends"], stats["waits"], stats["pauses"]), (4, 1, 0))
+
+    def test_backoff(self):
+        self.assertEqual([self.limiter.throttled("me@example.com", 421) for _ in range(4)], [30, 60, 100, 100])
+        paused = []
+        self.limiter.wait("me@example.com", on_pause=paused.append)
+        self.assertEqual(paused, [100])
+        self.limiter.succeeded("me@example.com")
+        self.assertEqual(self.limiter.throttled("me@example.com", 454), 30)
+        self.assertEqual(self.limiter.stats()["throttled"], 5)
+        self.assertEqual(self.limiter.stats()["throttled_454"], 1)
+
+    def test_long_pause_is_not_waited(self):
+        self.limiter.throttled("me@example.com", 421)
+        with self.assertRaises(SenderPaused) as raised:
+            self.limiter.wait("me@example.com", max_pause=10)
+        self.assertGreater(raised.exception.until, datetime.datetime.now(datetime.timezone.utc))
+        self.assertEqual(self.slept, [])
+        self.limiter.wait("me@example.com", max_pause=60)
+        self.assertEqual(self.slept, [30])
+        self.assertEqual(self.limiter.stats()["deferred"], 1)
+
+    def test_daily_quota_exceeded(self):
+        self.limiter.throttled("me@example.com", 550, "5.4.5 Daily user sending quota exceeded.")
+        self.now += 30
+        delay, is_paused = self.limiter.reserve("me@example.com")
+        self.assertTrue(is_paused)
+        self.assertAlmostEqual(delay, 86400 / 3 - 30)
+        self.assertEqual(self.limiter.stats()["quota_exceeded"], 1)
+
+    def test_throttle_replies(self):
+        self.assertTrue(is_throttle_reply(421, "4.7.0 Try again later"))
+        self.assertTrue(is_throttle_reply(454, "4.7.0 Too many login attempts"))
+        self.assertTrue(is_throttle_reply(550, "5.4.5 Daily user sending quota exceeded."))
+        self.assertFalse(is_throttle_reply(550, "5.1.1 User unknown"))
+        self.assertFalse(is_throttle_reply(None, "Connection refused"))
+        error = smtplib.SMTPRecipientsRefused({"to@example.com": (421, b"4.7.0 Try again later")})
+        self.assertEqual(smtp_reply(error), (421, "4.7.0 Try again later"))
+        self.assertEqual(smtp_reply(smtplib.SMTPDataError(550, b"5.4.5 Quota")), (550, "5.4.5 Quota"))
+
+
+class TestSendFailure(unittest.TestCase):
+    def test_classify_smtp_error(self):
+        cases = [
+            (smtplib.SMTPRecipientsRefused({"to@example.com": (550, b"5.1.1 User unknown")}), "permanent", 550),
+            (smtplib.SMTPDataError(451, b"4.3.0 Try again"), "transient", 451),
+            (smtplib.SMTPSenderRefused(421, b"4.7.0 Try again later", "me@example.com"), "throttled", 421),
+            (smtplib.SMTPAuthenticationError(535, b"5.7.8 Bad credentials"), "auth", 535),
+            (smtplib.SMTPSenderRefused(530, b"5.7.0 Authentication Required", "me@example.com"), "auth", 530),
+            (smtplib.SMTPServerDisconnected("Connection unexpectedly closed"), "connection", None),
+            (ConnectionRefusedError("Connection refused"), "connection", None),
+            (TimeoutError("timed out"), "connection", None),
+            (ValueError("Invalid recipient address"), "permanent", None),
+        ]
+        for error, kind, code in cases:
+            failure = classify_smtp_error(error)
+            self.assertEqual((failure.kind, failure.code), (kind, code), error)
+        self.assertTrue(classify_smtp_error(TimeoutError()).is_retryable)
+        self.assertFalse(classify_smtp_error(smtplib.SMTPAuthenticationError(535, b"")).is_retryable)
+        self.assertEqual(str(classify_smtp_error(ConnectionRefusedError("Connection refused"))), "connection: Connection refused")
+
+    def test_retry_delays_are_jittered_and_bounded(self):
+        policy = RetryPolicy(retries=5, base=1, max_delay=5, random=lambda: 0.999)
+        self.assertEqual([round(policy.delay(attempt), 2) for attempt in range(5)], [1.0, 2.0, 4.0, 5.0, 5.0])
+        self.assertEqual(RetryPolicy(base=1, random=lambda: 0.0).delay(3), 0.0)
+
+    def test_send_email_smtp_retries_dropped_connections(self):
+        delays = []
+        with FakeSMTPServer() as server, SMTPSession("me@example.com", "secret", host=server.host, port=server.port,
+                                                     starttls=False) as smtp_session:
+            # The session reconnects once by itself, the second drop is retried after a backoff
+            with patch("smtplib.SMTP.sendmail", side_effect=[smtplib.SMTPServerDisconnected(),
+                                                              smtplib.SMTPServerDisconnected(), {}]):
+                self.assertTrue(send_email_smtp("me@example.com", "secret", "email1@example.com", "Subject", "Body",
+                                                smtp_session=smtp_session,
+                                                retry_policy=RetryPolicy(retries=2, sleep=delays.append)))
+        self.assertEqual(len(delays), 1)
+
+
+class TestOpenSMTPSession(unittest.TestCase):
+    def setUp(self):
+        credential_cache.invalidate("me@example.com", "secret")
+
+    def test_check_connection_is_handed_to_the_sender(self):
+        with FakeSMTPServer(password="secret") as server:
+            settings = {"host": server.host, "port": server.port, "starttls": False}
+            smtp_session = open_smtp_session("me@example.com", "secret", **settings)
+            self.assertIsNotNone(smtp_session)
+            success_receiver, _ = send_campaign("me@example.com", "secret", ["email1@example.com"], "Subject", "Body",
+                                                smtp_settings=settings, smtp_session=smtp_session)
+        self.assertEqual(success_receiver, ["email1@example.com"])
+        self.assertEqual(server.logins, 1)
+
+    def test_valid_credentials_are_cached(self):
+        with FakeSMTPServer(password="secret") as server:
+            settings = {"host": server.host, "port": server.port, "starttls": False}
+            open_smtp_session("me@example.com", "secret", **settings).close()
+            open_smtp_session("me@example.com", "secret", **settings).close()
+            self.assertIsNone(open_smtp_session("me@example.com", "wrong", **settings))
+        self.assertEqual(server.logins, 2)
+
+    def test_auth_failure_invalidates_the_cache(self):
+        credential_cache.remember("me@example.com", "secret")
+        with FakeSMTPServer(password="changed") as server:
+            settings = {"host": server.host, "port": server.port, "starttls": False}
+            smtp_session = open_smtp_session("me@example.com", "secret", **settings)
+            self.assertFalse(send_email_smtp("me@example.com", "secret", "email1@example.com", "Subject", "Body",
+                                             smtp_session=smtp_session))
+            self.assertFalse(credential_cache.is_valid("me@example.com", "secret"))
+            self.assertIsNone(open_smtp_session("me@example.com", "secret", **settings))
+
+    def test_auth_failure_while_sending_invalidates_the_cache(self):
+        with FakeSMTPServer(password="secret") as server:
+            settings = {"host": server.host, "port": server.port, "starttls": False}
+            smtp_session = open_smtp_session("me@example.com", "secret", **settings)
+            self.assertTrue(credential_cache.is_valid("me@example.com", "secret"))
+            refused = smtplib.SMTPSenderRefused(530, b"5.7.0 Authentication Required", "me@example.com")
+            with patch("smtplib.SMTP.sendmail", side_effect=refused):
+                _, failed_receiver = send_campaign("me@example.com", "secret", ["email1@example.com"], "Subject",
+                                                   "Body", smtp_settings=settings, smtp_session=smtp_session,
+                                                   send_limiter=SendRateLimiter(per_minute=0, per_day=0))
+        self.assertEqual(failed_receiver, ["email1@example.com"])
+        self.assertFalse(credential_cache.is_valid("me@example.com", "secret"))
+
+    def test_cache_expires(self):
+        cache = CredentialCache(ttl=0)
+        cache.remember("me@example.com", "secret")
+        self.assertFalse(cache.is_valid("me@example.com", "secret"))
+
+
 if __name__ == '__main__':
     unittest.main()
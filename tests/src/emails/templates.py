@@ -0,0 +1,78 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from src.emails.templates import (CompiledTemplate, TemplateCache, compile_template, recipient_values,
+                                  DEFAULT_SECTOR, TEMPLATE_FIELDS)
+
+VALUES = recipient_values("John Doe", "ACME Inc", None, "john@example.com", "123456789", "John", "linkedin.com/johndoe")
+
+
+class TestCompiledTemplate(unittest.TestCase):
+    def test_renders_like_str_format(self):
+        for path in ("./tests/resource/message.html", "./tests/resource/message-ws.html"):
+            with open(path, encoding="utf-8") as file:
+                text = file.read()
+            self.assertEqual(CompiledTemplate(text).render(VALUES), text.format(**VALUES))
+        text = "{{literal}} {MyName!r:>10} {EntrepriseName} {MyName}{MyName}"
+        self.assertEqual(CompiledTemplate(text).render(VALUES), text.format(**VALUES))
+
+    def test_fields(self):
+        with open("./tests/resource/message.html", encoding="utf-8") as file:
+            self.assertEqual(CompiledTemplate(file.read()).fields, set(TEMPLATE_FIELDS))
+
+    def test_escape(self):
+        template = CompiledTemplate("<p>{EntrepriseName}</p>")
+        self.assertEqual(template.render({"EntrepriseName": "<b>A & B</b>"}, escape=True),
+                         "<p>&lt;b&gt;A &amp; B&lt;/b&gt;</p>")
+        self.assertEqual(template.render({"EntrepriseName": "<b>A & B</b>"}), "<p><b>A & B</b></p>")
+
+    def test_errors(self):
+        with self.assertRaises(KeyError):
+            CompiledTemplate("{MyName} {Unknown}").render(VALUES)
+        with self.assertRaises(ValueError):
+            CompiledTemplate("<p>{MyName</p>")
+
+    def test_compile_template_is_cached(self):
+        self.assertIs(compile_template("<p>{MyName}</p>"), compile_template("<p>{MyName}</p>"))
+
+    def test_recipient_values(self):
+        self.assertEqual(VALUES["EntrepriseSecteurActivite"], DEFAULT_SECTOR)
+        self.assertEqual(recipient_values(None, None, "IT", "", None, "", "")["EntrepriseContactName"], "")
+
+
+class TestTemplateCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "template.html")
+        shutil.copy(Path("./tests/resource/message.html"), self.path)
+        self.cache = TemplateCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_file_is_read_once(self):
+        with patch("builtins.open", wraps=open) as opened:
+            first = self.cache.get(self.path)
+            for _ in range(100):
+                self.assertIs(self.cache.get(self.path), first)
+        self.assertEqual(opened.call_count, 1)
+
+    def test_reloaded_when_the_file_changes(self):
+        first = self.cache.get(self.path)
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write("<p>{MyName}</p>")
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        second = self.cache.get(self.path)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.render(VALUES), "<p>John</p>")
+
+
+if __name__ == '__main__':
+    unittest.main()
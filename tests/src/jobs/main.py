@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import threading
+import datetime
+import unittest
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from src.jobs.main import Job, JobBackend, JobQueue, InMemoryJobBackend
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.backend = InMemoryJobBackend()
+        self.queue = JobQueue(backend=self.backend, max_workers=2)
+
+    def tearDown(self):
+        self.queue.shutdown()
+
+    def test_enqueue_returns_before_the_task_runs(self):
+        release = threading.Event()
+
+        def task(report):
+            release.wait(5)
+            report("email1@example.com", True)
+            return {"saved": True}
+
+        job = self.queue.enqueue(task, total=1, owner_id="user")
+        self.assertIn(self.queue.get(job.id).status, ["pending", "running"])
+        self.assertEqual(self.queue.get(job.id).pending, 1)
+        release.set()
+        self.queue.shutdown()
+        self.assertEqual(self.queue.get(job.id).status, "done")
+        self.assertEqual(self.queue.get(job.id).result, {"saved": True})
+
+    def test_progress_counters(self):
+        def task(report):
+            report("email1@example.com", True)
+            report("email2@example.com", False)
+            report("email3@example.com", True)
+
+        job = self.queue.enqueue(task, total=4)
+        self.queue.shutdown()
+        status = self.backend.get(job.id).to_dict()
+        self.assertEqual(status["sent"], 2)
+        self.assertEqual(status["failed"], 1)
+        self.assertEqual(status["pending"], 1)
+        self.assertEqual(status["failed_receiver"], ["email2@example.com"])
+
+    def test_receivers_of_an_active_job_only_if_asked(self):
+        job = Job(total=2)
+        job.status = "running"
+        job.success_receiver.append("email1@example.com")
+        status = job.to_dict()
+        self.assertEqual((status["sent"], status["pending"]), (1, 1))
+        self.assertNotIn("success_receiver", status)
+        self.assertEqual(job.to_dict(receivers=True)["success_receiver"], ["email1@example.com"])
+        job.status = "done"
+        self.assertEqual(job.to_dict()["success_receiver"], ["email1@example.com"])
+
+    def test_backend_must_implement_save_and_get(self):
+        class SaveOnlyBackend(JobBackend):
+            def save(self, job):
+                pass
+
+        with self.assertRaises(TypeError):
+            SaveOnlyBackend()
+
+    def test_unique_job_is_not_enqueued_while_active(self):
+        release = threading.Event()
+        job = self.queue.enqueue(lambda report: release.wait(5), total=0, job_id="operation", unique=True)
+        self.assertIsNone(self.queue.enqueue(lambda report: None, total=0, job_id="operation", unique=True))
+        release.set()
+        self.queue.shutdown()
+        self.assertFalse(job.is_active)
+        self.queue = JobQueue(backend=self.backend, max_workers=2)
+        self.assertIsNotNone(self.queue.enqueue(lambda report: None, total=0, job_id="operation", unique=True))
+
+    def test_deferred_job_frees_its_worker(self):
+        self.queue.shutdown()
+        self.queue = JobQueue(backend=self.backend, max_workers=1)
+        runs, other_ran = [], threading.Event()
+
+        def task(report):
+            runs.append(self.queue.get("deferred").status)
+            if len(runs) == 1:
+                report("email1@example.com", True)
+                report.defer(datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=0.3))
+                return {"saved": False}
+            report("email2@example.com", True)
+            return {"saved": True}
+
+        job = self.queue.enqueue(task, total=2, job_id="deferred")
+        # The only worker is free while the job waits
+        self.queue.enqueue(lambda report: other_ran.set(), total=0)
+        self.assertTrue(other_ran.wait(5))
+        self.assertEqual((job.status, job.is_active), ("paused", True))
+        self.assertIsNotNone(job.paused_until)
+        deadline = time.monotonic() + 5
+        while job.status != "done" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(runs, ["running", "running"])
+        self.assertEqual((job.status, job.paused_until, job.result, job.pending), ("done", None, {"saved": True}, 0))
+
+    def test_deferred_job_stays_paused_after_shutdown(self):
+        job = self.queue.enqueue(lambda report: report.defer(datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)),
+                                 total=0)
+        self.queue.shutdown()
+        self.assertEqual((job.status, job.paused_until.year), ("paused", 2030))
+
+    def test_failed_task(self):
+        def task(report):
+            raise RuntimeError("boom")
+
+        job = self.queue.enqueue(task, total=1)
+        self.queue.shutdown()
+        self.assertEqual(self.queue.get(job.id).status, "failed")
+        self.assertEqual(self.queue.get(job.id).error, "boom")
+
+    def test_pause_and_resume(self):
+        resume_at = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+        paused, resumed = threading.Event(), threading.Event()
+        states = []
+
+        def task(report):
+            report.pause(resume_at)
+            paused.set()
+            resumed.wait(5)
+            report.pause(None)
+            states.append(self.queue.get(job.id).to_dict())
+            report.pause(resume_at)
+
+        job = self.queue.enqueue(task, total=1)
+        paused.wait(5)
+        status = self.queue.get(job.id).to_dict()
+        self.assertEqual((status["status"], status["paused_until"]), ("paused", "2030-01-01T00:00:00+00:00"))
+        resumed.set()
+        self.queue.shutdown()
+        self.assertEqual((states[0]["status"], states[0]["paused_until"]), ("running", None))
+        # A job that finishes is no longer paused
+        self.assertEqual((job.status, job.paused_until), ("done", None))
+
+    def test_unknown_job(self):
+        self.assertIsNone(self.queue.get("missing"))
+
+
+if __name__ == '__main__':
+    unittest.main()
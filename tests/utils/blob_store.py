@@ -0,0 +1,95 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from utils.blob_store import BlobStore
+from utils.workspace import Workspace, WorkspaceQuotaExceeded
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = BlobStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_same_content_is_stored_once(self):
+        first = self.store.put_stream(io.BytesIO(b"resume"))
+        os.utime(self.store.path(first), (1, 1))
+        second = self.store.put_stream(io.BytesIO(b"resume"))
+        third = self.store.put_stream(io.BytesIO(b"other resume"))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertEqual(len(first), 64)
+        self.assertCountEqual(self.store.list_ids(), [first, third])
+        # Reusing a blob refreshes its age
+        self.assertGreater(os.path.getmtime(self.store.path(first)), 1)
+        with open(self.store.path(first), "rb") as blob:
+            self.assertEqual(blob.read(), b"resume")
+
+    def test_collect_garbage(self):
+        kept = self.store.put_stream(io.BytesIO(b"referenced"))
+        removed = self.store.put_stream(io.BytesIO(b"unreferenced"))
+        recent = self.store.put_stream(io.BytesIO(b"unreferenced but recent"))
+        for blob_id in (kept, removed):
+            os.utime(self.store.path(blob_id), (1, 1))
+        self.assertEqual(self.store.collect_garbage({kept}, min_age=60), [removed])
+        self.assertCountEqual(self.store.list_ids(), [kept, recent])
+
+    def test_collect_garbage_keeps_a_blob_reused_meanwhile(self):
+        blob_id = self.store.put_stream(io.BytesIO(b"resume"))
+        path = self.store.path(blob_id)
+        os.utime(path, (1, 1))
+        rename = os.rename
+
+        def reused_then_renamed(source, destination):
+            # put_stream reuses the blob between the age check and the rename
+            self.store.put_stream(io.BytesIO(b"resume"))
+            rename(source, destination)
+
+        with mock.patch("utils.blob_store.os.rename", side_effect=reused_then_renamed):
+            self.assertEqual(self.store.collect_garbage(set(), min_age=60), [])
+        self.assertEqual(os.listdir(self.directory.name), [os.path.basename(path)])
+
+    def test_put_stream_writes_a_blob_being_removed(self):
+        blob_id = self.store.put_stream(io.BytesIO(b"resume"))
+        path = self.store.path(blob_id)
+        exists = os.path.exists
+
+        def seen_then_renamed(name):
+            if name != path:
+                return exists(name)
+            # The collector renames the blob right after put_stream found it
+            os.rename(path, f"{path}.0.deleted")
+            return True
+
+        with mock.patch("utils.blob_store.os.path.exists", side_effect=seen_then_renamed):
+            self.assertEqual(self.store.put_stream(io.BytesIO(b"resume")), blob_id)
+        with open(path, "rb") as blob:
+            self.assertEqual(blob.read(), b"resume")
+
+    def test_collect_garbage_removes_old_tombstones(self):
+        tombstone = os.path.join(self.directory.name, "old.pdf.1234.deleted")
+        open(tombstone, "wb").close()
+        os.utime(tombstone, (1, 1))
+        self.store.collect_garbage(set(), min_age=60)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_put_stream_through_workspace(self):
+        with Workspace(root=self.directory.name, quota=8) as workspace:
+            blob_id = self.store.put_stream(io.BytesIO(b"resume"), workspace=workspace)
+            # The staged file was moved in place
+            self.assertEqual(os.listdir(workspace.directory), [])
+            with self.assertRaises(WorkspaceQuotaExceeded):
+                self.store.put_stream(io.BytesIO(b"larger resume"), workspace=workspace)
+        self.assertEqual(self.store.list_ids(), [blob_id])
+
+
+if __name__ == '__main__':
+    unittest.main()
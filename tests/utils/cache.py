@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import unittest
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from utils.cache import LRUCache, DiskCache, TieredCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_counters(self):
+        cache = LRUCache(maxsize=2)
+        cache.get("a")
+        cache.set("a", 1)
+        cache.get("a")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_ttl(self):
+        cache = LRUCache(maxsize=2, ttl=0)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+class TestDiskCache(unittest.TestCase):
+    def test_size_based_eviction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = DiskCache(directory, max_bytes=25)
+            cache.set("a", "x" * 10)
+            os.utime(os.path.join(directory, "a.txt"), (1, 1))
+            cache.set("b", "y" * 10)
+            cache.set("c", "z" * 10)
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), "y" * 10)
+            self.assertEqual(cache.get("c"), "z" * 10)
+            self.assertEqual(cache.stats(), {"hits": 2, "misses": 1})
+
+    def test_disk_tier_is_promoted_to_memory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            DiskCache(directory).set("a", "text")
+            cache = TieredCache(LRUCache(maxsize=2), DiskCache(directory))
+            self.assertEqual(cache.get("a"), "text")
+            self.assertEqual(cache.memory.get("a"), "text")
+            self.assertIsNone(cache.get("missing"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,8 @@ import unittest
 
 parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
 sys.path.append(parent_dir)
-from utils.file_txt import parse_text_file
+import io
+from utils.file_txt import parse_text_file, iter_recipients, iter_contacts
 from pathlib import Path
 
 class TestParseTextFile(unittest.TestCase):
@@ -26,5 +27,86 @@ class TestParseTextFile(unittest.TestCase):
         actual_emails = parse_text_file(str(Path("./tests/resource/test_data_semicolon.txt")), sep=";")
         self.assertEqual(actual_emails, expected_emails)
 
+class TestIterRecipients(unittest.TestCase):
+    def parse(self, content: bytes, **kwargs):
+        rejected = []
+        emails = list(iter_recipients(io.BytesIO(content), rejected=rejected, **kwargs))
+        return emails, rejected
+
+    def test_detects_separator(self):
+        expected_emails = ['email1@example.com', 'email2@example.com', 'email3@example.com']
+        for content in (b"email1@example.com\nemail2@example.com\r\nemail3@example.com\n",
+                        b"email1@example.com,email2@example.com,email3@example.com",
+                        b"email1@example.com; email2@example.com;email3@example.com",
+                        b"email1@example.com\temail2@example.com\temail3@example.com"):
+            emails, rejected = self.parse(content)
+            self.assertEqual(emails, expected_emails)
+            self.assertEqual(rejected, [])
+
+    def test_explicit_separator(self):
+        emails, _ = self.parse(b"email1@example.com;email2@example.com\nemail3@example.com", sep=";")
+        self.assertEqual(emails, ['email1@example.com', 'email2@example.com', 'email3@example.com'])
+
+    def test_csv_email_column(self):
+        content = b'name,Email,company\n"Doe, Jane",jane@example.com,ACME\nJohn,"john@example.com",Foo\n'
+        emails, rejected = self.parse(content)
+        self.assertEqual(emails, ['jane@example.com', 'john@example.com'])
+        self.assertEqual(rejected, [])
+
+    def test_deduplicates_case_insensitively(self):
+        emails, _ = self.parse(b"A@Example.com\na@example.com\n b@example.com \nB@EXAMPLE.COM")
+        self.assertEqual(emails, ['a@example.com', 'b@example.com'])
+
+    def test_rejects_invalid_entries(self):
+        emails, rejected = self.parse(b"a@example.com\nnot-an-email\n\n@example.com")
+        self.assertEqual(emails, ['a@example.com'])
+        self.assertEqual(rejected, ['not-an-email', '@example.com'])
+
+    def test_max_recipients(self):
+        emails, rejected = self.parse(b"a@example.com\nb@example.com\nc@example.com", max_recipients=2)
+        self.assertEqual(emails, ['a@example.com', 'b@example.com'])
+        self.assertEqual(rejected, ['c@example.com'])
+
+    def test_stream_left_open(self):
+        stream = io.BytesIO(b"a@example.com")
+        list(iter_recipients(stream))
+        self.assertFalse(stream.closed)
+
+class TestIterContacts(unittest.TestCase):
+    def parse(self, content: bytes, **kwargs):
+        rejected = []
+        contacts = list(iter_contacts(io.BytesIO(content), rejected=rejected, **kwargs))
+        return contacts, rejected
+
+    def test_header_columns_in_any_order(self):
+        content = b'Company,Email,Contact Name,Sector\n"ACME, Inc",Jane@Example.com,Jane Doe,\nFoo,john@example.com,,Finance\n'
+        contacts, rejected = self.parse(content)
+        self.assertEqual(contacts, [
+            {'email': 'jane@example.com', 'contact_name': 'Jane Doe', 'company': 'ACME, Inc', 'sector': None},
+            {'email': 'john@example.com', 'contact_name': None, 'company': 'Foo', 'sector': 'Finance'},
+        ])
+        self.assertEqual(rejected, [])
+
+    def test_without_header(self):
+        contacts, _ = self.parse(b"jane@example.com;Jane;ACME;IT\njohn@example.com\n")
+        self.assertEqual(contacts, [
+            {'email': 'jane@example.com', 'contact_name': 'Jane', 'company': 'ACME', 'sector': 'IT'},
+            {'email': 'john@example.com', 'contact_name': None, 'company': None, 'sector': None},
+        ])
+
+    def test_rejects_and_deduplicates(self):
+        contacts, rejected = self.parse(b"email,company\na@example.com,A\nnot-an-email,B\nA@example.com,C\nb@example.com,D",
+                                        max_recipients=1)
+        self.assertEqual([(contact['email'], contact['company']) for contact in contacts], [('a@example.com', 'A')])
+        self.assertEqual(rejected, ['not-an-email', 'b@example.com'])
+
+    def test_rejected_like_iter_recipients(self):
+        content = b"email,company\n Not-An-Email ,A\n'@Example.com',B\n"
+        _, rejected = self.parse(content)
+        recipients_rejected = []
+        list(iter_recipients(io.BytesIO(content), rejected=recipients_rejected))
+        self.assertEqual(rejected, ['Not-An-Email', "'@Example.com'"])
+        self.assertEqual(rejected, recipients_rejected)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,55 @@
+import os
+import sys
+import asyncio
+import unittest
+from unittest.mock import patch
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from utils.password import (build_context, parse_scheme_settings, hash_password, verify_and_update,
+                            verify_and_update_async, shutdown_password_executor)
+
+class TestPassword(unittest.TestCase):
+    def test_parse_scheme_settings(self):
+        self.assertEqual(parse_scheme_settings(""), {})
+        self.assertEqual(parse_scheme_settings("sha256_crypt__rounds=600000, bcrypt__ident=2b"),
+                         {"sha256_crypt__rounds": 600000, "sha256_crypt__min_rounds": 600000, "bcrypt__ident": "2b"})
+        self.assertEqual(parse_scheme_settings("sha256_crypt__rounds=600000,sha256_crypt__min_rounds=500000"),
+                         {"sha256_crypt__rounds": 600000, "sha256_crypt__min_rounds": 500000})
+
+    def test_verify_current_hash(self):
+        with patch("utils.password.password_context", build_context(["sha256_crypt"], "sha256_crypt__rounds=1000")):
+            password_hash = hash_password("Abcd1234")
+            self.assertEqual(verify_and_update("Abcd1234", password_hash), (True, None))
+            self.assertEqual(verify_and_update("Wrong1234", password_hash), (False, None))
+            self.assertEqual(verify_and_update("Abcd1234", "not a hash"), (False, None))
+            self.assertEqual(verify_and_update("Abcd1234", None), (False, None))
+
+    def test_outdated_rounds_are_rehashed(self):
+        with patch("utils.password.password_context", build_context(["sha256_crypt"], "sha256_crypt__rounds=1000")):
+            old_hash = hash_password("Abcd1234")
+        with patch("utils.password.password_context", build_context(["sha256_crypt"], "sha256_crypt__rounds=2000")):
+            is_valid, new_hash = verify_and_update("Abcd1234", old_hash)
+            self.assertTrue(is_valid)
+            self.assertIn("rounds=2000", new_hash)
+            self.assertEqual(verify_and_update("Abcd1234", new_hash), (True, None))
+            self.assertEqual(verify_and_update("Wrong1234", old_hash), (False, None))
+
+    def test_deprecated_scheme_is_rehashed(self):
+        with patch("utils.password.password_context", build_context(["md5_crypt"])):
+            old_hash = hash_password("Abcd1234")
+        with patch("utils.password.password_context", build_context(["sha256_crypt", "md5_crypt"], "sha256_crypt__rounds=1000")):
+            is_valid, new_hash = verify_and_update("Abcd1234", old_hash)
+        self.assertTrue(is_valid)
+        self.assertTrue(new_hash.startswith("$5$"))
+
+    def test_verify_in_process_pool(self):
+        password_hash = hash_password("Abcd1234")
+        try:
+            self.assertEqual(asyncio.run(verify_and_update_async("Abcd1234", password_hash)), (True, None))
+            self.assertEqual(asyncio.run(verify_and_update_async("Wrong1234", password_hash)), (False, None))
+        finally:
+            shutdown_password_executor()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import sys
+import unittest
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from utils.validity import (is_valid_email, is_valid_password,
+                            is_linkedin_profile_link, validate_emails)
+
+class TestValidity(unittest.TestCase):
+    def test_is_valid_email(self):
+        self.assertTrue(is_valid_email("john.doe+jobs@example.co.uk"))
+        self.assertFalse(is_valid_email("john.doe@example"))
+        self.assertFalse(is_valid_email("john doe@example.com"))
+        self.assertFalse(is_valid_email(""))
+
+    def test_is_valid_password(self):
+        self.assertTrue(is_valid_password("Abcd1234"))
+        self.assertFalse(is_valid_password("abcd1234"))
+        self.assertFalse(is_valid_password("ABCD1234"))
+        self.assertFalse(is_valid_password("Abcd123"))
+        self.assertFalse(is_valid_password("Abcdefgh"))
+        # The required characters may appear in any order
+        self.assertTrue(is_valid_password("9!!!!!!zZ"))
+
+    def test_is_linkedin_profile_link(self):
+        self.assertTrue(is_linkedin_profile_link("https://www.linkedin.com/in/johndoe"))
+        self.assertTrue(is_linkedin_profile_link("http://linkedin.com/in/john-doe_1/"))
+        self.assertFalse(is_linkedin_profile_link("https://www.linkedin.com/company/example-corporation"))
+
+    def test_validate_emails(self):
+        valid, invalid = validate_emails(iter(["a@example.com", "a@", "b@example.org", "not an email"]))
+        self.assertEqual(valid, ["a@example.com", "b@example.org"])
+        self.assertEqual(invalid, ["a@", "not an email"])
+
+    def test_validate_emails_matches_is_valid_email(self):
+        emails = ["a@example.com", "A.B@sub.example.io", "a@b.c", "@example.com", "a@example.com "]
+        valid, invalid = validate_emails(emails)
+        self.assertEqual(valid, [email for email in emails if is_valid_email(email)])
+        self.assertEqual(invalid, [email for email in emails if not is_valid_email(email)])
+
+if __name__ == '__main__':
+    unittest.main()
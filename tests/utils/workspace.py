@@ -0,0 +1,64 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), '.'))
+sys.path.append(parent_dir)
+from utils.workspace import Workspace, WorkspaceQuotaExceeded, sweep_stale
+
+
+class TestWorkspace(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_concurrent_workspaces_do_not_share_paths(self):
+        def stage(index: int) -> tuple:
+            with Workspace(root=self.root.name) as workspace:
+                path = workspace.write_stream(io.BytesIO(f"emails {index}".encode()), suffix=".txt")
+                with open(path, "rb") as file:
+                    return workspace.directory, path, file.read()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(stage, range(32)))
+        self.assertEqual(len({directory for directory, _, _ in results}), 32)
+        self.assertEqual([content for _, _, content in results], [f"emails {index}".encode() for index in range(32)])
+        # Every workspace is removed once its block exits
+        self.assertEqual(os.listdir(self.root.name), [])
+
+    def test_cleanup_when_the_block_raises(self):
+        with self.assertRaises(ValueError):
+            with Workspace(root=self.root.name) as workspace:
+                workspace.write_stream(io.BytesIO(b"resume"))
+                directory = workspace.directory
+                raise ValueError()
+        self.assertFalse(os.path.exists(directory))
+        with self.assertRaises(RuntimeError):
+            workspace.path()
+
+    def test_quota(self):
+        with Workspace(root=self.root.name, quota=10) as workspace:
+            workspace.write_stream(io.BytesIO(b"123456"))
+            with self.assertRaises(WorkspaceQuotaExceeded):
+                workspace.write_stream(io.BytesIO(b"123456"), chunk_size=2)
+            # The partial file is removed and does not count
+            self.assertEqual(len(os.listdir(workspace.directory)), 1)
+            self.assertEqual(workspace.used, 6)
+
+    def test_sweep_stale(self):
+        stale = Workspace(root=self.root.name).__enter__()
+        recent = Workspace(root=self.root.name).__enter__()
+        os.utime(stale.directory, (1, 1))
+        os.makedirs(os.path.join(self.root.name, "other"))
+        self.assertEqual(sweep_stale(self.root.name, max_age=60), [stale.directory])
+        self.assertCountEqual(os.listdir(self.root.name), [os.path.basename(recent.directory), "other"])
+        self.assertEqual(sweep_stale(os.path.join(self.root.name, "missing")), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
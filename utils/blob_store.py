@@ -0,0 +1,144 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from typing import BinaryIO
+
+
+class BlobStore:
+    """
+    Content-addressed file store.
+
+    Each blob is saved once under the SHA-256 of its content, so storing the same file
+    again returns the same id without writing anything.
+
+    Args:
+        directory (str): Where the blobs are stored. It is created by the first write.
+        extension (str, optional): Extension of the blob files. Default is ".pdf".
+
+    Example:
+        >>> store = BlobStore("./data/resume")
+        >>> with open("resume.pdf", "rb") as resume:
+        ...     pdf_id = store.put_stream(resume)
+        >>> store.path(pdf_id)
+        './data/resume/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.pdf'
+    """
+
+    def __init__(self, directory: str, extension: str = ".pdf"):
+        self.directory = directory
+        self.extension = extension
+
+    def path(self, blob_id: str) -> str:
+        """
+        Get the path of a blob.
+
+        Args:
+            blob_id (str): The blob id.
+
+        Returns:
+            str: The path of the blob file.
+        """
+        return f"{self.directory}/{blob_id}{self.extension}"
+
+    def exists(self, blob_id: str) -> bool:
+        return os.path.exists(self.path(blob_id))
+
+    def put_stream(self, stream: BinaryIO, workspace=None) -> str:
+        """
+        Store the content of a binary stream, unless a blob with the same content exists.
+
+        Args:
+            stream (BinaryIO): A seekable binary stream, e.g. the spooled file of an upload.
+            workspace (Workspace, optional): Request workspace where the new blob is written before being
+                moved in place, so its quota applies. It must be on the same filesystem as the store.
+                Default is a temporary file next to the blob.
+
+        Returns:
+            str: The blob id, the SHA-256 of the content.
+        """
+        sha256 = hashlib.sha256()
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+            sha256.update(chunk)
+        blob_id = sha256.hexdigest()
+        path = self.path(blob_id)
+        if os.path.exists(path):
+            # Known content: only refresh its age so garbage collection keeps it. If the collector
+            # moved it away in between, it is written again below
+            try:
+                os.utime(path)
+                return blob_id
+            except FileNotFoundError:
+                pass
+        os.makedirs(self.directory, exist_ok=True)
+        if workspace is not None:
+            temp_path = workspace.write_stream(stream, suffix=self.extension)
+        else:
+            stream.seek(0)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as blob_file:
+                for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+                    blob_file.write(chunk)
+        os.replace(temp_path, path)
+        return blob_id
+
+    def list_ids(self) -> list:
+        """
+        List the ids of the stored blobs.
+
+        Returns:
+            list: The blob ids.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return [entry.name[:-len(self.extension)] for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(self.extension)]
+
+    def collect_garbage(self, referenced_ids: set, min_age: float = 24 * 60 * 60) -> list:
+        """
+        Remove the blobs no one references.
+
+        Blobs written or reused less than `min_age` seconds ago are kept: an upload is stored
+        before the campaign that sends it saves its operation, and so its reference.
+
+        A blob is first renamed to a tombstone, then removed only if no put_stream reused it
+        before the rename; a put_stream after the rename does not find it and writes it again.
+        Tombstones left by an interrupted collection are removed too.
+
+        Args:
+            referenced_ids (set): Ids of the blobs still in use.
+            min_age (float, optional): Minimum age in seconds of a blob to remove. Default is one day.
+
+        Returns:
+            list: The ids of the removed blobs.
+        """
+        removed: list = []
+        now = time.time()
+        for blob_id in self.list_ids():
+            if blob_id in referenced_ids:
+                continue
+            path = self.path(blob_id)
+            tombstone = f"{path}.{uuid.uuid4().hex}.deleted"
+            try:
+                if now - os.path.getmtime(path) < min_age:
+                    continue
+                os.rename(path, tombstone)
+            except FileNotFoundError:
+                continue
+            # The rename keeps the modification time a concurrent reuse refreshed
+            if now - os.path.getmtime(tombstone) < min_age:
+                os.replace(tombstone, path)
+                continue
+            os.remove(tombstone)
+            removed.append(blob_id)
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".deleted"):
+                    continue
+                try:
+                    if now - entry.stat().st_mtime >= min_age:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+        return removed
@@ -0,0 +1,231 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Union
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory cache bounded in size, with an optional time to live.
+
+    The least recently used entry is evicted when the cache is full.
+
+    Args:
+        maxsize (int): Maximum number of entries.
+        ttl (float, optional): Seconds an entry stays valid. Default is no expiry.
+
+    Example:
+        >>> cache = LRUCache(maxsize=2)
+        >>> cache.set("a", 1)
+        >>> cache.get("a")
+        1
+        >>> cache.stats()
+        {'hits': 1, 'misses': 0, 'size': 1}
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get a value and mark it as recently used.
+
+        Args:
+            key (Hashable): The key to look up.
+            default (Any, optional): Returned when the key is missing or expired.
+
+        Returns:
+            Any: The cached value, or `default`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (Hashable): The key.
+            value (Any): The value to store.
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Remove a key if it is cached.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Remove every entry and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Get the hit and miss counters and the current size.
+
+        Returns:
+            dict: The cache statistics.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    Text cache stored as one file per key in a directory, bounded in total size.
+
+    When the directory grows over `max_bytes`, the least recently read files are removed.
+    Keys must be safe to use as file names, e.g. hex digests.
+
+    Args:
+        directory (str): Where the files are stored. It is created if needed.
+        max_bytes (int): Maximum total size of the files.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 50 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def get(self, key: str, default: Union[str, None] = None) -> Union[str, None]:
+        """
+        Read a cached text.
+
+        Args:
+            key (str): The key to look up.
+            default (str, optional): Returned when the key is missing.
+
+        Returns:
+            Union[str, None]: The cached text, or `default`.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                value = file.read()
+            # Reading refreshes the file, so eviction removes the least recently used ones
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return default
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Write a text, then evict old files if the directory is over its size limit.
+
+        Args:
+            key (str): The key.
+            value (str): The text to store.
+        """
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(value)
+        os.replace(temp_path, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".txt"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self) -> dict:
+        """
+        Get the hit and miss counters.
+
+        Returns:
+            dict: The cache statistics.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+class TieredCache:
+    """
+    An in-memory LRU tier in front of an optional on-disk tier.
+
+    Values found on disk are promoted to memory. Writes go to both tiers.
+
+    Args:
+        memory (LRUCache): The in-memory tier.
+        disk (DiskCache, optional): The on-disk tier.
+    """
+
+    def __init__(self, memory: LRUCache, disk: DiskCache = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return default if value is None else value
+
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> dict:
+        """
+        Get the counters of each tier.
+
+        Returns:
+            dict: The statistics of the memory tier and, if enabled, of the disk tier.
+        """
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
@@ -0,0 +1,36 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+from dotenv import load_dotenv
+
+# Load variables from the specified .env file
+load_dotenv(dotenv_path=str(Path("./env/server.env")))
+
+BLOCKING_WORKERS: int = int(os.getenv("BLOCKING_WORKERS", 16))
+
+# Threads running the blocking calls (SMTP, LLM, PDF parsing) of the request handlers
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+
+async def run_blocking(func: Callable, *args, executor: Executor = None, **kwargs) -> Any:
+    """
+    Run a blocking function in an executor so it does not freeze the event loop.
+
+    Args:
+        func (Callable): The blocking function.
+        *args: Positional arguments for the function.
+        executor (Executor, optional): Where to run the function. Default is the shared blocking executor.
+        **kwargs: Keyword arguments for the function.
+
+    Returns:
+        Any: The value returned by the function.
+
+    Example:
+        >>> await run_blocking(check_gmail_connection, "me@gmail.com", "xxxx xxxx xxxx xxxx")
+        True
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor or blocking_executor, functools.partial(func, *args, **kwargs))
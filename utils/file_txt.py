@@ -1,4 +1,26 @@
+import io
+import os
+import csv
+import hashlib
+from contextlib import closing
+from pathlib import Path
+from typing import BinaryIO, Iterator, Union
+from dotenv import load_dotenv
+from utils.validity import is_valid_email
 
+load_dotenv(dotenv_path=str(Path("./env/campaign.env")))
+
+MAX_RECIPIENTS: int = int(os.getenv("MAX_RECIPIENTS", 100000))
+# Separators recognised when the recipient list does not say which one it uses
+AUTO_SEPARATORS: str = ",;\t"
+# Header names of the email column in CSV exports
+EMAIL_COLUMNS: tuple = ("email", "e-mail", "email address", "e-mail address", "mail")
+# Header names of the other columns of a contact list
+CONTACT_NAME_COLUMNS: tuple = ("contact name", "contact_name", "contact", "name", "full name")
+COMPANY_COLUMNS: tuple = ("company", "company name", "company_name", "entreprise", "enterprise", "organization")
+SECTOR_COLUMNS: tuple = ("sector", "secteur", "industry", "secteur activite", "secteur d'activite")
+# Column order of a contact list without a header row
+CONTACT_FIELDS: tuple = ("email", "contact_name", "company", "sector")
 
 def parse_text_file(path: str, sep: str = '\n'):
     """
@@ -21,3 +43,185 @@ def parse_text_file(path: str, sep: str = '\n'):
             # Add the parsed email addresses to the list
             emails.extend(line_emails)
     return emails
+
+
+def _fingerprint(email: str) -> int:
+    # 8 bytes per address instead of the whole string keeps de-duplication memory small
+    return int.from_bytes(hashlib.blake2b(email.encode(), digest_size=8).digest(), "big")
+
+
+def iter_recipients(stream: BinaryIO, sep: str = None, rejected: list = None,
+                    max_recipients: int = MAX_RECIPIENTS, max_rejected: int = 1000) -> Iterator[str]:
+    """
+    Stream the valid, unique recipient addresses of an uploaded list.
+
+    The list is read line by line from the binary stream, without a copy on disk. Entries may be
+    separated by newlines, commas, semicolons or tabs, or come from a CSV export; when its first row
+    has an "email" column, only that column is read. Addresses are stripped, lower-cased and
+    de-duplicated, and invalid ones never reach the sender.
+
+    Args:
+    - stream (BinaryIO): The uploaded file, e.g. `UploadFile.file`.
+    - sep (str, optional): The separator between addresses. Default detects it from the first line.
+    - rejected (list, optional): Receives the invalid entries, and the ones over `max_recipients`.
+    - max_recipients (int, optional): Maximum number of addresses yielded. Default is MAX_RECIPIENTS.
+    - max_rejected (int, optional): Maximum number of entries added to `rejected`. Default is 1000.
+
+    Yields:
+    - str: The normalized addresses, in file order.
+
+    Example:
+    >>> rejected = []
+    >>> list(iter_recipients(io.BytesIO(b"A@example.com;garbage;a@example.com"), rejected=rejected))
+    ['a@example.com']
+    >>> rejected
+    ['garbage']
+    """
+    accept = _RecipientFilter(rejected, max_recipients, max_rejected)
+    email_column = None
+    with closing(_iter_rows(stream, sep)) as rows:
+        for number, fields in enumerate(rows):
+            if number == 0 and len(fields) > 1:
+                email_column = next((index for index, name in enumerate(_header(fields)) if name in EMAIL_COLUMNS),
+                                    None)
+                if email_column is not None:
+                    continue
+            if email_column is not None:
+                fields = fields[email_column:email_column + 1]
+            for field in fields:
+                email = accept(field)
+                if email is not None:
+                    yield email
+
+
+def iter_contacts(stream: BinaryIO, sep: str = None, rejected: list = None,
+                  max_recipients: int = MAX_RECIPIENTS, max_rejected: int = 1000) -> Iterator[dict]:
+    """
+    Stream the valid, unique contacts of an uploaded CSV of (email, contact name, company, sector).
+
+    The columns are found by the names of the header row, in any order, e.g. "Email,Company,Name";
+    without a header they are read in that order and the last ones may be left out. Addresses are
+    normalized, validated and de-duplicated like iter_recipients does; empty cells are None.
+
+    Args:
+    - stream (BinaryIO): The uploaded file, e.g. `UploadFile.file`.
+    - sep (str, optional): The separator between columns. Default detects it from the first line.
+    - rejected (list, optional): Receives the invalid addresses, and the ones over `max_recipients`.
+    - max_recipients (int, optional): Maximum number of contacts yielded. Default is MAX_RECIPIENTS.
+    - max_rejected (int, optional): Maximum number of entries added to `rejected`. Default is 1000.
+
+    Yields:
+    - dict: The 'email', 'contact_name', 'company' and 'sector' of each contact, in file order.
+
+    Example:
+    >>> list(iter_contacts(io.BytesIO(b"email;company\nHR@acme.com;ACME")))
+    [{'email': 'hr@acme.com', 'contact_name': None, 'company': 'ACME', 'sector': None}]
+    """
+    accept = _RecipientFilter(rejected, max_recipients, max_rejected)
+    columns: list = list(enumerate(CONTACT_FIELDS))
+    with closing(_iter_rows(stream, sep)) as rows:
+        for number, fields in enumerate(rows):
+            if number == 0:
+                header = _contact_columns(_header(fields))
+                if header is not None:
+                    columns = header
+                    continue
+            email = None
+            contact = {name: None for name in CONTACT_FIELDS}
+            for index, name in columns:
+                if name == "email":
+                    email = accept(fields[index]) if index < len(fields) else None
+                    if email is None:
+                        break
+                    contact["email"] = email
+                else:
+                    contact[name] = _cell(fields, index)
+            if email is not None:
+                yield contact
+
+
+def _iter_rows(stream: BinaryIO, sep: Union[str, None]) -> Iterator[list]:
+    # Fields of each non-empty line, split on `sep` or on the separator found in the first line
+    if sep in ("\n", "\r\n", "\\n", ""):
+        sep = None
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline="")
+    try:
+        delimiter = sep
+        for line in text:
+            if not line.strip():
+                continue
+            if delimiter is None:
+                counts = {candidate: line.count(candidate) for candidate in AUTO_SEPARATORS}
+                delimiter = max(counts, key=counts.get) if max(counts.values()) else ","
+            yield _split(line, delimiter)
+    finally:
+        # Give the stream back to its owner instead of closing it with the wrapper
+        text.detach()
+
+
+def _split(line: str, delimiter: str) -> list:
+    # Only quoted CSV fields need the csv module, a plain split is much faster
+    if len(delimiter) == 1 and '"' in line:
+        return next(csv.reader([line], delimiter=delimiter), [])
+    return line.split(delimiter)
+
+
+def _header(fields: list) -> list:
+    return [field.strip().strip("\"'").strip().lower() for field in fields]
+
+
+class _RecipientFilter:
+    """
+    Validates, de-duplicates and caps the addresses of an uploaded list.
+
+    Calling it with a raw field returns the normalized address, or None when the field is empty,
+    invalid, a duplicate or over `max_recipients`. Invalid fields are added to `rejected` as they
+    were written, stripped; addresses over the limit are added normalized.
+    """
+
+    def __init__(self, rejected: Union[list, None], max_recipients: int, max_rejected: int):
+        self.rejected = rejected
+        self.max_recipients = max_recipients
+        self.max_rejected = max_rejected
+        self.seen: set = set()
+        self.accepted: int = 0
+
+    def __call__(self, field: str) -> Union[str, None]:
+        email = field.strip().strip("\"'").strip().lower()
+        if not email:
+            return None
+        if not is_valid_email(email):
+            self._reject(field.strip())
+            return None
+        fingerprint = _fingerprint(email)
+        if fingerprint in self.seen:
+            return None
+        if self.accepted >= self.max_recipients:
+            self._reject(email)
+            return None
+        self.seen.add(fingerprint)
+        self.accepted += 1
+        return email
+
+    def _reject(self, value: str) -> None:
+        if self.rejected is not None and len(self.rejected) < self.max_rejected:
+            self.rejected.append(value)
+
+
+def _contact_columns(header: list) -> Union[list, None]:
+    # (index, field) of each known column of a header row, or None if the row is not a header
+    email_column = next((index for index, name in enumerate(header) if name in EMAIL_COLUMNS), None)
+    if email_column is None:
+        return None
+    columns = [(email_column, "email")]
+    for field, names in (("contact_name", CONTACT_NAME_COLUMNS), ("company", COMPANY_COLUMNS),
+                         ("sector", SECTOR_COLUMNS)):
+        index = next((index for index, name in enumerate(header) if name in names), None)
+        if index is not None:
+            columns.append((index, field))
+    return columns
+
+
+def _cell(fields: list, index: int) -> Union[str, None]:
+    value = fields[index].strip().strip("\"'").strip() if index < len(fields) else ""
+    return value or None
@@ -27,7 +27,7 @@ def decode_access_token(token: str,jwt_secret_key:str,algorithm:str) -> dict:
         
         # Token is valid and not expired
         user_id = payload.get("sub")
-        return {"valid": True, "user_id": user_id}
+        return {"valid": True, "user_id": user_id, "exp": expiration_time}
     except:
         # Token has expired
         return {"valid": False, "user_id": None}
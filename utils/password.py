@@ -0,0 +1,138 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Union
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+from utils.concurrency import run_blocking
+
+# Load variables from the specified .env file
+load_dotenv(dotenv_path=str(Path("./env/secrets.env")))
+
+# The first scheme hashes new passwords, the others are only verified and rehashed on the next login
+PASSWORD_SCHEMES: list = [scheme.strip() for scheme in os.getenv("PASSWORD_SCHEMES", "sha256_crypt").split(",") if scheme.strip()]
+# passlib settings of the schemes, e.g. "bcrypt__rounds=12,argon2__memory_cost=65536"
+PASSWORD_SCHEME_SETTINGS: str = os.getenv("PASSWORD_SCHEME_SETTINGS", "")
+PASSWORD_WORKERS: int = int(os.getenv("PASSWORD_WORKERS", os.cpu_count() or 1))
+
+
+def parse_scheme_settings(settings: str) -> dict:
+    """
+    Parse passlib scheme settings written as comma separated key=value pairs.
+
+    A rounds setting also becomes the minimum rounds of its scheme, unless one is given,
+    so hashes made with fewer rounds are upgraded when their owner logs in.
+
+    Args:
+    - settings (str): The settings, e.g. "sha256_crypt__rounds=600000".
+
+    Returns:
+    - dict: The keyword arguments of the CryptContext.
+
+    Example:
+    >>> parse_scheme_settings("sha256_crypt__rounds=600000")
+    {'sha256_crypt__rounds': 600000, 'sha256_crypt__min_rounds': 600000}
+    """
+    parsed: dict = {}
+    for item in settings.split(","):
+        if not item.strip():
+            continue
+        key, value = (part.strip() for part in item.split("=", 1))
+        parsed[key] = int(value) if value.isdigit() else value
+    for key, value in list(parsed.items()):
+        scheme, _, option = key.partition("__")
+        if option in ("rounds", "default_rounds"):
+            parsed.setdefault(f"{scheme}__min_rounds", value)
+    return parsed
+
+
+def build_context(schemes: list = None, settings: str = None) -> CryptContext:
+    """
+    Build the password hashing context.
+
+    Args:
+    - schemes (list, optional): passlib scheme names, the first one hashes new passwords. Default is PASSWORD_SCHEMES.
+    - settings (str, optional): Settings of the schemes. Default is PASSWORD_SCHEME_SETTINGS.
+
+    Returns:
+    - CryptContext: The context, where every scheme but the first is deprecated.
+    """
+    return CryptContext(schemes=schemes or PASSWORD_SCHEMES, deprecated="auto",
+                        **parse_scheme_settings(PASSWORD_SCHEME_SETTINGS if settings is None else settings))
+
+
+password_context: CryptContext = build_context()
+
+# Hashing is CPU bound and holds the GIL: a process pool spreads logins over all cores
+_password_executor: Union[ProcessPoolExecutor, None] = None
+
+
+def get_password_executor() -> ProcessPoolExecutor:
+    """
+    Get the process pool hashing passwords, started on first use.
+    """
+    global _password_executor
+    if _password_executor is None:
+        _password_executor = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS)
+    return _password_executor
+
+
+def shutdown_password_executor(wait: bool = True) -> None:
+    """
+    Stop the process pool hashing passwords, if it was started.
+    """
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=wait)
+        _password_executor = None
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash a password with the current scheme and settings.
+
+    Args:
+    - password (str): The password to hash.
+
+    Returns:
+    - str: The password hash.
+    """
+    return password_context.hash(password)
+
+
+def verify_and_update(password: str, password_hash: str) -> tuple[bool, Union[str, None]]:
+    """
+    Verify a password, and hash it again if its hash uses an outdated scheme or settings.
+
+    Args:
+    - password (str): The password to verify.
+    - password_hash (str): The stored hash.
+
+    Returns:
+    - tuple[bool, Union[str, None]]: Whether the password matches, and the new hash to store or None.
+
+    Example:
+    >>> verify_and_update("Abcd1234", hash_password("Abcd1234"))
+    (True, None)
+    """
+    if not password_hash:
+        return False, None
+    try:
+        return password_context.verify_and_update(password, password_hash)
+    except ValueError:
+        # Unknown or malformed hash
+        return False, None
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Hash a password in the password process pool.
+    """
+    return await run_blocking(hash_password, password, executor=get_password_executor())
+
+
+async def verify_and_update_async(password: str, password_hash: str) -> tuple[bool, Union[str, None]]:
+    """
+    Verify a password in the password process pool, see verify_and_update.
+    """
+    return await run_blocking(verify_and_update, password, password_hash, executor=get_password_executor())
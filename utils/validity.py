@@ -1,4 +1,11 @@
 import re
+from typing import Iterable
+
+# Patterns are compiled once at import, validating a recipient list calls them for every address
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+# One pass over the password: a lowercase letter, an uppercase letter and a digit somewhere in it
+PASSWORD_PATTERN = re.compile(r"(?=[^a-z]*[a-z])(?=[^A-Z]*[A-Z])(?=\D*\d)")
+LINKEDIN_PROFILE_PATTERN = re.compile(r"^https?://(?:www\.)?linkedin\.com/(?:in|pub)/[a-zA-Z0-9_-]+/?$")
 
 def is_gmail_password_structure(password: str) -> bool:
     """
@@ -38,11 +45,36 @@ def is_valid_email(email):
     Returns:
     - bool: True if the email address is valid, False otherwise.
     """
-    # Regular expression pattern for email validation
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    
     # Check if the email matches the pattern
-    return bool(re.match(pattern, email))
+    return EMAIL_PATTERN.match(email) is not None
+
+
+def validate_emails(emails: Iterable[str]) -> tuple[list, list]:
+    """
+    Split email addresses into valid and invalid ones.
+
+    Parameters:
+    - emails (Iterable[str]): The email addresses to validate.
+
+    Returns:
+    - tuple[list, list]: The valid addresses and the invalid ones, each in input order.
+
+    Example:
+    >>> validate_emails(["john@example.com", "john@", "jane@example.org"])
+    (['john@example.com', 'jane@example.org'], ['john@'])
+    """
+    valid: list = []
+    invalid: list = []
+    # Bound methods are looked up once for the whole batch
+    match = EMAIL_PATTERN.match
+    add_valid = valid.append
+    add_invalid = invalid.append
+    for email in emails:
+        if match(email) is not None:
+            add_valid(email)
+        else:
+            add_invalid(email)
+    return valid, invalid
 
 def is_valid_password(password):
     """
@@ -70,15 +102,8 @@ def is_valid_password(password):
         >>> is_valid_password("12345678")
         False
     """
-    if (
-        re.search(r"[a-z]", password) and  # At least one lowercase character
-        re.search(r"[A-Z]", password) and  # At least one uppercase character
-        re.search(r"\d", password) and     # At least one digit
-        len(password) >= 8                 # Length >= 8
-    ):
-        return True
-    else:
-        return False
+    # Length is checked first, it is free and rejects short passwords without scanning them
+    return len(password) >= 8 and PASSWORD_PATTERN.match(password) is not None
 
 
 def is_linkedin_profile_link(url):
@@ -101,12 +126,7 @@ def is_linkedin_profile_link(url):
         >>> is_linkedin_profile_link("https://www.linkedin.com/groups/example-group-123456")
         False
     """
-    # Regular expression pattern for matching LinkedIn profile links
-    pattern = r"^https?://(?:www\.)?linkedin\.com/(?:in|pub)/[a-zA-Z0-9_-]+/?$"
     # Check if the provided URL matches the pattern
-    if re.match(pattern, url):
-        return True
-    else:
-        return False
+    return LINKEDIN_PROFILE_PATTERN.match(url) is not None
     
 
@@ -0,0 +1,136 @@
+import os
+import time
+import uuid
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO
+from dotenv import load_dotenv
+
+# Load variables from the specified .env file
+load_dotenv(dotenv_path=str(Path("./env/server.env")))
+
+WORKSPACE_ROOT: str = os.getenv("WORKSPACE_ROOT", str(Path("./temp")))
+WORKSPACE_QUOTA: int = int(os.getenv("WORKSPACE_QUOTA", 20 * 1024 * 1024))
+WORKSPACE_PREFIX: str = "request-"
+
+
+class WorkspaceQuotaExceeded(OSError):
+    """
+    Raised when a write would make a workspace larger than its quota.
+    """
+
+
+class Workspace:
+    """
+    Private scratch directory of one request.
+
+    Every workspace is a new directory with a unique name under `root`, and every file written
+    in it gets a unique name too, so concurrent requests never share a path. The directory is
+    removed when the `with` block exits, whether it returns or raises.
+
+    Args:
+        root (str, optional): Where the workspaces are created. Default is WORKSPACE_ROOT.
+        quota (int, optional): Maximum number of bytes written in the workspace. Default is WORKSPACE_QUOTA.
+
+    Example:
+        >>> with Workspace() as workspace:
+        ...     path = workspace.write_stream(resume.file, suffix=".pdf")
+        ...     os.path.dirname(path) == workspace.directory
+        True
+    """
+
+    def __init__(self, root: str = WORKSPACE_ROOT, quota: int = WORKSPACE_QUOTA):
+        self.root = root
+        self.quota = quota
+        self.used = 0
+        self.directory: str = None
+
+    def __enter__(self) -> "Workspace":
+        os.makedirs(self.root, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix=WORKSPACE_PREFIX, dir=self.root)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cleanup()
+
+    def path(self, suffix: str = "") -> str:
+        """
+        Get a new unique file path in the workspace. Nothing is created.
+
+        Args:
+            suffix (str, optional): Extension of the file, e.g. ".pdf".
+
+        Returns:
+            str: The path.
+        """
+        if self.directory is None:
+            raise RuntimeError("The workspace is not open, use it in a with block.")
+        return os.path.join(self.directory, f"{uuid.uuid4().hex}{suffix}")
+
+    def write_stream(self, stream: BinaryIO, suffix: str = "", chunk_size: int = 1024 * 1024) -> str:
+        """
+        Copy a binary stream, from its start, to a new file of the workspace.
+
+        Args:
+            stream (BinaryIO): A seekable binary stream, e.g. the spooled file of an upload.
+            suffix (str, optional): Extension of the file, e.g. ".pdf".
+            chunk_size (int, optional): Bytes read at a time. Default is 1 MiB.
+
+        Returns:
+            str: The path of the file.
+
+        Raises:
+            WorkspaceQuotaExceeded: If the workspace would grow past its quota. The partial file is removed.
+        """
+        path = self.path(suffix)
+        written = 0
+        stream.seek(0)
+        try:
+            with open(path, "wb") as file:
+                for chunk in iter(lambda: stream.read(chunk_size), b""):
+                    if self.used + written + len(chunk) > self.quota:
+                        raise WorkspaceQuotaExceeded(f"The workspace quota of {self.quota} bytes is exceeded.")
+                    file.write(chunk)
+                    written += len(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        self.used += written
+        return path
+
+    def cleanup(self) -> None:
+        """
+        Remove the workspace and everything in it.
+        """
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+
+def sweep_stale(root: str = WORKSPACE_ROOT, max_age: float = 24 * 60 * 60) -> list:
+    """
+    Remove the workspaces left behind by a process that died before cleaning up.
+
+    Args:
+        root (str, optional): Where the workspaces are created. Default is WORKSPACE_ROOT.
+        max_age (float, optional): Minimum age in seconds of a workspace to remove. Default is one day.
+
+    Returns:
+        list: The paths of the removed workspaces.
+    """
+    if not os.path.isdir(root):
+        return []
+    removed: list = []
+    now = time.time()
+    for entry in os.scandir(root):
+        if not (entry.is_dir() and entry.name.startswith(WORKSPACE_PREFIX)):
+            continue
+        try:
+            if now - entry.stat().st_mtime < max_age:
+                continue
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed.append(entry.path)
+    return removed